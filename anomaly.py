@@ -0,0 +1,225 @@
+"""
+Upstream-load anomaly detection: an early hint that the WRB is about to open.
+
+When staff start preparing the new system, the ABS server slows down and its
+response headers change, before the "Application Unavailable" banner goes.
+AnomalyDetector keeps streaming statistics for every target it sees:
+
+- a fast and a slow EWMA of response time (the slow one with a variance), to
+  tell a sustained shift from a single slow request
+- a QuantileSketch of all response times, which gives the long-run p99 in
+  constant memory
+- a signature of the headers that only change when the deployment does
+
+A latency anomaly is a fast EWMA that is both above the long-run p99 and
+``z_threshold`` standard deviations above the slow EWMA for ``persistence``
+polls in a row. A header anomaly is a
+new signature after the old one had been stable for the warm-up period. Either
+kind boosts polling for ``boost_for`` seconds and can send an "activity
+detected" pre-alert, at most once per ``cooldown``.
+
+Responses to the pre-probe (a HEAD or Range GET, see preprobe.py) are quicker
+than full GETs, so they get statistics of their own. Mixed in, a probe
+switching itself off would look like the server slowing down.
+"""
+
+import math
+import time
+
+from urllib3 import HTTPHeaderDict
+
+WARMUP = 30             # Samples before a target's baseline is trusted
+FAST_ALPHA = 0.3
+SLOW_ALPHA = 0.02
+Z_THRESHOLD = 4.0
+PERSISTENCE = 3         # Consecutive shifted samples before latency counts as anomalous
+BOOST_FOR = 1800        # Seconds of fast polling after an anomaly
+COOLDOWN = 6 * 3600     # Minimum seconds between pre-alerts
+SKETCH_ACCURACY = 0.01
+STABLE_HEADERS = ("Server", "X-AspNet-Version", "X-Powered-By", "Cache-Control", "Content-Type")
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch with bounded relative error (DDSketch-style)."""
+
+    def __init__(self, accuracy: float = SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value: float):
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class TargetStats:
+    """Streaming response-time and header statistics for one target."""
+
+    __slots__ = ("count", "fast", "slow", "slow_var", "sketch", "signature", "signature_runs", "slow_run")
+
+    def __init__(self):
+        self.count = 0
+        self.fast = self.slow = self.slow_var = 0.0
+        self.sketch = QuantileSketch()
+        self.signature = None
+        self.signature_runs = 0
+        self.slow_run = 0       # Consecutive samples above the baseline
+
+    def update(self, latency: float, baseline: bool = True):
+        """Fold in a sample; ``baseline=False`` leaves the slow EWMA untouched."""
+        if not self.count:
+            self.fast = self.slow = latency
+        else:
+            self.fast += FAST_ALPHA * (latency - self.fast)
+            if baseline:
+                delta = latency - self.slow
+                self.slow += SLOW_ALPHA * delta
+                self.slow_var = (1 - SLOW_ALPHA) * (self.slow_var + SLOW_ALPHA * delta * delta)
+        self.sketch.add(latency)
+        self.count += 1
+
+
+class Anomaly:
+    """One flagged deviation from a target's baseline."""
+
+    __slots__ = ("target", "kind", "detail", "at")
+
+    def __init__(self, target: str, kind: str, detail: str, at: float):
+        self.target = target
+        self.kind = kind
+        self.detail = detail
+        self.at = at
+
+    def __repr__(self):
+        return f"Anomaly({self.target!r}, {self.kind}: {self.detail})"
+
+
+def set_cookies(r) -> list:
+    """
+    A response's Set-Cookie headers, one per cookie.
+
+    requests joins them with commas, and an Expires date has a comma in it, so
+    they are read from the raw urllib3 headers instead.
+    """
+    raw = getattr(r.raw, "headers", None)
+    if isinstance(raw, HTTPHeaderDict):
+        return raw.getlist("Set-Cookie")
+    cookie = r.headers.get("Set-Cookie")
+    return [cookie] if cookie else []
+
+
+def header_signature(headers, cookies=None) -> tuple:
+    """The headers that only change when the deployment does, plus cookie names.
+
+    ``cookies`` lists the Set-Cookie headers one by one; without it, the
+    Set-Cookie in ``headers`` is taken as a single cookie.
+    """
+    if cookies is None:
+        cookies = [headers["Set-Cookie"]] if headers.get("Set-Cookie") else []
+    names = sorted({cookie.split("=", 1)[0].strip() for cookie in cookies if "=" in cookie})
+    return tuple(headers.get(name) for name in STABLE_HEADERS) + tuple(names)
+
+
+class AnomalyDetector:
+    """Flags latency and header shifts per target, boosting polling and optionally pre-alerting."""
+
+    def __init__(self, warmup: int = WARMUP, z_threshold: float = Z_THRESHOLD, persistence: int = PERSISTENCE,
+                 boost_for: float = BOOST_FOR, pre_alert: bool = False, cooldown: float = COOLDOWN,
+                 send=None, clock=time.time):
+        self.warmup = warmup
+        self.z_threshold = z_threshold
+        self.persistence = persistence
+        self.boost_for = boost_for
+        self.pre_alert = pre_alert
+        self.cooldown = cooldown
+        self.send = send
+        self.clock = clock
+        self.targets = {}
+        self.anomalies = []
+        self.boosted_until = 0.0
+        self._alerted_at = None
+
+    def observe(self, target: str, latency: float, headers=None, cookies=None, probed: bool = False) -> list:
+        """Add one response; returns any anomalies it revealed.
+
+        ``probed`` responses are judged against other probes, not full GETs.
+        """
+        now = self.clock()
+        key = (target, "probe") if probed else target
+        stats = self.targets.get(key)
+        if stats is None:
+            stats = self.targets[key] = TargetStats()
+        found = []
+
+        if stats.count >= self.warmup:
+            # Judge the fast EWMA against the baseline as it was before this sample
+            p99, baseline, std = stats.sketch.quantile(0.99), stats.slow, math.sqrt(stats.slow_var)
+            fast = stats.fast + FAST_ALPHA * (latency - stats.fast)
+            slow = fast > p99 and std > 0 and (fast - baseline) / std > self.z_threshold
+            stats.slow_run = stats.slow_run + 1 if slow else 0
+            # Keep shifted samples out of the baseline, unless the shift has lasted long enough to be the new normal
+            stats.update(latency, baseline=not slow or stats.slow_run > self.warmup)
+            if stats.slow_run == self.persistence:     # Sustained, and flagged once rather than every poll
+                found.append(Anomaly(target, "latency",
+                                     f"{stats.fast:.2f}s vs usual {baseline:.2f}s (p99 {p99:.2f}s)", now))
+        else:
+            stats.update(latency)
+
+        if headers is not None:
+            signature = header_signature(headers, cookies)
+            if signature == stats.signature:
+                stats.signature_runs += 1
+            else:
+                if stats.signature_runs >= self.warmup:
+                    found.append(Anomaly(target, "headers", f"{stats.signature} → {signature}", now))
+                stats.signature, stats.signature_runs = signature, 1
+
+        if found:
+            self.anomalies.extend(found)
+            self.boosted_until = now + self.boost_for
+            self._maybe_alert(found, now)
+        return found
+
+    def __call__(self, target: str, r, state: str, elapsed: float, probed: bool = False):
+        """check_page() observer: judges the server's time to first byte, from a pre-probe's response too."""
+        self.observe(target, r.elapsed.total_seconds(), r.headers, set_cookies(r), probed)
+
+    def boosted(self, now: float = None) -> bool:
+        """Whether an anomaly was flagged recently enough to poll faster."""
+        return (self.clock() if now is None else now) < self.boosted_until
+
+    def signal_times(self) -> list:
+        """When anomalies were flagged, as change signals for the release forecast."""
+        return [anomaly.at for anomaly in self.anomalies]
+
+    def _maybe_alert(self, found, now: float):
+        if not self.pre_alert or (self._alerted_at is not None and now - self._alerted_at < self.cooldown):
+            return
+        send = self.send
+        if send is None:
+            from check_wrb2526 import send_email as send
+        self._alerted_at = now
+        details = "\n".join(f"- {a.target}: {a.kind} {a.detail}" for a in found)
+        send("Activity detected",
+             subject="Warwick WRB: upstream activity detected",
+             body=f"The ABS server is behaving differently, which often comes just before the WRB opens:\n\n"
+                  f"{details}\n\nPolling has been stepped up.")
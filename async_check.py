@@ -0,0 +1,96 @@
+"""
+Asynchronous page checks for use inside an event loop.
+
+``check_page()`` fetches, classifies, prints and emails in one go. Here the
+fetch is done by an httpx AsyncClient and the result comes back as a
+CheckResult, with nothing printed or sent, so callers decide what to do with
+it. Classification follows WRB_PARSE_MODE like the sync path, streaming in
+events mode, so the two always agree, down to the content hash.
+
+AsyncChecker shares one client, and one connection pool, across every check
+and caps how many run at once, so thousands of checks can be in flight in a
+single process::
+
+    async with AsyncChecker(concurrency=500) as checker:
+        results = await checker.check_many(urls)
+
+httpx is an optional dependency: ``pip install .[async]``.
+"""
+
+import asyncio
+import time
+
+try:
+    import httpx
+except ImportError:     # Only needed for async checks
+    httpx = None
+
+import check_wrb2526
+from check_wrb2526 import MAX_BODY_BYTES, RULES, URL, CheckResult, content_hash, explain, explain_markers
+from page_events import scan_response_async
+
+REQUEST_TIMEOUT = 30
+CONCURRENCY = 100
+
+
+class AsyncChecker:
+    """Runs checks concurrently on a shared httpx.AsyncClient."""
+
+    def __init__(self, client=None, concurrency: int = CONCURRENCY, timeout: float = REQUEST_TIMEOUT):
+        if client is None and httpx is None:
+            raise ImportError("Async checks need httpx: pip install .[async]")
+        self._own_client = client is None
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout, follow_redirects=True,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency))
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._own_client:
+            await self.client.aclose()
+
+    async def check(self, url: str = URL, rules=RULES) -> CheckResult:
+        """Fetch and classify one page by ``rules``; network errors end up in ``result.error``."""
+        async with self._slots:
+            started = time.perf_counter()
+            try:
+                async with self.client.stream("GET", url, follow_redirects=True) as r:
+                    if check_wrb2526.PARSE_MODE == "events":
+                        markers = await scan_response_async(r, MAX_BODY_BYTES)     # Parsed as it streams in
+                        fetched = time.perf_counter()
+                        state, reason = explain_markers(markers, str(r.url), rules)
+                        digest = markers.content_hash
+                    else:
+                        body = bytearray()
+                        async for chunk in r.aiter_bytes():
+                            body += chunk
+                            if len(body) >= MAX_BODY_BYTES:
+                                del body[MAX_BODY_BYTES:]
+                                break
+                        fetched = time.perf_counter()
+                        body = bytes(body)
+                        state, reason = explain(body.decode(r.charset_encoding or "utf-8", errors="replace"),
+                                                str(r.url), rules)
+                        digest = content_hash(body)
+            except httpx.HTTPError as e:
+                return CheckResult(url=url, timings={"total": time.perf_counter() - started},
+                                   error=f"{type(e).__name__}: {e}")
+            done = time.perf_counter()
+            return CheckResult(state, reason, str(r.url), r.status_code, digest,
+                               {"fetch": fetched - started, "classify": done - fetched, "total": done - started})
+
+    async def check_many(self, urls) -> list:
+        """Check every URL concurrently; results come back in the same order."""
+        return await asyncio.gather(*(self.check(url) for url in urls))
+
+
+async def check_page_async(url: str = URL, client=None) -> CheckResult:
+    """One-off async check of the WRB page."""
+    async with AsyncChecker(client, concurrency=1) as checker:
+        return await checker.check(url)
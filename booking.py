@@ -0,0 +1,268 @@
+"""
+Opt-in auto-booking for the moment the WRB booking form appears.
+
+Popular rooms go within minutes of the form going live, so everything that can
+happen early does:
+
+- ``prewarm()`` logs in, opens one pooled connection per booking, starts the
+  worker threads and picks up the form's ASP.NET tokens, which a FormStateCache
+  then keeps fresh in the background
+- booking requests are prepared ahead of time and only re-prepared if the
+  tokens change
+- ``submit()`` fires every booking concurrently, using the tokens from the very
+  page that showed the form, and records per-request timings
+
+Run ``python booking.py`` with BOOKING_FILE and either WRB_USERNAME /
+WRB_PASSWORD or a WRB_ACCOUNTS session pool set to poll until the form appears
+and book straight away.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from check_wrb2526 import URL, LIVE_FORM, LIVE_LOGIN, classify, send_email
+from formstate import FormStateCache, rejected
+from session_pool import SessionPool, login
+
+REQUEST_TIMEOUT = 15
+POLL_INTERVAL = 5       # Seconds between checks while waiting for the form
+REWARM_INTERVAL = 600   # Seconds before the login and tokens are refreshed
+LOGIN_BACKOFF_MAX = 300     # Longest wait between logins that don't get past the login page
+CONFIRMATION_PAGE = "Confirmation.aspx"     # Where a booking postback that redirects should land
+# Text only a successful booking's page shows; a postback that fails validation re-renders the form with a 200
+CONFIRMATION_MARKERS = tuple(filter(None, os.getenv("BOOKING_CONFIRMATION", "Booking confirmed").split(",")))
+
+
+class Booking:
+    """A pre-computed booking: a name and the form fields to post."""
+
+    __slots__ = ("name", "fields")
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+
+class BookingOutcome:
+    """What happened to one booking submission."""
+
+    __slots__ = ("name", "ok", "status_code", "started", "elapsed", "error")
+
+    def __init__(self, name, ok, status_code=None, started=0.0, elapsed=0.0, error=None):
+        self.name = name
+        self.ok = ok
+        self.status_code = status_code
+        self.started = started      # Seconds after submit() was called
+        self.elapsed = elapsed      # Seconds the request itself took
+        self.error = error
+
+    def __repr__(self):
+        return (f"BookingOutcome({self.name!r}, ok={self.ok}, status={self.status_code}, "
+                f"started={self.started * 1000:.1f}ms, elapsed={self.elapsed * 1000:.1f}ms)")
+
+
+def accepted(response) -> bool:
+    """
+    Whether a booking POST, sent without following redirects, went through.
+
+    A redirect only counts if it goes to the confirmation page: one to
+    Login.aspx means the session expired and nothing was booked. Any other
+    page must show a confirmation marker, since a booking that failed
+    validation comes back as a 200 with the form and its error message.
+    """
+    if response.is_redirect:
+        return CONFIRMATION_PAGE in response.headers.get("Location", "")
+    return response.status_code < 300 and any(marker in response.text for marker in CONFIRMATION_MARKERS)
+
+
+def load_bookings(path) -> list:
+    """Load bookings from JSON: ``[{"name": "...", "fields": {"ctl00$...": "..."}}]``."""
+    with open(path) as f:
+        return [Booking(item["name"], item["fields"]) for item in json.load(f)]
+
+
+class BookingPipeline:
+    """Pre-warmed sessions and requests that book the moment the form appears."""
+
+    def __init__(self, bookings, form_url=URL, username=None, password=None,
+                 session=None, timeout=REQUEST_TIMEOUT, pool=None):
+        self.bookings = list(bookings)
+        self.form_url = form_url
+        self.username = username
+        self.password = password
+        self.pool = pool        # SessionPool that ``session`` was borrowed from, which logs it in
+        self.timeout = timeout
+        self.workers = max(len(self.bookings), 1)
+        self._own_session = session is None     # A borrowed session goes back to its owner open
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.forms = FormStateCache(self.session, timeout=timeout)
+        self.warmed_at = None
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="booking")
+        self._prepared = None
+        self._prepared_for = None
+
+    @property
+    def form_fields(self) -> dict:
+        return self.forms.peek(self.form_url) or {}
+
+    def close(self):
+        self.forms.stop()
+        self._executor.shutdown(wait=False)
+        if self._own_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def can_login(self) -> bool:
+        return bool(self.username) or self.pool is not None
+
+    def prewarm(self, expired=False):
+        """Log in, open connections and pick up form tokens ahead of the window."""
+        if self.pool is not None:
+            self.pool.renew(self.session, force=expired)
+        elif self.username:
+            login(self.session, self.form_url, self.username, self.password, self.timeout)
+        # One GET per worker opens a pooled connection each and spins up every thread
+        pages = list(self._executor.map(
+            lambda _: self.session.get(self.form_url, timeout=self.timeout), range(self.workers)))
+        for page in pages:
+            self.forms.update(self.form_url, page.text)
+        self._prepared_for = None       # Cookies may have changed with the login
+        self._prepare()
+        self.forms.start()
+        self.warmed_at = time.time()
+
+    def _request(self, booking, fields):
+        return self.session.prepare_request(requests.Request(
+            "POST", self.form_url, data={**fields, **booking.fields}))
+
+    def _prepare(self):
+        """Build the POSTs for the current tokens, reusing them if nothing moved."""
+        fields = self.form_fields
+        if not fields or self._prepared_for == fields:
+            return self._prepared
+        self._prepared = [self._request(booking, fields) for booking in self.bookings]
+        self._prepared_for = fields
+        return self._prepared
+
+    def _send(self, booking, prepared, start):
+        sent = time.perf_counter()
+        try:
+            r = self.session.send(prepared, timeout=self.timeout, allow_redirects=False)
+            if rejected(r):
+                # Stale tokens: fetch fresh ones and go again
+                self.forms.invalidate(self.form_url)
+                r = self.session.send(self._request(booking, self.forms.fetch(self.form_url)),
+                                      timeout=self.timeout, allow_redirects=False)
+            ok = accepted(r)
+            if ok:
+                self.forms.update(self.form_url, r.text)
+            return BookingOutcome(booking.name, ok, r.status_code, sent - start, time.perf_counter() - sent)
+        except (requests.RequestException, RuntimeError) as e:
+            return BookingOutcome(booking.name, False, None, sent - start, time.perf_counter() - sent, str(e))
+
+    def submit(self, html=None) -> list:
+        """
+        Fire every booking concurrently.
+
+        Pass the HTML of the page that showed the form so its fresh tokens are
+        used with no extra round trip.
+        """
+        start = time.perf_counter()
+        if html is not None:
+            self.forms.update(self.form_url, html)
+        if not self.form_fields:
+            self.forms.fetch(self.form_url)
+        prepared = self._prepare()
+        futures = [
+            self._executor.submit(self._send, booking, request, start)
+            for booking, request in zip(self.bookings, prepared)
+        ]
+        return [future.result() for future in futures]
+
+    def watch(self, interval=POLL_INTERVAL, rewarm_every=REWARM_INTERVAL, deadline=None):
+        """
+        Poll the form URL with the warm session and submit as soon as it's live.
+
+        Network errors and failed logins are logged and retried. Logins that
+        keep landing back on the login page are retried with a growing delay.
+        """
+        self.prewarm()
+        expired = False         # The last poll landed on the login page
+        failed_logins = 0       # Logins in a row that didn't get past it
+        while deadline is None or time.time() < deadline:
+            try:
+                if expired:
+                    self.prewarm(expired=True)      # Session expired; log back in
+                elif time.time() - self.warmed_at > rewarm_every:
+                    self.prewarm()
+                elif self.pool is not None:
+                    self.pool.renew(self.session)       # Logs in again only once it's due
+                r = self.session.get(self.form_url, allow_redirects=True, timeout=self.timeout)
+                state = classify(r.text, r.url)
+            except (requests.RequestException, RuntimeError) as e:
+                print(f"⚠️ Watch poll failed: {e}")
+                state = None
+            if state == LIVE_FORM:
+                return self.submit(r.text)
+            if (state == LIVE_LOGIN and self.can_login) or (state is None and expired):
+                if expired:
+                    failed_logins += 1
+                    time.sleep(min(interval * 2 ** failed_logins, LOGIN_BACKOFF_MAX))
+                expired = True
+                continue
+            expired, failed_logins = False, 0
+            time.sleep(interval)
+        return []
+
+
+def report(outcomes):
+    """Print per-request timings and email a summary."""
+    lines = []
+    for outcome in outcomes:
+        icon = "✅" if outcome.ok else "❌"
+        lines.append(f"{icon} {outcome.name}: status {outcome.status_code}, "
+                     f"sent +{outcome.started * 1000:.1f}ms, took {outcome.elapsed * 1000:.1f}ms"
+                     + (f" ({outcome.error})" if outcome.error else ""))
+    print("\n".join(lines))
+    booked = sum(outcome.ok for outcome in outcomes)
+    send_email(
+        f"Auto-booking submitted {booked}/{len(outcomes)}",
+        subject=f"WRB auto-booking: {booked}/{len(outcomes)} submitted",
+        body="Auto-booking results:\n\n" + "\n".join(lines) + f"\n\n{URL}",
+    )
+
+
+def main():
+    bookings = load_bookings(os.environ["BOOKING_FILE"])
+    interval = float(os.getenv("BOOKING_POLL_INTERVAL", POLL_INTERVAL))
+    print(f"🤖 Waiting for the booking form with {len(bookings)} bookings ready...")
+
+    if os.getenv("WRB_ACCOUNTS"):
+        # The pipeline holds one session for the whole watch, which the pool's
+        # maintenance skips, so it asks the pool to renew it on every rewarm
+        with SessionPool.from_env() as pool, pool.acquire() as session:
+            with BookingPipeline(bookings, session=session, pool=pool) as pipeline:
+                report(pipeline.watch(interval=interval))
+        return
+
+    with BookingPipeline(bookings, username=os.getenv("WRB_USERNAME"),
+                         password=os.getenv("WRB_PASSWORD")) as pipeline:
+        report(pipeline.watch(interval=interval))
+
+
+if __name__ == "__main__":
+    main()
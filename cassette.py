@@ -0,0 +1,173 @@
+"""
+Record and replay HTTP traffic for the fetch layer.
+
+A cassette is a compact JSON file of recorded interactions, one per hop: the
+method, URL, status, headers and body of every response, redirects included.
+CassetteAdapter sits under a requests Session, so redirects are followed by
+requests itself on replay. That gives back the same final URL and the same
+``response.history`` as the live fetch did.
+
+``use_cassette()`` points ``check_wrb2526.fetch()`` at a cassette for the
+duration of a ``with`` block. Everything that fetches through it then replays
+the recording, with no network access: ``check_page()``, the inspection tools
+and tests. The modes are:
+
+- ``once``: replay if the file exists, otherwise record it (the default)
+- ``record``: always fetch live and overwrite the file
+- ``replay``: never touch the network; an unrecorded request raises CassetteMiss
+
+Requests are matched on method and URL. Repeated requests replay successive
+recordings, and the last recording keeps answering once they run out. Set
+``WRB_CASSETTE`` (and optionally ``WRB_CASSETTE_MODE``) to run the inspection
+tools from a cassette; ``python cassette.py wrb.cassette`` records one.
+"""
+
+import base64
+import io
+import json
+import os
+import sys
+from contextlib import contextmanager, nullcontext
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+import check_wrb2526
+
+MODES = ("once", "record", "replay")
+FORMAT_VERSION = 1
+
+# The stored body is already decoded and complete, so these no longer apply
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+
+class CassetteMiss(requests.ConnectionError):
+    """A request was made in replay mode that the cassette has no recording of."""
+
+
+class Cassette:
+    """The interactions recorded in one cassette file."""
+
+    def __init__(self, path: str, mode: str = "once"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {', '.join(MODES)}")
+        self.path = path
+        self.mode = mode
+        self.recording = mode == "record" or (mode == "once" and not os.path.exists(path))
+        self.interactions = [] if self.recording else self.load(path)
+        self._played = {}
+
+    @staticmethod
+    def load(path: str) -> list:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported cassette version {data.get('version')!r}")
+        return data["interactions"]
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"version": FORMAT_VERSION, "interactions": self.interactions}, f,
+                      separators=(",", ":"), ensure_ascii=False)
+
+    def record(self, method: str, url: str, status: int, reason: str, headers, body: bytes) -> dict:
+        interaction = {
+            "method": method,
+            "url": url,
+            "status": status,
+            "reason": reason,
+            "headers": {k: v for k, v in headers.items() if k.lower() not in DROPPED_HEADERS},
+        }
+        try:
+            interaction["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            interaction["body"] = base64.b64encode(body).decode("ascii")
+            interaction["base64"] = True
+        self.interactions.append(interaction)
+        return interaction
+
+    def find(self, method: str, url: str) -> dict:
+        """The next recording of ``method url``, or None if there is none."""
+        matches = [i for i in self.interactions if i["method"] == method and i["url"] == url]
+        if not matches:
+            return None
+        played = self._played.get((method, url), 0)
+        self._played[method, url] = played + 1
+        return matches[min(played, len(matches) - 1)]
+
+
+def interaction_body(interaction: dict) -> bytes:
+    if interaction.get("base64"):
+        return base64.b64decode(interaction["body"])
+    return interaction["body"].encode("utf-8")
+
+
+class CassetteAdapter(HTTPAdapter):
+    """A transport adapter that records every hop to, or replays it from, a Cassette."""
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if self.cassette.recording:
+            live = super().send(request, stream=False, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+            interaction = self.cassette.record(request.method, request.url, live.status_code, live.reason,
+                                               live.headers, live.content)
+        else:
+            interaction = self.cassette.find(request.method, request.url)
+            if interaction is None:
+                raise CassetteMiss(f"{self.cassette.path} has no recording of {request.method} {request.url}",
+                                   request=request)
+        # Recorded responses are rebuilt too, so recording and replay hand back identical responses
+        raw = HTTPResponse(body=io.BytesIO(interaction_body(interaction)), headers=interaction["headers"],
+                           status=interaction["status"], reason=interaction["reason"],
+                           preload_content=False, decode_content=False, request_method=request.method)
+        return self.build_response(request, raw)
+
+
+def cassette_session(cassette: Cassette) -> requests.Session:
+    session = requests.Session()
+    adapter = CassetteAdapter(cassette)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@contextmanager
+def use_cassette(path: str, mode: str = "once"):
+    """Send every ``check_wrb2526.fetch()`` through a cassette for the duration of the block."""
+    cassette = Cassette(path, mode)
+    session = cassette_session(cassette)
+    saved, check_wrb2526.FETCH_SESSION = check_wrb2526.FETCH_SESSION, session
+    try:
+        yield cassette
+    finally:
+        check_wrb2526.FETCH_SESSION = saved
+        session.close()
+        if cassette.recording:
+            cassette.save()
+
+
+def cassette_from_env():
+    """``use_cassette()`` for WRB_CASSETTE / WRB_CASSETTE_MODE, or a no-op if unset."""
+    path = os.getenv("WRB_CASSETTE")
+    if not path:
+        return nullcontext()
+    return use_cassette(path, os.getenv("WRB_CASSETTE_MODE", "once"))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("Usage: python cassette.py CASSETTE_FILE")
+        return 2
+    with use_cassette(argv[0], "record") as cassette:
+        r = check_wrb2526.fetch()
+    print(f"📼 Recorded {len(cassette.interactions)} hop(s) to {argv[0]}; final URL {r.url}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
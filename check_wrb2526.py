@@ -1,37 +1,169 @@
+import asyncio
+import atexit
+import hashlib
 import os
+import time
 import requests
 import smtplib
 from email.mime.text import MIMEText
 from dotenv import load_dotenv
 
+from history import PollHistory
+from page_events import read_response, scan_html, scan_response
+
 # Load .env file locally (safe to ignore if not present, e.g. in GitHub Actions)
 load_dotenv()
 
 URL = "https://abs.warwick.ac.uk/WRB2526/"
 CHECK_STRING = "Application Unavailable"
 
+# "substring" searches the whole page; "events" streams it through an HTML
+# event parser and only looks at the title, banner, headings and form
+PARSE_MODE = os.getenv("WRB_PARSE_MODE", "substring")
+
+# Only this much of a page is read and classified; the real page is ~20 KB, and
+# every marker is near the top. Both modes stream, so neither downloads more
+MAX_BODY_BYTES = int(os.getenv("WRB_MAX_BODY_BYTES", 1024 * 1024))
+
+# Set to a SQLite path to record every poll (see history.py)
+HISTORY_DB = os.getenv("WRB_HISTORY_DB")
+_history = None
+
+# "head" or "range": fetch only the page's headers first, and skip the full GET
+# while they match the last unavailable page's (see preprobe.py); unset always GETs
+PRE_PROBE = os.getenv("WRB_PRE_PROBE")
+PROBE_FILE = os.getenv("WRB_PROBE_FILE")
+_pre_probe = None
+
+# A requests.Session for fetch() to use instead of requests.get, e.g. one
+# replaying a cassette (see cassette.py)
+FETCH_SESSION = None
+
+# Callables given (target, response, state, elapsed, probed) after every poll; when
+# the pre-probe skipped the full GET, probed is True and the response is the probe's
+OBSERVERS = []
+
+# Page states
+UNAVAILABLE = "UNAVAILABLE"
+LIVE_LOGIN = "LIVE_LOGIN"
+LIVE_FORM = "LIVE_FORM"
+WRONG_YEAR = "WRONG_YEAR"
+UNKNOWN = "UNKNOWN"
+ERROR = "ERROR"         # Fetch failed or server error; only the state machine uses it
+
+UNEXPECTED_STATUS = "UNEXPECTED CHANGE - Page changed but not recognized as booking system. Manual check required."
+STATUS_MESSAGES = {
+    LIVE_LOGIN: "Redirected to login (system live)",
+    LIVE_FORM: "Booking form detected",
+    WRONG_YEAR: UNEXPECTED_STATUS,
+    UNKNOWN: UNEXPECTED_STATUS,
+}
+
+ALERT_SUBJECT = "Warwick WRB 25/26 is LIVE!"
+
+# JSON file of each target's stable state; set it to alert once per transition,
+# with hysteresis against flapping pages (see state_machine.py)
+STATE_FILE = os.getenv("WRB_STATE_FILE")
+
+# Alert channels besides plain email, e.g. "ntfy:https://ntfy.sh/my-topic,email"
+# (see notifiers.py); unset means send_email() alone
+NOTIFY_CHANNELS = os.getenv("WRB_NOTIFY")
+
+# Seconds over which email alerts are batched into one digest per recipient
+# (see coalesce.py); 0 sends each alert as it is raised
+COALESCE_WINDOW = float(os.getenv("WRB_COALESCE_WINDOW", 0))
+
+# SQLite file of send rate limits and quota use (see ratelimit.py); unset means no limits
+RATE_LIMIT_DB = os.getenv("WRB_RATE_LIMIT_DB")
+_rate_limiter = None
+RATE_LIMIT_WAIT = 30.0  # Seconds a go-live alert may wait for a rate limit to free up
+
 # Read credentials from environment variables
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 465  # Changed from 587 to 465 (SSL instead of TLS)
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 465))  # Changed from 587 to 465 (SSL instead of TLS)
+# Set SMTP_SSL=0 for servers that start in plain text (port 587/25, local relays);
+# STARTTLS is still used if the server offers it
+SMTP_USE_SSL = os.getenv("SMTP_SSL", "1").lower() not in ("0", "false", "no")
+# Backup accounts, raced against the primary when it is slow or failing (see failover.py)
+SMTP_ACCOUNTS = os.getenv("WRB_SMTP_ACCOUNTS")
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASS = os.getenv("EMAIL_PASS")
 TO_EMAIL = os.getenv("TO_EMAIL")
 
 
-def send_email(status: str):
-    """Send email notification when the page goes live."""
-    msg = MIMEText(f"The Warwick WRB 25/26 booking page is now live (status: {status}).\n\n{URL}")
-    msg["Subject"] = "Warwick WRB 25/26 is LIVE!"
+def alert_body(status: str) -> str:
+    return f"The Warwick WRB 25/26 booking page is now live (status: {status}).\n\n{URL}"
+
+
+def get_rate_limiter():
+    """The send rate limiter for this process, opened on first use, or None if disabled."""
+    global _rate_limiter
+    if _rate_limiter is None and RATE_LIMIT_DB:
+        from ratelimit import RateLimiter
+        _rate_limiter = RateLimiter(RATE_LIMIT_DB)
+        atexit.register(_rate_limiter.close)
+    return _rate_limiter
+
+
+def reserve_send(to: str, priority: int, account: str = None) -> bool:
+    """Spend one send from the rate limits of ``account`` (EMAIL_USER by default), if any.
+
+    False means skip this low-priority send.
+    """
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return True
+    return limiter.take(account or EMAIL_USER, to, priority, wait=RATE_LIMIT_WAIT)
+
+
+def smtp_connect(timeout: float = 30, host: str = None, port: int = None, use_ssl: bool = None):
+    """Open a connection to SMTP_SERVER, or another server; call smtp_login() on it before sending."""
+    use_ssl = SMTP_USE_SSL if use_ssl is None else use_ssl
+    # Use SMTP_SSL for port 465 (SSL connection)
+    smtp = smtplib.SMTP_SSL if use_ssl else smtplib.SMTP
+    return smtp(host or SMTP_SERVER, port or SMTP_PORT, timeout=timeout)
+
+
+def smtp_login(server, user: str = None, password: str = None, use_ssl: bool = None):
+    """Upgrade a plain connection to TLS if the server offers it, then log in."""
+    if SMTP_USE_SSL if use_ssl is None else use_ssl:
+        print("Connected to SMTP server with SSL")
+    else:
+        server.ehlo()
+        if server.has_extn("starttls"):
+            server.starttls()
+            server.ehlo()
+        print("Connected to SMTP server")
+    server.login(user or EMAIL_USER, password or EMAIL_PASS)
+    print("✅ Logged in successfully")
+
+
+def send_email(status: str, subject: str = ALERT_SUBJECT, body: str = None, priority: int = None, to: str = None):
+    """Send email notification when the page goes live, to TO_EMAIL unless ``to`` is given."""
+    if body is None:
+        body = alert_body(status)
+    to = to or TO_EMAIL
+    if RATE_LIMIT_DB:
+        from notifiers import priority_for
+        priority = priority_for(status) if priority is None else priority
+        # With backups, the account that ends up sending is charged, not the primary
+        if not SMTP_ACCOUNTS and not reserve_send(to, priority):
+            return
+    msg = MIMEText(body)
+    msg["Subject"] = subject
     msg["From"] = EMAIL_USER
-    msg["To"] = TO_EMAIL
+    msg["To"] = to
 
     try:
-        print(f"Attempting to send email to {TO_EMAIL}...")
-        # Use SMTP_SSL for port 465 (SSL connection)
-        with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, timeout=30) as server:
-            print("Connected to SMTP server with SSL")
-            server.login(EMAIL_USER, EMAIL_PASS)
-            print("✅ Logged in successfully")
+        print(f"Attempting to send email to {to}...")
+        if SMTP_ACCOUNTS:
+            from failover import send_hedged
+            account = send_hedged(msg, priority if RATE_LIMIT_DB else None)
+            if account is not None:
+                print(f"Email sent successfully via {account.name}!")
+            return
+        with smtp_connect() as server:
+            smtp_login(server)
             server.send_message(msg)
             print("Email sent successfully!")
     except smtplib.SMTPAuthenticationError as e:
@@ -46,35 +178,280 @@ def send_email(status: str):
         raise
 
 
-def check_page():
-    r = requests.get(URL, allow_redirects=True)
-    text = r.text
+class RuleSet:
+    """The markers that place a page, for one academic year of one site's WRB.
 
-    if CHECK_STRING in text:
-        print("Still unavailable.")
-        return
+    ``year`` is the year the academic year starts in: 2025 for 2025/26.
+    """
 
-    if "Login.aspx" in r.url or "ReturnUrl" in r.url:
-        send_email("Redirected to login (system live)")
-        return
+    __slots__ = ("year", "label", "previous", "heading", "unavailable", "login_markers", "form_field")
 
-    # Check for the correct year (2025/26) booking system
-    if "Web Room Booking System 2025/26" in text:
-        send_email("Booking form detected")
-        return
-    
-    # Also check for "Preferred Start" but only if no other year is mentioned
-    if "Preferred Start" in text and "2025/26" not in text and "2024/25" not in text:
-        send_email("Booking form detected") 
+    def __init__(self, year: int, unavailable: str = CHECK_STRING, heading: str = "Web Room Booking System",
+                 login_markers=("Login.aspx", "ReturnUrl"), form_field: str = "Preferred Start"):
+        self.year = year
+        self.label = year_label(year)
+        self.previous = year_label(year - 1)
+        self.heading = f"{heading} {self.label}"
+        self.unavailable = unavailable
+        self.login_markers = tuple(login_markers)
+        self.form_field = form_field
+
+    def __repr__(self):
+        return f"RuleSet({self.label})"
+
+
+def year_label(year: int) -> str:
+    """2025 -> "2025/26"."""
+    return f"{year}/{(year + 1) % 100:02d}"
+
+
+# The year URL is for; targets.py derives both from the date instead
+RULES = RuleSet(2025)
+
+
+def explain(text: str, final_url: str, rules: RuleSet = RULES) -> tuple:
+    """Work out which state a fetched page is in, and which rule decided it."""
+    if rules.unavailable in text:
+        return UNAVAILABLE, f"'{rules.unavailable}' on page"
+
+    if any(marker in final_url for marker in rules.login_markers):
+        return LIVE_LOGIN, "redirected to login"
+
+    # Check for the correct year (e.g. 2025/26) booking system
+    if rules.heading in text:
+        return LIVE_FORM, f"'{rules.heading}' on page"
+
+    # The form field counts if it's for this year, or if no other year is mentioned
+    if rules.form_field in text and (rules.label in text or rules.previous not in text):
+        return LIVE_FORM, f"'{rules.form_field}' field without an older year"
+
+    if rules.previous in text:
+        return WRONG_YEAR, f"'{rules.previous}' on page"
+
+    return UNKNOWN, "no known markers"
+
+
+def classify(text: str, final_url: str, rules: RuleSet = RULES) -> str:
+    """Work out which state a fetched page is in."""
+    return explain(text, final_url, rules)[0]
+
+
+def explain_markers(markers, final_url: str, rules: RuleSet = RULES) -> tuple:
+    """Work out a page's state from the regions an event-mode parse picked out, and why."""
+    if rules.unavailable in markers.banner or rules.unavailable in markers.title:
+        return UNAVAILABLE, f"'{rules.unavailable}' banner"
+
+    if any(marker in final_url for marker in rules.login_markers):
+        return LIVE_LOGIN, "redirected to login"
+
+    heading = markers.heading_text
+    if rules.heading in heading:
+        return LIVE_FORM, f"'{rules.heading}' heading"
+
+    if rules.form_field in markers.form_text and (rules.label in heading or rules.previous not in heading):
+        return LIVE_FORM, f"'{rules.form_field}' form field without an older year"
+
+    if rules.previous in heading:
+        return WRONG_YEAR, f"'{rules.previous}' heading"
+
+    return UNKNOWN, "no known markers"
+
+
+def classify_markers(markers, final_url: str, rules: RuleSet = RULES) -> str:
+    """Work out a page's state from the regions an event-mode parse picked out."""
+    return explain_markers(markers, final_url, rules)[0]
+
+
+def classify_html(text: str, final_url: str, rules: RuleSet = RULES) -> str:
+    """Classify a page held in memory using the event parser."""
+    return classify_markers(scan_html(text), final_url, rules)
+
+
+def explain_page(text: str, final_url: str, rules: RuleSet = RULES) -> tuple:
+    """State and reason for a page held in memory, parsed the way PARSE_MODE says to."""
+    text = text[:MAX_BODY_BYTES]
+    if PARSE_MODE == "events":
+        return explain_markers(scan_html(text), final_url, rules)
+    return explain(text, final_url, rules)
+
+
+def classify_page(text: str, final_url: str, rules: RuleSet = RULES) -> str:
+    """Classify a page held in memory the way PARSE_MODE says to."""
+    return explain_page(text, final_url, rules)[0]
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class CheckResult:
+    """What one check of a page found, without printing or notifying."""
+
+    __slots__ = ("state", "reason", "url", "status_code", "hash", "timings", "error")
+
+    def __init__(self, state: str = None, reason: str = None, url: str = None, status_code: int = None,
+                 hash: str = None, timings: dict = None, error: str = None):
+        self.state = state
+        self.reason = reason
+        self.url = url
+        self.status_code = status_code
+        self.hash = hash
+        self.timings = timings or {}    # Seconds, e.g. ttfb, fetch, classify, total
+        self.error = error
+
+    @property
+    def elapsed(self) -> float:
+        return self.timings.get("total")
+
+    @property
+    def live(self) -> bool:
+        return self.state in (LIVE_LOGIN, LIVE_FORM)
+
+    def __repr__(self):
+        if self.error:
+            return f"CheckResult(error={self.error!r})"
+        return f"CheckResult({self.state}, {self.reason!r}, {self.status_code}, {self.url!r})"
+
+
+def classify_many(responses, hash: bool = True) -> list:
+    """Classify recorded responses in bulk: no network, no printing, no email.
+
+    Each item can be anything with ``text`` and ``url`` attributes (a requests
+    or httpx response, say) or a ``(text, url)`` pair. ``status_code`` is
+    picked up when present.
+    """
+    results = []
+    append = results.append
+    clock = time.perf_counter
+    for item in responses:
+        if isinstance(item, tuple):
+            text, url, status = item[0], item[1], None
+        else:
+            text, url, status = item.text, str(item.url), getattr(item, "status_code", None)
+        text = text[:MAX_BODY_BYTES]
+        started = clock()
+        state, reason = explain_page(text, url)
+        timings = {"classify": clock() - started}
+        append(CheckResult(state, reason, url, status, content_hash(text.encode()) if hash else None, timings))
+    return results
+
+
+def get_history():
+    """The poll history for this process, opened on first use, or None if disabled."""
+    global _history
+    if _history is None and HISTORY_DB:
+        _history = PollHistory(HISTORY_DB)
+        atexit.register(_history.close)     # Flush whatever is still buffered
+    return _history
+
+
+def get_pre_probe():
+    """The pre-probe for this process, set up on first use, or None if disabled."""
+    global _pre_probe
+    if _pre_probe is None and PRE_PROBE:
+        from preprobe import PreProbe
+        _pre_probe = PreProbe(PRE_PROBE, PROBE_FILE)
+    return _pre_probe
+
+
+def record_poll(result: CheckResult):
+    """Add a poll to the history, if one is configured."""
+    history = get_history()
+    if history is not None:
+        history.record(URL, result.state, status=result.status_code, url=result.url,
+                       content_hash=result.hash, elapsed=result.elapsed, ttfb=result.timings.get("ttfb"))
+
+
+def email_alert(status: str, **message):
+    """Email an alert, batched into a digest when WRB_COALESCE_WINDOW is set."""
+    if COALESCE_WINDOW > 0:
+        from coalesce import get_coalescer
+        get_coalescer().send(status, **message)
+    else:
+        send_email(status, **message)
+
+
+def notify(status: str, **message):
+    """Alert on every configured channel at once, or by email if none are configured.
+
+    ``message`` can replace the alert's ``subject`` and ``body``. Call this
+    outside an event loop; async code awaits ``notify_async()`` instead.
+    """
+    if not NOTIFY_CHANNELS:
+        email_alert(status, **message)
         return
-    
-    # If we find "Preferred Start" with 2025/26, that's also valid
-    if "Preferred Start" in text and "2025/26" in text:
-        send_email("Booking form detected")
+    from notifiers import notify_channels      # httpx is only needed for push channels
+    notify_channels(status, NOTIFY_CHANNELS, **message)
+
+
+async def notify_async(status: str, **message):
+    """``notify()`` for code running in an event loop: channels are awaited, email goes to a worker thread."""
+    if not NOTIFY_CHANNELS:
+        await asyncio.to_thread(email_alert, status, **message)
         return
+    from notifiers import notify_channels_async
+    await notify_channels_async(status, NOTIFY_CHANNELS, **message)
+
+
+def fetch(url: str = None, **kwargs):
+    """GET a page (URL by default), following redirects. Everything that fetches the WRB page goes through here."""
+    return (FETCH_SESSION or requests).get(url or URL, allow_redirects=True, **kwargs)
+
+
+def _fetch_and_classify():
+    """Fetch the WRB page and classify it; returns the CheckResult and the response."""
+    started = time.perf_counter()
+    if PARSE_MODE == "events":
+        r = fetch(stream=True)
+        fetched = time.perf_counter()
+        markers = scan_response(r, MAX_BODY_BYTES)      # Parsing happens as the body streams in
+        state, reason = explain_markers(markers, r.url)
+        digest = markers.content_hash
+    else:
+        r = fetch(stream=True)
+        body = read_response(r, MAX_BODY_BYTES)     # Bytes, not characters, and never past the limit
+        fetched = time.perf_counter()
+        text = body.decode(r.encoding or "utf-8", errors="replace")
+        state, reason = explain(text, r.url)
+        digest = content_hash(body)
+    done = time.perf_counter()
+    timings = {"ttfb": r.elapsed.total_seconds(), "fetch": fetched - started,
+               "classify": done - fetched, "total": done - started}
+    return CheckResult(state, reason, r.url, r.status_code, digest, timings), r
+
+
+def check_page() -> CheckResult:
+    probe = get_pre_probe()
+    unchanged = probe.check(URL) if probe is not None else None
+    try:
+        result, r = (unchanged, None) if unchanged is not None else _fetch_and_classify()
+    except requests.RequestException as e:
+        if not STATE_FILE:
+            raise
+        result, r = CheckResult(ERROR, "fetch failed", error=f"{type(e).__name__}: {e}"), None
+    if r is not None and probe is not None:
+        probe.learn(result)
+    record_poll(result)
+    sample = probe.response if unchanged is not None else r
+    if sample is not None:
+        for observer in OBSERVERS:
+            observer(URL, sample, result.state, result.elapsed, unchanged is not None)
+
+    if STATE_FILE:
+        from state_machine import get_state_machine
+        machine = get_state_machine()
+        if machine.observe_result(URL, result) is None and machine.get(URL) == UNAVAILABLE:
+            print("Still unavailable.")
+        return result
+
+    if result.state == UNAVAILABLE:
+        print("Still unavailable.")
+        return result
 
-    print("Page changed, but not sure what it is. Check manually.")
-    send_email("UNEXPECTED CHANGE - Page changed but not recognized as booking system. Manual check required.")
+    if result.state in (WRONG_YEAR, UNKNOWN):
+        print("Page changed, but not sure what it is. Check manually.")
+    notify(STATUS_MESSAGES[result.state])
+    return result
 
 
 if __name__ == "__main__":
@@ -0,0 +1,251 @@
+"""
+Alert coalescing: one digest per recipient instead of a burst of emails.
+
+When several targets are watched, one upstream event (ABS coming back after
+maintenance, say) raises a burst of alerts at once. Sent one by one, each is a
+separate SMTP login, and together they can trip Gmail's rate limits.
+
+A ``Coalescer`` collects alerts raised within ``window`` seconds of each other
+and sends them to each recipient as a single digest, over one reused SMTP
+session. The first urgent alert in a window (a go-live) is never held back:
+it goes out at once, along with anything already waiting for that recipient,
+and only what follows it is batched. A digest that fails to send is kept and
+goes out with that recipient's next one. With backup accounts (WRB_SMTP_ACCOUNTS)
+each digest goes through failover.py's hedged send instead, so an outage of
+the primary account can't stop it.
+
+``Coalescer.send()`` takes the same arguments as ``send_email()``, so it can be
+passed as the ``send`` of a Watchlist or AnomalyDetector. ``check_page()``
+routes its email alerts through a shared Coalescer when WRB_COALESCE_WINDOW
+is set.
+"""
+
+import atexit
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+
+import check_wrb2526
+import failover
+from check_wrb2526 import ALERT_SUBJECT
+from notifiers import HIGH, Alert
+
+SMTP_IDLE = 60      # Seconds an SMTP session is kept open between sends; Gmail drops idle ones
+
+
+def _start_timer(delay: float, callback):
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class Mailer:
+    """Sends messages over one SMTP session, logging in again only when it has gone idle or dropped.
+
+    With backup accounts configured, messages go through ``failover.send_hedged()`` instead.
+    """
+
+    def __init__(self, idle: float = SMTP_IDLE, clock=time.monotonic):
+        self.idle = idle
+        self.clock = clock
+        self.sessions = 0       # SMTP logins made
+        self.sent = 0
+        self._server = None
+        self._used_at = None
+
+    def _session(self):
+        if self._server is not None and self.clock() - self._used_at > self.idle:
+            self.close()
+        if self._server is None:
+            server = check_wrb2526.smtp_connect()
+            try:
+                check_wrb2526.smtp_login(server)
+            except Exception:
+                server.close()
+                raise
+            self._server, self._used_at = server, self.clock()
+            self.sessions += 1
+        return self._server
+
+    def send(self, msg, priority: int = HIGH) -> bool:
+        """Send one message, reconnecting once if the server dropped the session.
+
+        Returns False if the rate limits held a low-priority message back.
+        """
+        if check_wrb2526.SMTP_ACCOUNTS:
+            if failover.send_hedged(msg, priority) is None:
+                return False
+            self.sent += 1
+            return True
+        if not check_wrb2526.reserve_send(msg["To"], priority):
+            return False
+        try:
+            self._session().send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self._server = None
+            self._session().send_message(msg)
+        self._used_at = self.clock()
+        self.sent += 1
+        return True
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except smtplib.SMTPException:
+            self._server.close()
+        self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Digest:
+    """Alerts waiting for one recipient, and when their window closes."""
+
+    __slots__ = ("to", "alerts", "opened", "urgent_sent", "timer")
+
+    def __init__(self, to: str, opened: float):
+        self.to = to
+        self.alerts = []
+        self.opened = opened
+        self.urgent_sent = False
+        self.timer = None
+
+
+def digest_message(alerts, to: str) -> MIMEText:
+    """One email for a batch of alerts: a lone alert unchanged, several as a digest, most urgent first."""
+    if len(alerts) == 1:
+        subject, body = alerts[0].subject, alerts[0].body
+    else:
+        alerts = sorted(alerts, key=lambda alert: (-alert.priority, alert.raised_at))
+        subject = f"{alerts[0].subject} (+{len(alerts) - 1} more)"
+        sections = [f"[{time.strftime('%H:%M:%S', time.localtime(alert.raised_at))}] {alert.subject}\n\n{alert.body}"
+                    for alert in alerts]
+        body = f"{len(alerts)} alerts:\n\n" + "\n\n----------\n\n".join(sections)
+    msg = MIMEText(body)
+    msg["Subject"] = subject
+    msg["From"] = check_wrb2526.EMAIL_USER
+    msg["To"] = to
+    return msg
+
+
+class Coalescer:
+    """Batches alerts raised within ``window`` seconds into one email per recipient.
+
+    Windows close on a timer by default; pass ``schedule=None`` to close them
+    only from ``flush_due()`` (a polling loop, or tests with their own clock).
+    """
+
+    def __init__(self, window: float = None, mailer: Mailer = None, clock=time.time, schedule=_start_timer):
+        self.window = check_wrb2526.COALESCE_WINDOW if window is None else window
+        self.mailer = mailer or Mailer()
+        self.clock = clock
+        self.schedule = schedule
+        self.raised = 0
+        self._pending = {}      # recipient -> Digest
+        self._lock = threading.RLock()
+
+    def send(self, status: str, subject: str = ALERT_SUBJECT, body: str = None, to: str = None,
+             target: str = None):
+        """Queue an alert, as ``send_email()`` would send it; urgent ones may go out at once."""
+        alert = Alert(status, subject, body, raised_at=self.clock())
+        if target is not None:
+            alert.target = target
+        self.submit(alert, to or check_wrb2526.TO_EMAIL)
+
+    def submit(self, alert: Alert, to: str):
+        with self._lock:
+            self.raised += 1
+            now = self.clock()
+            digest = self._pending.get(to)
+            if digest is not None and now >= digest.opened + self.window:
+                self._deliver(digest)       # Overdue: its timer hasn't fired yet
+                digest = None
+            if digest is None:
+                digest = self._pending[to] = Digest(to, now)
+                if self.schedule is not None and self.window > 0:
+                    digest.timer = self.schedule(self.window, lambda: self._close(digest))
+            digest.alerts.append(alert)
+            if (alert.priority >= HIGH and not digest.urgent_sent) or self.window <= 0:
+                self._send(digest)
+                digest.urgent_sent = True
+
+    def flush_due(self, now: float = None) -> int:
+        """Send every digest whose window has closed; returns how many were sent."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            due = [digest for digest in self._pending.values() if now >= digest.opened + self.window]
+            return sum(self._deliver(digest) for digest in due)
+
+    def flush(self) -> int:
+        """Send everything still waiting, window or not."""
+        with self._lock:
+            return sum(self._deliver(digest) for digest in list(self._pending.values()))
+
+    def close(self):
+        self.flush()
+        self.mailer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _close(self, digest: Digest):
+        with self._lock:
+            if self._pending.get(digest.to) is digest:
+                try:
+                    self._deliver(digest)
+                except Exception as e:      # Nobody to raise to on the timer thread
+                    print(f"❌ Digest to {digest.to} failed, keeping it for the next window: "
+                          f"{type(e).__name__}: {e}")
+
+    def _deliver(self, digest: Digest) -> int:
+        """End a digest's window, sending whatever it still holds."""
+        del self._pending[digest.to]
+        if digest.timer is not None:
+            digest.timer.cancel()
+        return self._send(digest)
+
+    def _send(self, digest: Digest) -> int:
+        if not digest.alerts:
+            return 0
+        alerts, digest.alerts = digest.alerts, []
+        try:
+            sent = self.mailer.send(digest_message(alerts, digest.to), max(alert.priority for alert in alerts))
+        except Exception:
+            self._restore(digest.to, alerts)
+            raise
+        if not sent:
+            return 0
+        print(f"📧 Sent {len(alerts)} alert{'s' if len(alerts) > 1 else ''} to {digest.to}")
+        return 1
+
+    def _restore(self, to: str, alerts: list):
+        """Put alerts that failed to send back at the head of the recipient's pending digest."""
+        digest = self._pending.get(to)
+        if digest is None:
+            digest = self._pending[to] = Digest(to, self.clock())
+            if self.schedule is not None and self.window > 0:
+                digest.timer = self.schedule(self.window, lambda: self._close(digest))
+        digest.alerts[:0] = alerts
+
+
+_coalescer = None
+
+
+def get_coalescer() -> Coalescer:
+    """The process-wide Coalescer, flushed at exit."""
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = Coalescer()
+        atexit.register(_coalescer.close)
+    return _coalescer
@@ -0,0 +1,180 @@
+"""
+SMTP failover: race the alert across several accounts.
+
+If smtp.gmail.com is slow or refuses the login, ``send_email()`` used to raise
+and the alert was lost. With backup accounts configured, a send starts on the
+primary account. If that hasn't succeeded within ``HEDGE_DELAY`` seconds, the
+next account starts as well, and so on; if an attempt fails outright, the next
+one starts at once. The first attempt to deliver wins, so a degraded
+provider costs at most the hedging delay.
+
+Every attempt sends the same Message-ID. Any attempt that is still logging in
+when another wins gives up before sending. Two attempts can still both get as
+far as sending; the copies share one Message-ID, which some mail clients
+collapse into one message and others show twice. A message whose Message-ID
+has already been delivered is not sent again.
+
+With a priority, the rate limits (see ratelimit.py) are charged to each
+account only as it is about to send. An account whose limits refuse the
+message hands it on to the next one.
+
+The primary account is the usual SMTP_SERVER / EMAIL_USER / EMAIL_PASS.
+Backups come from WRB_SMTP_ACCOUNTS as ``user:password@host:port`` entries,
+comma-separated; port 465 means SSL, any other port plain SMTP with STARTTLS.
+``send_email()`` uses this whenever WRB_SMTP_ACCOUNTS is set.
+"""
+
+import copy
+import os
+import queue
+import smtplib
+import threading
+from collections import OrderedDict
+from email.utils import make_msgid
+
+import check_wrb2526
+
+HEDGE_DELAY = float(os.getenv("WRB_SMTP_HEDGE", 2.0))
+DELIVERED_LIMIT = 1000      # Message-IDs remembered for duplicate suppression
+
+
+class SMTPAccount:
+    """An account to send through: server, port and login."""
+
+    __slots__ = ("host", "port", "user", "password", "use_ssl")
+
+    def __init__(self, host: str, port: int, user: str, password: str, use_ssl: bool = None):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = port == 465 if use_ssl is None else use_ssl
+
+    @property
+    def name(self) -> str:
+        return f"{self.user}@{self.host}"
+
+    def __repr__(self):
+        return f"SMTPAccount({self.name}:{self.port})"
+
+
+class FailoverError(smtplib.SMTPException):
+    """Every account failed; ``errors`` maps each account's name to what went wrong."""
+
+    def __init__(self, errors: dict):
+        super().__init__("All SMTP accounts failed: " + "; ".join(f"{name}: {e}" for name, e in errors.items()))
+        self.errors = errors
+
+
+def parse_accounts(spec: str) -> list:
+    """Accounts from ``user:password@host:port,...``; the password may contain ':'."""
+    accounts = []
+    for entry in filter(None, (part.strip() for part in (spec or "").split(","))):
+        login, _, server = entry.rpartition("@")
+        user, _, password = login.partition(":")
+        host, _, port = server.partition(":")
+        if not (user and host):
+            raise ValueError(f"Bad SMTP account {entry!r} in WRB_SMTP_ACCOUNTS; expected user:password@host:port")
+        accounts.append(SMTPAccount(host, int(port or 465), user, password))
+    return accounts
+
+
+def smtp_accounts() -> list:
+    """The primary account from the usual settings, then the backups from WRB_SMTP_ACCOUNTS."""
+    primary = SMTPAccount(check_wrb2526.SMTP_SERVER, check_wrb2526.SMTP_PORT, check_wrb2526.EMAIL_USER,
+                          check_wrb2526.EMAIL_PASS, check_wrb2526.SMTP_USE_SSL)
+    return [primary] + parse_accounts(check_wrb2526.SMTP_ACCOUNTS)
+
+
+class HedgedSender:
+    """Sends each message on whichever account delivers it first, starting backups after a delay."""
+
+    def __init__(self, accounts, hedge_delay: float = None, timeout: float = 30):
+        self.accounts = list(accounts)
+        self.hedge_delay = HEDGE_DELAY if hedge_delay is None else hedge_delay
+        self.timeout = timeout
+        self.delivered = OrderedDict()      # Message-ID -> account name
+        self._lock = threading.Lock()
+
+    def _attempt(self, account: SMTPAccount, msg, priority, won: threading.Event, results: queue.Queue):
+        try:
+            with check_wrb2526.smtp_connect(self.timeout, account.host, account.port, account.use_ssl) as server:
+                check_wrb2526.smtp_login(server, account.user, account.password, account.use_ssl)
+                if won.is_set():
+                    results.put((account, None, "lost"))
+                    return
+                if priority is not None and not check_wrb2526.reserve_send(msg["To"], priority, account.user):
+                    results.put((account, None, "held"))
+                    return
+                own = copy.deepcopy(msg)
+                del own["From"]
+                own["From"] = account.user
+                server.send_message(own)
+            won.set()
+            results.put((account, None, "sent"))
+        except Exception as e:
+            results.put((account, e, "failed"))
+
+    def send(self, msg, priority: int = None):
+        """Deliver ``msg``; returns the winning account, or None if it was delivered before.
+
+        With ``priority``, each account's rate limits are charged as it sends.
+        Returns None as well if they held a low-priority message back on every
+        account. Raises FailoverError if every account failed.
+        """
+        if msg["Message-ID"] is None:
+            msg["Message-ID"] = make_msgid(domain=(check_wrb2526.EMAIL_USER or "wrb").rpartition("@")[2] or None)
+        message_id = msg["Message-ID"]
+        with self._lock:
+            if message_id in self.delivered:
+                print(f"⏭️ Already delivered {message_id} via {self.delivered[message_id]}; not sending again")
+                return None
+
+        won, results = threading.Event(), queue.Queue()
+        pending, errors, held = list(self.accounts), {}, 0
+        self._start(pending.pop(0), msg, priority, won, results)
+        while True:
+            try:
+                account, error, outcome = results.get(timeout=self.hedge_delay if pending else None)
+            except queue.Empty:
+                print(f"⏱️ No delivery after {self.hedge_delay:g}s; also trying {pending[0].name}")
+                self._start(pending.pop(0), msg, priority, won, results)
+                continue
+            if outcome == "sent":
+                break
+            if outcome in ("failed", "held"):
+                if outcome == "failed":
+                    print(f"⚠️ {account.name} failed: {error}")
+                    errors[account.name] = error
+                else:
+                    held += 1
+                if len(errors) + held == len(self.accounts):
+                    if held:
+                        return None     # reserve_send() has said why
+                    raise FailoverError(errors)
+                if pending:
+                    self._start(pending.pop(0), msg, priority, won, results)
+
+        with self._lock:
+            self.delivered[message_id] = account.name
+            while len(self.delivered) > DELIVERED_LIMIT:
+                self.delivered.popitem(last=False)
+        return account
+
+    def _start(self, account: SMTPAccount, msg, priority, won, results):
+        threading.Thread(target=self._attempt, args=(account, msg, priority, won, results), daemon=True).start()
+
+
+_sender = None
+
+
+def get_sender() -> HedgedSender:
+    """The process-wide HedgedSender, so Message-IDs are remembered across sends."""
+    global _sender
+    if _sender is None:
+        _sender = HedgedSender(smtp_accounts())
+    return _sender
+
+
+def send_hedged(msg, priority: int = None):
+    return get_sender().send(msg, priority)
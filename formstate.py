@@ -0,0 +1,235 @@
+"""
+ASP.NET WebForms form-state handling.
+
+Every postback to a WebForms page such as the WRB booking form has to echo the
+page's hidden ``__VIEWSTATE`` / ``__EVENTVALIDATION`` fields. Fetching them with
+a GET before every POST doubles the round trips, so FormStateCache keeps them:
+
+- tokens are pulled out with a streaming parser that stops reading at the end
+  of the form, so every hidden field it carries is posted back
+- every postback response carries fresh tokens, which replace the cached ones,
+  so the next action needs no GET
+- if the server rejects cached tokens they are dropped, re-fetched and the post
+  is retried once; any other error is left alone, as the post may have landed
+- a background thread re-fetches tokens that are close to going stale
+"""
+
+import codecs
+import threading
+import time
+from html.parser import HTMLParser
+
+import requests
+
+REQUEST_TIMEOUT = 15
+MAX_AGE = 15 * 60           # ASP.NET sessions time out after 20 minutes by default
+REFRESH_AHEAD = 0.8         # Re-fetch once tokens are this far through MAX_AGE
+CHUNK_SIZE = 8192
+DRAIN_LIMIT = 64 * 1024     # Read out remainders up to this size to keep the connection
+
+# Errors ASP.NET returns when posted form state isn't accepted
+REJECTED_MARKERS = (
+    "Validation of viewstate MAC failed",
+    "Invalid postback or callback argument",
+    "Invalid viewstate",
+)
+
+
+class FormParser(HTMLParser):
+    """
+    Incrementally collect the inputs of the first <form> on a page.
+
+    Feed it text as it arrives; ``done`` turns True once the form has closed.
+    Hidden inputs can come anywhere in the form, not just the ASP.NET ones at
+    the top, so nothing short of the closing tag is enough.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.inputs = []
+        self.done = False
+        self._in_form = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "form":
+            self._in_form = True
+        elif tag == "input" and self._in_form:
+            attrs = dict(attrs)
+            name = attrs.get("name")
+            if not name:
+                return
+            self.inputs.append(((attrs.get("type") or "text").lower(), name, attrs.get("value") or ""))
+
+    def handle_endtag(self, tag):
+        if tag == "form" and self._in_form:
+            self._in_form = False
+            self.done = True
+
+    def hidden(self) -> dict:
+        return {name: value for kind, name, value in self.inputs if kind == "hidden"}
+
+
+def form_inputs(html: str) -> list:
+    """Return ``(type, name, value)`` for every input in the page's first form."""
+    parser = FormParser()
+    parser.feed(html)
+    return parser.inputs
+
+
+def hidden_fields(html: str) -> dict:
+    """Return every hidden input (``__VIEWSTATE`` and friends) of a WebForms page's form."""
+    parser = FormParser()
+    parser.feed(html)
+    return parser.hidden()
+
+
+def stream_hidden_fields(response) -> dict:
+    """Read a streamed response only as far as the end of its form, then close it."""
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    parser = FormParser()
+    chunks = response.iter_content(CHUNK_SIZE)
+    try:
+        for chunk in chunks:
+            parser.feed(decoder.decode(chunk))
+            if parser.done:
+                break
+        # A short remainder is cheaper to read than a new connection next time
+        length = response.headers.get("Content-Length", "")
+        if length.isdigit() and int(length) <= DRAIN_LIMIT:
+            for _ in chunks:
+                pass
+    finally:
+        response.close()
+    return parser.hidden()
+
+
+def rejected(response) -> bool:
+    """
+    Return True if the server refused the posted form state.
+
+    Only ASP.NET's own MAC and validation errors count. A bare 5xx may have
+    come after the booking was saved, and posting it again could book twice.
+    """
+    return any(marker in response.text for marker in REJECTED_MARKERS)
+
+
+class FormState:
+    """Cached hidden fields for one form URL."""
+
+    __slots__ = ("fields", "fetched_at")
+
+    def __init__(self, fields, fetched_at):
+        self.fields = fields
+        self.fetched_at = fetched_at
+
+
+class FormStateCache:
+    """Keep WebForms tokens warm so each action is a single round trip."""
+
+    def __init__(self, session=None, max_age=MAX_AGE, refresh_ahead=REFRESH_AHEAD,
+                 timeout=REQUEST_TIMEOUT):
+        self.session = session or requests.Session()
+        self.max_age = max_age
+        self.refresh_ahead = refresh_ahead
+        self.timeout = timeout
+        self.stats = {"hits": 0, "fetches": 0, "updates": 0, "rejected": 0, "refreshed": 0}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def peek(self, url):
+        """Return cached fields for a URL without fetching, or None."""
+        with self._lock:
+            entry = self._entries.get(url)
+        return entry.fields if entry else None
+
+    def age(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+        return None if entry is None else time.time() - entry.fetched_at
+
+    def _store(self, url, fields) -> bool:
+        if "__VIEWSTATE" not in fields:
+            return False
+        with self._lock:
+            self._entries[url] = FormState(fields, time.time())
+        return True
+
+    def fetch(self, url) -> dict:
+        """GET a form page, reading only as far as its tokens, and cache them."""
+        self.stats["fetches"] += 1
+        r = self.session.get(url, stream=True, timeout=self.timeout)
+        fields = stream_hidden_fields(r)
+        if not self._store(url, fields):
+            raise RuntimeError(f"No form state found at {r.url}")
+        return fields
+
+    def get(self, url) -> dict:
+        """Return fresh form state for a URL, fetching only if it's missing or stale."""
+        age = self.age(url)
+        if age is not None and age < self.max_age:
+            self.stats["hits"] += 1
+            return self.peek(url)
+        return self.fetch(url)
+
+    def update(self, url, html) -> bool:
+        """Take the tokens from a page we already have (e.g. a postback response)."""
+        stored = self._store(url, hidden_fields(html))
+        if stored:
+            self.stats["updates"] += 1
+        return stored
+
+    def invalidate(self, url):
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def post(self, url, data, **kwargs):
+        """
+        Post to a form with cached state, keeping the tokens from the response.
+
+        If the server rejects the cached state, it is re-fetched and the post
+        retried once.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        r = self.session.post(url, data={**self.get(url), **data}, **kwargs)
+        if rejected(r):
+            self.stats["rejected"] += 1
+            self.invalidate(url)
+            r = self.session.post(url, data={**self.fetch(url), **data}, **kwargs)
+        self.update(url, r.text)
+        return r
+
+    def refresh_stale(self):
+        """Re-fetch every entry that is close to MAX_AGE."""
+        with self._lock:
+            due = [url for url, entry in self._entries.items()
+                   if time.time() - entry.fetched_at >= self.max_age * self.refresh_ahead]
+        for url in due:
+            try:
+                self.fetch(url)
+                self.stats["refreshed"] += 1
+            except (requests.RequestException, RuntimeError) as e:
+                print(f"⚠️  Form state refresh failed for {url}: {e}")
+
+    def start(self, interval=None):
+        """Start refreshing stale entries in the background."""
+        if self._thread is not None:
+            return
+        interval = interval or max(self.max_age * (1 - self.refresh_ahead) / 2, 0.01)
+
+        def run():
+            while not self._stop.wait(interval):
+                self.refresh_stale()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="formstate-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
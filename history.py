@@ -0,0 +1,294 @@
+"""
+Poll history: every check recorded in a local SQLite database.
+
+Each poll is one row in ``polls`` (timestamp, target, status code, final URL,
+content hash, state and timings). Writes are buffered and flushed in a single
+transaction, either every ``batch_size`` polls or every ``flush_interval``
+seconds, and the database runs in WAL mode so queries never block the poller.
+
+Alongside the raw rows, two summaries are kept up to date as each batch is
+flushed, so the common questions never have to scan ``polls``:
+
+- ``rollups``: per-target hourly and daily buckets with poll, live and error
+  counts and response-time totals
+- ``transitions``: one row each time a target's state changes, which answers
+  "when did it go live?" directly
+
+Run ``python history.py --help`` to query a database from the command line.
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+DEFAULT_DB = "wrb_history.sqlite3"
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 5.0    # Seconds a buffered poll may wait before being written
+PERIODS = {"hour": 3600, "day": 86400}
+LIVE_STATES = ("LIVE_LOGIN", "LIVE_FORM")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS polls (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    target TEXT NOT NULL,
+    status INTEGER,
+    url TEXT,
+    hash TEXT,
+    state TEXT NOT NULL,
+    elapsed REAL,
+    ttfb REAL
+);
+CREATE INDEX IF NOT EXISTS polls_target_ts ON polls (target, ts);
+CREATE INDEX IF NOT EXISTS polls_ts ON polls (ts);      -- Time ranges across every target
+
+CREATE TABLE IF NOT EXISTS rollups (
+    target TEXT NOT NULL,
+    period TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    polls INTEGER NOT NULL,
+    live INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    elapsed_sum REAL NOT NULL,
+    elapsed_max REAL NOT NULL,
+    first_ts REAL NOT NULL,
+    last_ts REAL NOT NULL,
+    PRIMARY KEY (target, period, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS transitions (
+    target TEXT NOT NULL,
+    ts REAL NOT NULL,
+    old_state TEXT,
+    new_state TEXT NOT NULL,
+    url TEXT,
+    PRIMARY KEY (target, ts)
+) WITHOUT ROWID;
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (target, period, bucket) DO UPDATE SET
+    polls = polls + excluded.polls,
+    live = live + excluded.live,
+    errors = errors + excluded.errors,
+    elapsed_sum = elapsed_sum + excluded.elapsed_sum,
+    elapsed_max = max(elapsed_max, excluded.elapsed_max),
+    first_ts = min(first_ts, excluded.first_ts),
+    last_ts = max(last_ts, excluded.last_ts)
+"""
+
+
+def bucket_start(ts: float, period: str) -> int:
+    """Start of the UTC hour or day containing ``ts``."""
+    size = PERIODS[period]
+    return int(ts // size * size)
+
+
+def parse_time(value: str, now: float = None) -> float:
+    """Parse an ISO date/time (UTC unless stated) or a relative age like ``36h`` or ``7d``."""
+    now = time.time() if now is None else now
+    units = {"m": 60, "h": 3600, "d": 86400}
+    if value[-1:] in units and value[:-1].replace(".", "", 1).isdigit():
+        return now - float(value[:-1]) * units[value[-1]]
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class PollHistory:
+    """Batched, thread-safe writer and query interface for the poll database."""
+
+    def __init__(self, path: str = DEFAULT_DB, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._last_state = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, target: str, state: str, status: int = None, url: str = None,
+               content_hash: str = None, elapsed: float = None, ttfb: float = None,
+               ts: float = None):
+        """Buffer one poll, flushing if the batch is full or has waited long enough."""
+        row = (time.time() if ts is None else ts, target, status, url, content_hash, state, elapsed, ttfb)
+        with self._lock:
+            self._pending.append(row)
+            due = (len(self._pending) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered polls, their rollups and any state changes in one transaction."""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+            if not rows:
+                return
+            rows.sort(key=lambda row: row[0])
+            with self.db:
+                self.db.executemany(
+                    "INSERT INTO polls (ts, target, status, url, hash, state, elapsed, ttfb) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self.db.executemany(UPSERT_ROLLUP, self._rollups(rows))
+                self.db.executemany("INSERT OR IGNORE INTO transitions VALUES (?, ?, ?, ?, ?)",
+                                    self._transitions(rows))
+
+    def _rollups(self, rows):
+        """Aggregate a batch into one row per target and bucket before upserting."""
+        buckets = {}
+        for ts, target, status, _url, _hash, state, elapsed, _ttfb in rows:
+            elapsed = elapsed or 0.0
+            error = status is None or status >= 400
+            for period in PERIODS:
+                key = (target, period, bucket_start(ts, period))
+                b = buckets.get(key)
+                if b is None:
+                    buckets[key] = [1, state in LIVE_STATES, error, elapsed, elapsed, ts, ts]
+                    continue
+                b[0] += 1
+                b[1] += state in LIVE_STATES
+                b[2] += error
+                b[3] += elapsed
+                b[4] = max(b[4], elapsed)
+                b[6] = ts
+        return [(*key, *b) for key, b in buckets.items()]
+
+    def _transitions(self, rows):
+        """Rows where a target's state differs from its previous poll."""
+        changes = []
+        for ts, target, _status, url, _hash, state, _elapsed, _ttfb in rows:
+            if target not in self._last_state:
+                last = self.db.execute("SELECT new_state FROM transitions WHERE target = ? "
+                                       "ORDER BY ts DESC LIMIT 1", (target,)).fetchone()
+                self._last_state[target] = last[0] if last else None
+            old = self._last_state[target]
+            if state != old:
+                changes.append((target, ts, old, state, url))
+                self._last_state[target] = state
+        return changes
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    # Queries
+
+    @staticmethod
+    def _range(target, since, until, column="ts"):
+        clauses, params = [], []
+        if target is not None:
+            clauses.append("target = ?")
+            params.append(target)
+        if since is not None:
+            clauses.append(f"{column} >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append(f"{column} < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def polls(self, target: str = None, since: float = None, until: float = None, limit: int = 100):
+        """Most recent raw polls in a time range, newest first."""
+        where, params = self._range(target, since, until)
+        return self.db.execute(f"SELECT * FROM polls{where} ORDER BY ts DESC LIMIT ?",
+                               (*params, limit)).fetchall()
+
+    def rollups(self, period: str = "hour", target: str = None, since: float = None, until: float = None):
+        """Hourly or daily buckets in a time range, oldest first."""
+        if since is not None:
+            since = bucket_start(since, period)     # Include the bucket `since` falls in
+        where, params = self._range(target, since, until, column="bucket")
+        where += (" AND " if where else " WHERE ") + "period = ?"
+        return self.db.execute(
+            "SELECT target, bucket, polls, live, errors, elapsed_sum / polls AS elapsed_avg, "
+            f"elapsed_max, first_ts, last_ts FROM rollups{where} ORDER BY target, bucket",
+            (*params, period)).fetchall()
+
+    def transitions(self, target: str = None, since: float = None, until: float = None):
+        """State changes in a time range, oldest first."""
+        where, params = self._range(target, since, until)
+        return self.db.execute(f"SELECT * FROM transitions{where} ORDER BY ts", params).fetchall()
+
+    def first_seen(self, state: str, target: str = None):
+        """The first time a target entered ``state``, or None."""
+        where, params = self._range(target, None, None)
+        where += (" AND " if where else " WHERE ") + "new_state = ?"
+        return self.db.execute(f"SELECT * FROM transitions{where} ORDER BY ts LIMIT 1",
+                               (*params, state)).fetchone()
+
+    def summary(self):
+        """Per-target totals, read from the daily rollups."""
+        return self.db.execute(
+            "SELECT target, sum(polls) AS polls, sum(live) AS live, sum(errors) AS errors, "
+            "sum(elapsed_sum) / sum(polls) AS elapsed_avg, min(first_ts) AS first_ts, "
+            "max(last_ts) AS last_ts FROM rollups WHERE period = 'day' GROUP BY target").fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the WRB poll history.")
+    parser.add_argument("--db", default=os.getenv("WRB_HISTORY_DB", DEFAULT_DB))
+    parser.add_argument("--target", help="Only this URL")
+    parser.add_argument("--since", help="ISO date/time or age such as 36h or 7d")
+    parser.add_argument("--until", help="ISO date/time or age such as 36h or 7d")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("summary", help="Totals per target")
+    polls = sub.add_parser("polls", help="Raw polls, newest first")
+    polls.add_argument("--limit", type=int, default=20)
+    rollup = sub.add_parser("rollup", help="Hourly or daily buckets")
+    rollup.add_argument("period", choices=sorted(PERIODS), nargs="?", default="hour")
+    sub.add_parser("transitions", help="State changes")
+    first = sub.add_parser("first", help="When a state was first seen")
+    first.add_argument("state")
+    args = parser.parse_args(argv)
+
+    since = parse_time(args.since) if args.since else None
+    until = parse_time(args.until) if args.until else None
+    history = PollHistory(args.db)
+    try:
+        if args.command == "summary":
+            for row in history.summary():
+                print(f"{row['target']}: {row['polls']} polls, {row['live']} live, {row['errors']} errors, "
+                      f"avg {row['elapsed_avg']:.3f}s, {format_time(row['first_ts'])} → {format_time(row['last_ts'])}")
+        elif args.command == "polls":
+            for row in history.polls(args.target, since, until, args.limit):
+                elapsed = f"{row['elapsed']:.3f}s" if row["elapsed"] is not None else "-"
+                print(f"{format_time(row['ts'])}  {row['state']:<12} {row['status'] or '-':>3}  {elapsed:>8}  {row['url']}")
+        elif args.command == "rollup":
+            for row in history.rollups(args.period, args.target, since, until):
+                print(f"{format_time(row['bucket'])}  {row['polls']:>6} polls  {row['live']:>5} live  "
+                      f"{row['errors']:>5} errors  avg {row['elapsed_avg']:.3f}s  max {row['elapsed_max']:.3f}s")
+        elif args.command == "transitions":
+            for row in history.transitions(args.target, since, until):
+                print(f"{format_time(row['ts'])}  {row['old_state'] or '-'} → {row['new_state']}  {row['url']}")
+        elif args.command == "first":
+            row = history.first_seen(args.state, args.target)
+            print(format_time(row["ts"]) if row else f"{args.state} never seen.")
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
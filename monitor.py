@@ -0,0 +1,107 @@
+"""
+Long-running monitor that polls ``check_page()`` on a forecast-driven schedule.
+
+Instead of a fixed cron, the monitor builds a ReleaseForecast from past
+go-live events (``WRB_GO_LIVE_EVENTS`` and, if ``WRB_HISTORY_DB`` is set, the
+poll history) and polls on a PollScheduler's schedule: often when a release is
+likely, rarely when it isn't. The forecast is rebuilt every REPLAN_INTERVAL so
+new change signals in the history are picked up.
+
+An AnomalyDetector watches every response. When the server's latency or
+headers shift, the forecast is rebuilt with the anomaly as a change signal and
+polling drops to BOOST_INTERVAL until the boost expires; ``WRB_PRE_ALERT=1``
+also emails an "activity detected" pre-alert. The monitor exits once the page
+is anything other than unavailable, after ``check_page()`` has sent its alert.
+With WRB_STATE_FILE set, that means the state machine's stable state, so a
+single error or unconfirmed poll doesn't end it. A failed fetch counts as an
+ERROR poll rather than stopping the monitor.
+
+Run ``python monitor.py``.
+"""
+
+import os
+import time
+
+import requests
+
+import check_wrb2526
+from anomaly import AnomalyDetector
+from check_wrb2526 import ERROR, URL, UNAVAILABLE, CheckResult, check_page, get_history
+from prediction import (ReleaseForecast, PollScheduler, change_signals, events_from_history,
+                        load_events)
+
+REPLAN_INTERVAL = 3600
+SIGNAL_LOOKBACK = 86400     # Seconds of history searched for change signals
+BOOST_INTERVAL = 30         # Seconds between polls while an anomaly is active
+
+
+def build_scheduler(now: float, history=None, events_file: str = None, signals=()) -> PollScheduler:
+    """Forecast the release from everything we know and schedule polls for it."""
+    events, signals = [], list(signals)
+    if events_file:
+        events += load_events(events_file)
+    if history is not None:
+        history.flush()
+        events += events_from_history(history)
+        signals += change_signals(history, URL, now - SIGNAL_LOOKBACK)
+    forecast = ReleaseForecast.build(events, signals, now=now)
+    return PollScheduler(forecast)
+
+
+def settled(result: CheckResult, machine=None) -> bool:
+    """Whether the page has changed for good: the machine's stable state if there is one, else this poll's."""
+    state = machine.get(URL) if machine is not None else result.state
+    return state not in (UNAVAILABLE, ERROR)
+
+
+def run(check=check_page, clock=time.time, sleep=time.sleep, history=None,
+        events_file: str = None, max_polls: int = None, detector: AnomalyDetector = None, machine=None):
+    """Poll on schedule until the page changes; returns the CheckResult that saw it.
+
+    ``machine`` defaults to check_page()'s state machine when WRB_STATE_FILE is set.
+    """
+    if machine is None and check_wrb2526.STATE_FILE:
+        from state_machine import get_state_machine
+        machine = get_state_machine()
+    scheduler, planned_at, polls, anomalies, last_poll = None, None, 0, 0, None
+    while max_polls is None or polls < max_polls:
+        now = clock()
+        if detector is not None and len(detector.anomalies) > anomalies:
+            anomalies = len(detector.anomalies)
+            print(f"⚠️ {detector.anomalies[-1]}")
+            scheduler = None        # Replan with the anomaly as a change signal
+        if scheduler is None or now - planned_at >= REPLAN_INTERVAL:
+            signals = detector.signal_times() if detector is not None else ()
+            scheduler, planned_at = build_scheduler(now, history, events_file, signals), now
+            print(f"📈 Planned {len(scheduler)} polls, expected detection latency "
+                  f"{scheduler.expected_latency():.0f}s")
+
+        due = scheduler.next_poll(now)
+        if detector is not None and detector.boosted(now) and last_poll is not None:
+            due = min(due, max(last_poll + BOOST_INTERVAL, now))
+        if due > planned_at + REPLAN_INTERVAL:
+            sleep(max(planned_at + REPLAN_INTERVAL - now, 0))
+            continue                # Replan before the next poll
+        if due > now:
+            sleep(due - now)
+
+        last_poll = clock()
+        try:
+            result = check()
+        except requests.RequestException as e:
+            print(f"❌ Poll failed: {type(e).__name__}: {e}")
+            result = CheckResult(ERROR, "fetch failed", error=f"{type(e).__name__}: {e}")
+        polls += 1
+        if settled(result, machine):
+            return result
+    return None
+
+
+def main():
+    detector = AnomalyDetector(pre_alert=os.getenv("WRB_PRE_ALERT") == "1")
+    check_wrb2526.OBSERVERS.append(detector)
+    run(history=get_history(), events_file=os.getenv("WRB_GO_LIVE_EVENTS"), detector=detector)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Alert channels, fired concurrently.
+
+Email can take a minute to reach a phone, so an alert can also go out as a
+push notification or a chat message. Each channel is a Notifier. ``Dispatcher``
+sends one Alert to every channel at once on a shared httpx.AsyncClient, with
+a separate timeout for each channel. Time to first alert is therefore the
+fastest channel's latency, and a slow or dead channel never holds up the
+others.
+
+- ``WebhookNotifier``: POSTs the alert as JSON to any URL
+- ``NtfyNotifier``: ntfy push (https://ntfy.sh/<topic> or a self-hosted server)
+- ``GotifyNotifier``: Gotify push
+- ``ChatNotifier``: Slack or Discord incoming webhooks
+- ``EmailNotifier``: ``check_wrb2526.email_alert()``, run in a worker thread
+
+``check_page()`` uses these when ``WRB_NOTIFY`` lists channels, as
+comma-separated ``kind:target`` entries::
+
+    WRB_NOTIFY=ntfy:https://ntfy.sh/wrb-alerts,discord:https://discord.com/api/webhooks/...,email
+
+Tokens come from WRB_NTFY_TOKEN and WRB_GOTIFY_TOKEN. Per-channel timeouts
+come from WRB_NOTIFY_TIMEOUT, in seconds. httpx is an optional dependency:
+``pip install .[async]``.
+
+Only the email channel is batched by WRB_COALESCE_WINDOW and held to the
+rate limits; push and chat channels send every alert as it is raised.
+``notify_channels()`` runs its own event loop, so code that already has one
+awaits ``notify_channels_async()`` instead.
+"""
+
+import asyncio
+import os
+import time
+
+try:
+    import httpx
+except ImportError:     # Only needed for push and chat channels
+    httpx = None
+
+import check_wrb2526
+from check_wrb2526 import (ALERT_SUBJECT, LIVE_FORM, LIVE_LOGIN, STATUS_MESSAGES, UNEXPECTED_STATUS, URL,
+                           alert_body)
+
+CHANNEL_TIMEOUT = float(os.getenv("WRB_NOTIFY_TIMEOUT", 10))
+
+# ntfy's priority scale; Gotify's 0-10 is twice this
+LOW = 2
+DEFAULT = 3
+HIGH = 5
+
+LIVE_MESSAGES = {STATUS_MESSAGES[LIVE_LOGIN], STATUS_MESSAGES[LIVE_FORM]}
+
+
+def priority_for(status: str) -> int:
+    """Go-live alerts are urgent; anything unrecognised is routine."""
+    if status in LIVE_MESSAGES:
+        return HIGH
+    return DEFAULT if status == UNEXPECTED_STATUS else LOW
+
+
+class Alert:
+    """One alert, in the form every channel formats from."""
+
+    __slots__ = ("status", "subject", "body", "url", "priority", "target", "raised_at")
+
+    def __init__(self, status: str, subject: str = ALERT_SUBJECT, body: str = None, url: str = URL,
+                 priority: int = None, target: str = URL, raised_at: float = None):
+        self.status = status
+        self.subject = subject
+        self.body = body if body is not None else alert_body(status)
+        self.url = url
+        self.priority = priority if priority is not None else priority_for(status)
+        self.target = target
+        self.raised_at = raised_at if raised_at is not None else time.time()
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"Alert({self.status!r}, priority={self.priority})"
+
+
+class Delivery:
+    """How one channel fared with one alert; ``elapsed`` is from the start of the fan-out."""
+
+    __slots__ = ("channel", "ok", "elapsed", "error")
+
+    def __init__(self, channel: str, ok: bool, elapsed: float, error: str = None):
+        self.channel = channel
+        self.ok = ok
+        self.elapsed = elapsed
+        self.error = error
+
+    def __repr__(self):
+        outcome = "ok" if self.ok else f"failed: {self.error}"
+        return f"Delivery({self.channel}, {outcome}, {self.elapsed:.3f}s)"
+
+
+class NotificationError(RuntimeError):
+    """Every channel failed to deliver an alert."""
+
+
+class Notifier:
+    """A channel alerts can be sent on. Subclasses implement ``send()``."""
+
+    name = "notifier"
+
+    def __init__(self, timeout: float = CHANNEL_TIMEOUT):
+        self.timeout = timeout
+
+    async def send(self, client, alert: Alert):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name})"
+
+
+class HTTPNotifier(Notifier):
+    """A channel that is one HTTP POST, raising on any non-2xx answer."""
+
+    def __init__(self, url: str, timeout: float = CHANNEL_TIMEOUT):
+        super().__init__(timeout)
+        self.url = url
+
+    def request(self, alert: Alert) -> dict:
+        """Keyword arguments for ``client.post()``."""
+        raise NotImplementedError
+
+    async def send(self, client, alert: Alert):
+        r = await client.post(self.url, timeout=self.timeout, **self.request(alert))
+        r.raise_for_status()
+
+
+class WebhookNotifier(HTTPNotifier):
+    name = "webhook"
+
+    def __init__(self, url: str, headers: dict = None, timeout: float = CHANNEL_TIMEOUT):
+        super().__init__(url, timeout)
+        self.headers = headers or {}
+
+    def request(self, alert):
+        return {"json": alert.as_dict(), "headers": self.headers}
+
+
+class NtfyNotifier(HTTPNotifier):
+    """ntfy: the URL is the server plus topic, e.g. https://ntfy.sh/wrb-alerts."""
+
+    name = "ntfy"
+
+    def __init__(self, url: str, token: str = None, timeout: float = CHANNEL_TIMEOUT):
+        super().__init__(url, timeout)
+        self.token = token
+
+    def request(self, alert):
+        headers = {"Title": alert.subject.encode("utf-8"), "Priority": str(alert.priority),
+                   "Click": alert.url, "Tags": "rotating_light" if alert.priority >= HIGH else "warning"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return {"content": alert.body.encode("utf-8"), "headers": headers}
+
+
+class GotifyNotifier(HTTPNotifier):
+    """Gotify: the URL is the server root; the token is an application token."""
+
+    name = "gotify"
+
+    def __init__(self, url: str, token: str, timeout: float = CHANNEL_TIMEOUT):
+        super().__init__(url.rstrip("/") + "/message", timeout)
+        self.token = token
+
+    def request(self, alert):
+        return {"json": {"title": alert.subject, "message": alert.body, "priority": alert.priority * 2,
+                         "extras": {"client::notification": {"click": {"url": alert.url}}}},
+                "headers": {"X-Gotify-Key": self.token}}
+
+
+class ChatNotifier(HTTPNotifier):
+    """Slack or Discord incoming webhook."""
+
+    # style: (payload field, bold markup, channel-wide mention)
+    STYLES = {"slack": ("text", "*", "<!here>"), "discord": ("content", "**", "@here")}
+
+    def __init__(self, url: str, style: str = "slack", timeout: float = CHANNEL_TIMEOUT):
+        if style not in self.STYLES:
+            raise ValueError(f"Unknown chat style {style!r}; expected one of {', '.join(self.STYLES)}")
+        super().__init__(url, timeout)
+        self.name = style
+
+    def request(self, alert):
+        field, bold, mention = self.STYLES[self.name]
+        prefix = f"{mention} " if alert.priority >= HIGH else ""
+        return {"json": {field: f"{prefix}{bold}{alert.subject}{bold}\n{alert.body}"}}
+
+
+class EmailNotifier(Notifier):
+    """``email_alert()``, in a thread so it runs alongside the HTTP channels."""
+
+    name = "email"
+
+    async def send(self, client, alert: Alert):
+        # Looked up at call time so tests can patch check_wrb2526.send_email
+        await asyncio.to_thread(check_wrb2526.email_alert, alert.status, subject=alert.subject, body=alert.body)
+
+
+class Dispatcher:
+    """Fans alerts out to every channel concurrently on one shared client."""
+
+    def __init__(self, channels, client=None):
+        self.channels = list(channels)
+        needs_http = any(isinstance(channel, HTTPNotifier) for channel in self.channels)
+        if client is None and needs_http and httpx is None:
+            raise ImportError("Push and chat channels need httpx: pip install .[async]")
+        self._own_client = client is None and needs_http
+        self.client = client or (httpx.AsyncClient() if needs_http else None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._own_client:
+            await self.client.aclose()
+
+    async def _deliver(self, channel: Notifier, alert: Alert, started: float) -> Delivery:
+        try:
+            await asyncio.wait_for(channel.send(self.client, alert), channel.timeout)
+        except asyncio.TimeoutError:
+            return Delivery(channel.name, False, time.perf_counter() - started, f"timed out after {channel.timeout:g}s")
+        except Exception as e:
+            return Delivery(channel.name, False, time.perf_counter() - started, f"{type(e).__name__}: {e}")
+        return Delivery(channel.name, True, time.perf_counter() - started)
+
+    async def notify(self, alert: Alert) -> list:
+        """Send on every channel at once; returns a Delivery per channel, in channel order."""
+        started = time.perf_counter()
+        return await asyncio.gather(*(self._deliver(channel, alert, started) for channel in self.channels))
+
+
+def parse_channels(spec: str, timeout: float = CHANNEL_TIMEOUT) -> list:
+    """Build channels from a WRB_NOTIFY value such as ``ntfy:https://ntfy.sh/topic,email``."""
+    channels = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, target = entry.partition(":")
+        if kind == "email":
+            channels.append(EmailNotifier(timeout))
+        elif kind == "webhook":
+            channels.append(WebhookNotifier(target, timeout=timeout))
+        elif kind == "ntfy":
+            channels.append(NtfyNotifier(target, os.getenv("WRB_NTFY_TOKEN"), timeout))
+        elif kind == "gotify":
+            channels.append(GotifyNotifier(target, os.getenv("WRB_GOTIFY_TOKEN", ""), timeout))
+        elif kind in ChatNotifier.STYLES:
+            channels.append(ChatNotifier(target, kind, timeout))
+        else:
+            raise ValueError(f"Unknown notification channel {kind!r} in WRB_NOTIFY")
+    return channels
+
+
+async def notify_async(alert: Alert, channels, client=None) -> list:
+    async with Dispatcher(channels, client) as dispatcher:
+        return await dispatcher.notify(alert)
+
+
+async def notify_channels_async(status: str, spec: str, subject: str = ALERT_SUBJECT, body: str = None) -> list:
+    """Send one alert on every channel in ``spec``; raises NotificationError if none delivered it."""
+    deliveries = await notify_async(Alert(status, subject, body), parse_channels(spec))
+    for delivery in deliveries:
+        if delivery.ok:
+            print(f"📣 Alert sent via {delivery.channel} in {delivery.elapsed:.2f}s")
+        else:
+            print(f"❌ Alert via {delivery.channel} failed: {delivery.error}")
+    if not any(delivery.ok for delivery in deliveries):
+        raise NotificationError(f"No channel delivered the alert: {status}")
+    return deliveries
+
+
+def notify_channels(status: str, spec: str, subject: str = ALERT_SUBJECT, body: str = None) -> list:
+    """``notify_channels_async()`` for code with no event loop running."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(notify_channels_async(status, spec, subject, body))
+    raise RuntimeError("notify_channels() called inside a running event loop; await notify_channels_async()")
@@ -0,0 +1,214 @@
+"""
+Incremental, event-driven extraction of the page regions classification uses.
+
+Substring search over the whole page can't tell the ``BannerTitle`` span from
+a stray ``<td>`` that happens to mention "2025/26". PageMarkers is fed the
+response as it streams in and keeps only:
+
+- the ``<title>``
+- the ``span.BannerTitle`` text
+- ``<h1>``-``<h3>`` headings
+- the text and input names of the first ``<form>``
+
+It stops as soon as the page has told us enough: once an "Application
+Unavailable" banner has closed, once the first form has closed, or at
+``</body>``. Script and style contents are ignored.
+
+Work stays linear in the page size whatever the page looks like: region text
+is collected in lists rather than by repeated concatenation, and text that
+HTMLParser couldn't parse yet (an unclosed comment or tag) is only rescanned
+once at least as much new text has arrived. ``scan_response()`` also stops
+reading after ``limit`` bytes. ``scan_response_async()`` does the same for an
+httpx response; both take the body in CHUNK_SIZE pieces, so a page read either
+way stops at the same byte and gets the same ``content_hash``.
+"""
+
+import codecs
+import hashlib
+from html.parser import HTMLParser
+
+CHUNK_SIZE = 8192
+UNAVAILABLE_TEXT = "Application Unavailable"
+HEADINGS = ("h1", "h2", "h3")
+
+
+class PageMarkers(HTMLParser):
+    """Collect the title, banner, headings and first form of a page."""
+
+    def __init__(self, encoding="utf-8"):
+        super().__init__(convert_charrefs=True)
+        self.headings = []
+        self.fields = []
+        self.done = False
+        self.truncated = False      # Reading stopped at the size limit
+        self.bytes_read = 0
+        self._title = []
+        self._banner = []
+        self._banner_start = 0
+        self._form_text = []
+        self._pending = []
+        self._pending_size = 0
+        self._digest = hashlib.blake2b(digest_size=16)
+        self._decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+        self._in_title = False
+        self._banner_depth = 0
+        self._heading = None
+        self._in_form = False
+        self._form_seen = False
+        self._skip = 0          # Inside <script>/<style>
+
+    @property
+    def title(self) -> str:
+        return "".join(self._title)
+
+    @property
+    def banner(self) -> str:
+        return "".join(self._banner)
+
+    @property
+    def form_text(self) -> str:
+        return "".join(self._form_text)
+
+    @property
+    def heading_text(self) -> str:
+        """Everything that names the page: title, banner and headings."""
+        return " ".join([self.title, self.banner, *self.headings])
+
+    @property
+    def content_hash(self) -> str:
+        """Hash of the bytes read so far, which is all of them unless parsing stopped early."""
+        return self._digest.hexdigest()
+
+    def feed_bytes(self, chunk: bytes):
+        """Feed raw bytes as they arrive."""
+        self.bytes_read += len(chunk)
+        self._digest.update(chunk)
+        text = self._decoder.decode(chunk)
+        self._pending.append(text)
+        self._pending_size += len(text)
+        # Every feed rescans HTMLParser's unparsed backlog, so hold text back
+        # until there is at least as much of it as there is backlog
+        if self._pending_size >= len(self.rawdata):
+            self.flush()
+
+    def take(self, chunk: bytes, limit: int = None) -> bool:
+        """Feed one chunk of a streamed body, up to ``limit`` bytes in all; returns whether to read on."""
+        if limit is not None and self.bytes_read + len(chunk) > limit:
+            self.feed_bytes(chunk[:limit - self.bytes_read])
+            self.truncated = True
+            return False
+        self.feed_bytes(chunk)
+        return not self.done
+
+    def flush(self):
+        """Parse whatever feed_bytes() has held back."""
+        if self._pending:
+            data = "".join(self._pending)
+            self._pending, self._pending_size = [], 0
+            self.feed(data)
+
+    def feed(self, data):
+        if not self.done:
+            super().feed(data)
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "span":
+            if self._banner_depth:
+                self._banner_depth += 1
+            elif "BannerTitle" in (dict(attrs).get("class") or "").split():
+                self._banner_depth = 1
+                self._banner_start = len(self._banner)
+        elif tag in HEADINGS:
+            self._heading = []
+        elif tag == "form" and not self._form_seen:
+            self._in_form = True
+        elif tag == "input" and self._in_form:
+            name = dict(attrs).get("name")
+            if name:
+                self.fields.append(name)
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if tag in ("script", "style"):
+            self._skip = max(self._skip - 1, 0)
+        elif tag == "title":
+            self._in_title = False
+        elif tag == "span" and self._banner_depth:
+            self._banner_depth -= 1
+            if not self._banner_depth and UNAVAILABLE_TEXT in "".join(self._banner[self._banner_start:]):
+                self.done = True        # Nothing after this can change the verdict
+        elif tag in HEADINGS and self._heading is not None:
+            self.headings.append(" ".join("".join(self._heading).split()))
+            self._heading = None
+        elif tag == "form" and self._in_form:
+            self._in_form = False
+            self._form_seen = True
+            self.done = True
+        elif tag in ("body", "html"):
+            self.done = True
+
+    def handle_data(self, data):
+        if self.done or self._skip:
+            return
+        if self._in_title:
+            self._title.append(data)
+        if self._banner_depth:
+            self._banner.append(data)
+        if self._heading is not None:
+            self._heading.append(data)
+        if self._in_form:
+            self._form_text.append(data)
+
+
+def scan_html(html: str) -> PageMarkers:
+    """Extract markers from a page that is already in memory."""
+    markers = PageMarkers()
+    markers.feed(html)
+    return markers
+
+
+def scan_response(response, limit: int = None) -> PageMarkers:
+    """Stream a response into PageMarkers, closing it once they're done or ``limit`` bytes are in."""
+    markers = PageMarkers(response.encoding)
+    try:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if not markers.take(chunk, limit):
+                break
+        markers.flush()
+    finally:
+        response.close()
+    return markers
+
+
+async def scan_response_async(response, limit: int = None) -> PageMarkers:
+    """scan_response() for a streamed httpx response."""
+    markers = PageMarkers(response.charset_encoding)
+    try:
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            if not markers.take(chunk, limit):
+                break
+        markers.flush()
+    finally:
+        await response.aclose()
+    return markers
+
+
+def read_response(response, limit: int = None) -> bytes:
+    """Read a streamed response's body, closing it once ``limit`` bytes are in."""
+    body = bytearray()
+    try:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if limit is not None and len(body) + len(chunk) >= limit:
+                body += chunk[:limit - len(body)]
+                break
+            body += chunk
+    finally:
+        response.close()
+    return bytes(body)
@@ -0,0 +1,256 @@
+"""
+Forecasting when the next WRB system will go live, and polling to match.
+
+Past go-live times (recorded in the poll history or imported from a JSON file)
+are projected onto the upcoming season and smoothed twice: over the date, with
+a bandwidth of about a week, and over the time of day, since releases happen
+in office hours. A small uniform prior keeps some mass everywhere, and recent
+change signals (the unavailable page's content changing, for instance) add
+mass over the following hours. The result is a ReleaseForecast: a probability
+distribution over the horizon in fixed-width bins.
+
+PollScheduler turns a forecast into a precomputed list of poll times. Expected
+detection latency for a poll interval ``h`` is ``h / 2``, so for a given number
+of polls it is smallest when the interval goes as ``1 / sqrt(density)``. The
+scheduler picks the constant in front so that expected latency matches polling
+every ``BASELINE_INTERVAL`` seconds (or a given target or request budget), and
+clamps each interval between ``min_interval`` and ``max_interval``.
+
+Go-live events file (``WRB_GO_LIVE_EVENTS``)::
+
+    [{"system": "WRB2425", "live": "2024-07-15T09:30:00+01:00"},
+     {"system": "WRB2526", "live": "2025-07-21T10:00:00+01:00"}]
+
+Plain ISO strings are accepted too. Times without a zone are taken as UTC.
+"""
+
+import json
+import math
+from itertools import accumulate
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+ANCHOR_MONTH = 6                # Seasons run from 1 June
+BIN_SECONDS = 300
+HORIZON_DAYS = 120
+DATE_BANDWIDTH = 7 * 86400
+TIME_OF_DAY_BANDWIDTH = 1.5 * 3600
+PRIOR_WEIGHT = 0.05             # Share of the mass spread uniformly over the horizon
+SIGNAL_WEIGHT = 0.5             # Mass each change signal adds, relative to the model
+SIGNAL_DECAY = 6 * 3600         # Change signals point at a release within hours
+BASELINE_INTERVAL = 300         # The */5 cron the forecast has to match
+MIN_INTERVAL = 30
+MAX_INTERVAL = 3600
+LIVE_STATES = ("LIVE_LOGIN", "LIVE_FORM")
+
+
+def season_anchor(ts: float) -> float:
+    """Start of the season (1 June, UTC) that ``ts`` falls in."""
+    moment = datetime.fromtimestamp(ts, timezone.utc)
+    year = moment.year if moment.month >= ANCHOR_MONTH else moment.year - 1
+    return datetime(year, ANCHOR_MONTH, 1, tzinfo=timezone.utc).timestamp()
+
+
+def next_anchor(anchor: float) -> float:
+    year = datetime.fromtimestamp(anchor, timezone.utc).year + 1
+    return datetime(year, ANCHOR_MONTH, 1, tzinfo=timezone.utc).timestamp()
+
+
+def parse_event(value) -> float:
+    """Timestamp of one go-live event: an ISO string or ``{"live": iso}``."""
+    if isinstance(value, dict):
+        value = value["live"]
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def load_events(path: str) -> list:
+    """Imported go-live timestamps from a JSON file."""
+    with open(path) as f:
+        return [parse_event(value) for value in json.load(f)]
+
+
+def events_from_history(history, target: str = None) -> list:
+    """Times the poll history saw a target go from unavailable to live."""
+    return [row["ts"] for row in history.transitions(target)
+            if row["old_state"] == "UNAVAILABLE" and row["new_state"] in LIVE_STATES]
+
+
+def change_signals(history, target: str, since: float) -> list:
+    """Times the content of a still-unavailable page changed since ``since``."""
+    rows = history.db.execute("SELECT ts, hash FROM polls WHERE target = ? AND ts >= ? "
+                              "AND state = 'UNAVAILABLE' AND hash IS NOT NULL ORDER BY ts",
+                              (target, since)).fetchall()
+    return [ts for (ts, digest), (_, before) in zip(rows[1:], rows) if digest != before]
+
+
+def _normalise(weights):
+    total = sum(weights)
+    return array("d", (w / total for w in weights)) if total else None
+
+
+class ReleaseForecast:
+    """A distribution over release time, as probability per fixed-width bin."""
+
+    def __init__(self, start: float, probs, bin_seconds: int = BIN_SECONDS):
+        self.start = start
+        self.probs = probs
+        self.bin_seconds = bin_seconds
+
+    @property
+    def end(self) -> float:
+        return self.start + len(self.probs) * self.bin_seconds
+
+    @classmethod
+    def build(cls, events=(), signals=(), now: float = None, horizon_days: float = HORIZON_DAYS,
+              bin_seconds: int = BIN_SECONDS):
+        """Forecast the release from past go-live times and recent change signals."""
+        start = now - now % bin_seconds
+        bins = int(horizon_days * 86400 // bin_seconds)
+        centres = [start + (i + 0.5) * bin_seconds for i in range(bins)]
+        components = []
+
+        # Where past releases would land this season and next, relative to each season's start
+        anchor = season_anchor(now)
+        projected = [a + ts - season_anchor(ts) for ts in events for a in (anchor, next_anchor(anchor))]
+        projected = [c for c in projected if start - 3 * DATE_BANDWIDTH < c < start + bins * bin_seconds + 3 * DATE_BANDWIDTH]
+        if projected:
+            times_of_day = [c % 86400 for c in projected]
+            model = array("d", bytes(8 * bins))
+            for c, tod in zip(projected, times_of_day):
+                for i, t in enumerate(centres):
+                    z = (t - c) / DATE_BANDWIDTH
+                    if z * z > 36:
+                        continue
+                    d = abs(t % 86400 - tod)
+                    d = min(d, 86400 - d) / TIME_OF_DAY_BANDWIDTH
+                    model[i] += math.exp(-0.5 * (z * z + d * d))
+            model = _normalise(model)
+            if model:
+                components.append((1.0, model))
+
+        uniform = array("d", [1.0 / bins]) * bins
+        components.append((PRIOR_WEIGHT if components else 1.0, uniform))
+
+        for s in signals:
+            decay = array("d", (math.exp(-(t - s) / SIGNAL_DECAY) if t >= s else 0.0 for t in centres))
+            decay = _normalise(decay)
+            if decay:
+                components.append((SIGNAL_WEIGHT, decay))
+
+        total = sum(w for w, _ in components)
+        probs = array("d", bytes(8 * bins))
+        for weight, component in components:
+            share = weight / total
+            for i, p in enumerate(component):
+                probs[i] += share * p
+        return cls(start, probs, bin_seconds)
+
+    def _bin(self, ts: float) -> int:
+        return int((ts - self.start) // self.bin_seconds)
+
+    def density(self, ts: float) -> float:
+        """Probability per second at ``ts``; zero outside the horizon."""
+        i = self._bin(ts)
+        return self.probs[i] / self.bin_seconds if 0 <= i < len(self.probs) else 0.0
+
+    def mass(self, since: float, until: float) -> float:
+        """Probability that the release falls in ``[since, until)``."""
+        total = 0.0
+        for i in range(max(self._bin(since), 0), min(self._bin(until) + 1, len(self.probs))):
+            lo = max(since, self.start + i * self.bin_seconds)
+            hi = min(until, self.start + (i + 1) * self.bin_seconds)
+            if hi > lo:
+                total += self.probs[i] * (hi - lo) / self.bin_seconds
+        return total
+
+    def quantile(self, q: float) -> float:
+        """Earliest time by which the release has happened with probability ``q``."""
+        running = 0.0
+        for i, p in enumerate(self.probs):
+            if running + p >= q:
+                return self.start + (i + (q - running) / p) * self.bin_seconds
+            running += p
+        return self.end
+
+    def most_likely(self) -> float:
+        """Centre of the most probable bin."""
+        i = max(range(len(self.probs)), key=self.probs.__getitem__)
+        return self.start + (i + 0.5) * self.bin_seconds
+
+
+class PollScheduler:
+    """A precomputed poll schedule concentrated where the forecast has its mass."""
+
+    def __init__(self, forecast: ReleaseForecast, min_interval: float = MIN_INTERVAL,
+                 max_interval: float = MAX_INTERVAL, target_latency: float = None, budget: int = None):
+        self.forecast = forecast
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        if budget is None and target_latency is None:
+            target_latency = BASELINE_INTERVAL / 2
+        width = forecast.bin_seconds
+        self._roots = array("d", (math.sqrt(p / width) for p in forecast.probs))
+        self._sorted = sorted(self._roots)
+        self._root_sums = list(accumulate(self._sorted, initial=0.0))
+        self._mass_sums = list(accumulate((r * r * width for r in self._sorted), initial=0.0))
+        self.scale = self._solve(target_latency, budget)
+        self.intervals = self._intervals(self.scale)
+        self.schedule = self._walk()
+
+    def _intervals(self, scale: float):
+        """Poll interval in each forecast bin for a given scale."""
+        lo, hi = self.min_interval, self.max_interval
+        return array("d", (min(max(scale / root, lo), hi) if root else hi for root in self._roots))
+
+    def _estimate(self, scale: float):
+        """Expected detection latency and number of polls for a scale.
+
+        Bins are sorted by density, so the ones clamped to ``max_interval``,
+        unclamped and clamped to ``min_interval`` are three contiguous runs and
+        each estimate is two bisections over prefix sums.
+        """
+        lo, hi, width = self.min_interval, self.max_interval, self.forecast.bin_seconds
+        a = bisect_left(self._sorted, scale / hi)
+        b = max(bisect_right(self._sorted, scale / lo), a)
+        mass, roots = self._mass_sums, self._root_sums
+        latency = (hi * mass[a] + scale * width * (roots[b] - roots[a]) + lo * (mass[-1] - mass[b])) / 2
+        polls = width * (a / hi + (roots[b] - roots[a]) / scale + (len(self._sorted) - b) / lo)
+        return latency, polls
+
+    def _solve(self, target_latency, budget) -> float:
+        """Bisect (in log space) for the scale meeting the latency target or budget."""
+        lo, hi = 1e-6, 1e6
+        for _ in range(40):
+            mid = math.sqrt(lo * hi)
+            latency, polls = self._estimate(mid)
+            if (latency > target_latency) if budget is None else (polls < budget):
+                hi = mid
+            else:
+                lo = mid
+        return lo if budget is None else hi
+
+    def _walk(self):
+        forecast = self.forecast
+        times = array("d")
+        t = forecast.start
+        while t < forecast.end:
+            times.append(t)
+            t += self.intervals[forecast._bin(t)]
+        return times
+
+    def next_poll(self, now: float) -> float:
+        """The first scheduled poll after ``now``."""
+        i = bisect_right(self.schedule, now)
+        if i < len(self.schedule):
+            return self.schedule[i]
+        return now + self.max_interval        # Past the horizon: keep polling slowly
+
+    def expected_latency(self) -> float:
+        return self._estimate(self.scale)[0]
+
+    def __len__(self):
+        return len(self.schedule)
@@ -0,0 +1,206 @@
+"""
+Pre-probe: a HEAD, or a small Range GET, before the full GET.
+
+The "Application Unavailable" response is the same each time, ETag or not.
+It has the same status, final URL, Content-Length and headers. A
+``PreProbe`` fetches just the headers first and fingerprints them. If the
+fingerprint matches the one taken before the last full check, and that check
+found the page unavailable, the full GET and classification are skipped and
+the last result stands. Any difference falls through to a full check, which
+then takes the new fingerprint: a redirect to login, a new length, a new
+Last-Modified.
+
+Two guards stop a stale fingerprint from hiding a go-live, or costing more than
+it saves:
+
+- Every ``VERIFY_EVERY``th match still runs the full check. If the page has
+  changed while its fingerprint hasn't, the headers can't be trusted, so the
+  probe switches itself off.
+- The probe tracks its hit rate over the last ``WINDOW`` probes. Below
+  ``MIN_HIT_RATE`` the server isn't sending stable headers and each probe is
+  just an extra request, so it switches itself off.
+
+Either way it tries again after ``RETRY_AFTER``.
+
+``check_page()`` uses this when WRB_PRE_PROBE is "head" or "range". The
+fingerprint and hit rate are kept in WRB_PROBE_FILE between cron runs.
+Without that file they only last for one process, such as monitor.py.
+"""
+
+import json
+import os
+import time
+from collections import deque
+
+import requests
+
+import check_wrb2526
+from check_wrb2526 import UNAVAILABLE, CheckResult, content_hash
+
+MODES = ("head", "range")
+RANGE_BYTES = 1024          # Bytes a range probe asks for
+PROBE_TIMEOUT = 10
+WINDOW = 20                 # Probes the hit rate is measured over
+MIN_HIT_RATE = 0.5
+VERIFY_EVERY = 10           # Every Nth match runs the full check anyway
+RETRY_AFTER = 86400         # Seconds the probe stays off before trying again
+
+# Headers that identify a response without changing from one request to the next
+FINGERPRINT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Location", "Server", "X-Powered-By",
+                       "X-AspNet-Version", "Cache-Control")
+
+
+def size_of(response) -> str:
+    """The full body size a response declares, even for a 206 (from Content-Range)."""
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        return content_range.rsplit("/", 1)[1]
+    return response.headers.get("Content-Length")
+
+
+def fingerprint(response) -> str:
+    """Hash of a response's status, final URL, size and stable headers."""
+    parts = [response.status_code, response.url, size_of(response)]
+    parts += [response.headers.get(name) for name in FINGERPRINT_HEADERS]
+    return content_hash(json.dumps(parts).encode())
+
+
+class PreProbe:
+    """Skips full checks while a cheap probe's fingerprint shows the page unchanged."""
+
+    def __init__(self, mode: str = "head", path: str = None, window: int = WINDOW,
+                 min_hit_rate: float = MIN_HIT_RATE, verify_every: int = VERIFY_EVERY,
+                 retry_after: float = RETRY_AFTER, clock=time.time):
+        if mode not in MODES:
+            raise ValueError(f"Unknown pre-probe {mode!r} in WRB_PRE_PROBE; expected one of {', '.join(MODES)}")
+        self.mode = mode
+        self.path = path
+        self.window = window
+        self.min_hit_rate = min_hit_rate
+        self.verify_every = verify_every
+        self.retry_after = retry_after
+        self.clock = clock
+        self.reset()
+        if path and os.path.exists(path):
+            self.load()
+
+    def reset(self):
+        self.fingerprint = None     # Taken just before the last full check
+        self.last = None            # That check's CheckResult
+        self.outcomes = deque(maxlen=self.window)   # Whether each recent probe matched
+        self.matches = 0            # Matches since the last full check
+        self.disabled_until = 0.0
+        self.disabled_reason = None
+        self.skipped = 0
+        self._pending = None        # Fingerprint awaiting the full check's result
+        self._verifying = False
+        self.response = None        # The last probe's response, headers only
+
+    @property
+    def enabled(self) -> bool:
+        return self.clock() >= self.disabled_until
+
+    @property
+    def hit_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def probe(self, url: str):
+        """Fetch just enough of ``url`` to fingerprint it."""
+        session = check_wrb2526.FETCH_SESSION or requests
+        if self.mode == "head":
+            return session.head(url, allow_redirects=True, timeout=PROBE_TIMEOUT)
+        response = session.get(url, allow_redirects=True, stream=True, timeout=PROBE_TIMEOUT,
+                               headers={"Range": f"bytes=0-{RANGE_BYTES - 1}"})
+        response.close()        # Never read the body, even if the server ignored the Range
+        return response
+
+    def check(self, url: str) -> CheckResult:
+        """Probe ``url``; returns the last result if the page is unchanged, or None if it needs a full check.
+
+        After None, pass the full check's result to ``learn()``.
+        """
+        self._pending, self._verifying = None, False
+        self.response = None
+        if not self.enabled:
+            return None
+        if self.disabled_until:
+            print(f"🔎 Retrying the {self.mode} pre-probe")
+            self.reset()
+        started = time.perf_counter()
+        try:
+            response = self.probe(url)
+        except requests.RequestException:
+            return None     # The full check will see the same failure and handle it
+        elapsed = time.perf_counter() - started
+        self.response = response
+        self._pending = fingerprint(response)
+        matched = self._pending == self.fingerprint
+        self.outcomes.append(matched)
+        if len(self.outcomes) == self.window and self.hit_rate < self.min_hit_rate:
+            self.disable(f"headers matched on only {self.hit_rate:.0%} of probes")
+            return None
+        if not matched or self.last is None or self.last.state != UNAVAILABLE:
+            self.save()
+            return None
+        self.matches += 1
+        if self.matches >= self.verify_every:
+            self._verifying = True
+            self.save()
+            return None
+        self.skipped += 1
+        self.save()
+        last = self.last
+        return CheckResult(last.state, last.reason, last.url, last.status_code, last.hash,
+                           {"probe": elapsed, "total": elapsed})
+
+    def learn(self, result: CheckResult):
+        """Take the fingerprint and result of the full check that followed ``check()``."""
+        if not self.enabled:
+            return
+        if self._verifying and result.state != self.last.state:
+            self.disable("the page changed but its headers didn't")
+            return
+        self.fingerprint = self._pending        # None if the probe failed: nothing to match next time
+        self.last = result
+        self.matches = 0
+        self._pending, self._verifying = None, False
+        self.save()
+
+    def disable(self, reason: str):
+        self.disabled_until = self.clock() + self.retry_after
+        self.disabled_reason = reason
+        self.fingerprint, self.last = None, None
+        print(f"🔎 Pre-probe off for {self.retry_after / 3600:g}h: {reason}")
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        last = self.last
+        data = {
+            "mode": self.mode,
+            "fingerprint": self.fingerprint,
+            "last": last and [last.state, last.reason, last.url, last.status_code, last.hash],
+            "outcomes": list(self.outcomes),
+            "matches": self.matches,
+            "disabled_until": self.disabled_until,
+            "disabled_reason": self.disabled_reason,
+            "skipped": self.skipped,
+        }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def load(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get("mode") != self.mode:
+            return      # A fingerprint from the other kind of probe never matches
+        self.fingerprint = data["fingerprint"]
+        self.last = CheckResult(*data["last"]) if data["last"] else None
+        self.outcomes.extend(data["outcomes"])
+        self.matches = data["matches"]
+        self.disabled_until = data["disabled_until"]
+        self.disabled_reason = data["disabled_reason"]
+        self.skipped = data["skipped"]
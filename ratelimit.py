@@ -0,0 +1,213 @@
+"""
+Send rate limiting: token buckets per SMTP account and per recipient, with the
+daily quota tracked in SQLite.
+
+Gmail allows about 500 messages a day per account (a rolling 24 hours) and
+throttles bursts. Without limits, a flapping page or a multi-target setup
+can use up the quota, so the send fails with ``SMTPException`` exactly when
+the real alert is due. Every send has to get past three limits first:
+
+- the account's token bucket (``ACCOUNT_RATE``, a burst of N then N a minute)
+- a bucket for each recipient (``RECIPIENT_RATE``)
+- the account's rolling daily quota (``DAILY_LIMIT``)
+
+Bucket levels and every send, allowed or not, are kept in a SQLite database
+(``WRB_RATE_LIMIT_DB``). Cron runs, and any other processes sharing the
+account, therefore share one set of limits. Checks take a write lock, so two
+processes can't both spend the last token.
+
+When a limit is close, a share of it (``RESERVE``) is kept back for urgent
+alerts: anything below HIGH priority (UNEXPECTED CHANGE, slot and activity
+alerts) is refused first, so a go-live alert can still get through.
+
+``check_wrb2526.send_email()`` goes through this whenever WRB_RATE_LIMIT_DB is
+set.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from notifiers import HIGH
+
+DAILY_LIMIT = int(os.getenv("WRB_DAILY_LIMIT", 500))
+ACCOUNT_RATE = (20, 60.0)       # (burst, seconds to refill it)
+RECIPIENT_RATE = (5, 300.0)
+RESERVE = 0.2                   # Share of each limit only HIGH priority sends may use
+DAY = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sends (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    account TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    allowed INTEGER NOT NULL,
+    reason TEXT
+);
+CREATE INDEX IF NOT EXISTS sends_account_ts ON sends (account, ts);
+"""
+
+
+class RateLimited(RuntimeError):
+    """An urgent alert could not be sent without going over a limit."""
+
+    def __init__(self, decision):
+        super().__init__(f"Rate limited: {decision.reason}; retry in {decision.retry_after:.0f}s")
+        self.decision = decision
+
+
+class Decision:
+    """Whether a send may go ahead, what stopped it if not, and how long until it could."""
+
+    __slots__ = ("allowed", "reason", "retry_after")
+
+    def __init__(self, allowed: bool, reason: str = None, retry_after: float = 0.0):
+        self.allowed = allowed
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def __bool__(self):
+        return self.allowed
+
+    def __repr__(self):
+        if self.allowed:
+            return "Decision(allowed)"
+        return f"Decision(refused: {self.reason}, retry in {self.retry_after:.1f}s)"
+
+
+def recipients_of(to: str) -> list:
+    """The addresses in a To value such as ``"a@example.com, b@example.com"``."""
+    return [address.strip().lower() for address in to.split(",") if address.strip()]
+
+
+class RateLimiter:
+    """Per-account and per-recipient token buckets plus a rolling daily quota, persisted in SQLite."""
+
+    def __init__(self, path: str = ":memory:", daily_limit: int = DAILY_LIMIT, account_rate=ACCOUNT_RATE,
+                 recipient_rate=RECIPIENT_RATE, reserve: float = RESERVE, clock=time.time):
+        self.path = path
+        self.daily_limit = daily_limit
+        self.account_rate = account_rate
+        self.recipient_rate = recipient_rate
+        self.reserve = reserve
+        self.clock = clock
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def _bucket(self, key: str, rate, now: float) -> float:
+        """Tokens in a bucket now, after refilling since it was last used."""
+        burst, period = rate
+        row = self.db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return float(burst)
+        tokens, updated = row
+        return min(burst, tokens + max(now - updated, 0) * burst / period)
+
+    def _sent_today(self, account: str, now: float) -> list:
+        """Timestamps of the account's sends in the last 24 hours, oldest first."""
+        return [ts for ts, in self.db.execute("SELECT ts FROM sends WHERE account = ? AND allowed AND ts > ? "
+                                              "ORDER BY ts", (account, now - DAY))]
+
+    def acquire(self, account: str, to: str, priority: int, now: float = None) -> Decision:
+        """Spend one send from every limit it touches, or none if any would go over.
+
+        Below HIGH priority, a send must leave the reserve of every limit
+        untouched.
+        """
+        now = self.clock() if now is None else now
+        floor = 0.0 if priority >= HIGH else self.reserve
+        recipients = recipients_of(to)
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                decision = self._check(account, recipients, floor, now)
+                if decision:
+                    self._spend(f"account:{account}", self.account_rate, now)
+                    for recipient in recipients:
+                        self._spend(f"recipient:{recipient}", self.recipient_rate, now)
+                self.db.executemany("INSERT INTO sends (ts, account, recipient, priority, allowed, reason) "
+                                    "VALUES (?, ?, ?, ?, ?, ?)",
+                                    [(now, account, recipient, priority, decision.allowed, decision.reason)
+                                     for recipient in recipients])
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+        return decision
+
+    def _check(self, account: str, recipients: list, floor: float, now: float) -> Decision:
+        sent = self._sent_today(account, now)
+        allowance = int(self.daily_limit * (1 - floor))
+        excess = len(sent) + len(recipients) - allowance
+        if excess > 0:
+            # Wait until enough of today's sends have aged out of the 24 hours
+            retry_after = sent[excess - 1] + DAY - now if excess <= len(sent) else DAY
+            return Decision(False, f"daily quota for {account} ({len(sent)}/{self.daily_limit})", retry_after)
+        limits = [(f"account:{account}", self.account_rate)]
+        limits += [(f"recipient:{recipient}", self.recipient_rate) for recipient in recipients]
+        for key, (burst, period) in limits:
+            needed = 1 + burst * floor
+            tokens = self._bucket(key, (burst, period), now)
+            if tokens < needed:
+                return Decision(False, f"{key} rate ({tokens:.1f} of {burst} left)",
+                                (needed - tokens) * period / burst)
+        return Decision(True)
+
+    def _spend(self, key: str, rate, now: float):
+        tokens = self._bucket(key, rate, now) - 1
+        self.db.execute("INSERT INTO buckets VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                        "tokens = excluded.tokens, updated = excluded.updated", (key, tokens, now))
+
+    def take(self, account: str, to: str, priority: int, wait: float = 0.0, sleep=time.sleep) -> bool:
+        """Acquire a send, the way send_email() wants it.
+
+        A refused low-priority send returns False: it is dropped so the
+        reserve stays free. A refused urgent send waits up to ``wait``
+        seconds for the limit to free up, then raises RateLimited.
+        """
+        decision = self.acquire(account, to, priority)
+        if decision:
+            return True
+        if priority < HIGH:
+            print(f"⏸️ Alert held back to save quota for urgent ones: {decision.reason}")
+            return False
+        if decision.retry_after <= wait:
+            sleep(decision.retry_after)
+            decision = self.acquire(account, to, priority)
+            if decision:
+                return True
+        raise RateLimited(decision)
+
+    def usage(self, account: str, now: float = None) -> dict:
+        """The account's sends and refusals over the last 24 hours."""
+        now = self.clock() if now is None else now
+        sent, refused = self.db.execute(
+            "SELECT coalesce(sum(allowed), 0), coalesce(sum(NOT allowed), 0) FROM sends "
+            "WHERE account = ? AND ts > ?", (account, now - DAY)).fetchone()
+        return {"sent": sent, "refused": refused, "remaining": max(self.daily_limit - sent, 0)}
+
+    def prune(self, now: float = None):
+        """Forget sends older than the daily window."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            self.db.execute("DELETE FROM sends WHERE ts <= ?", (now - DAY,))
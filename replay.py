@@ -0,0 +1,207 @@
+"""
+Offline replay of archived responses through the classifier.
+
+Every archived response is classified with ``classify_many()`` on a process
+pool: snapshots, HAR exports and anything else a loader is registered for.
+The replay then reports how many pages ended up in each state. Given a
+baseline from an earlier run, it also lists every page whose classification
+has changed, so a rule change can be checked against a whole season of pages
+before it is deployed.
+
+Loaders are registered per file suffix with ``@loader(".suffix")``. Each one
+yields ``(record_id, text, final_url, status_code)`` for the responses in a
+file. Built in:
+
+- ``.html`` / ``.htm``: one page per file, fetched from URL without redirects
+- ``.jsonl``: one response per line, ``{"url": ..., "status": ..., "text": ...}``
+- ``.har``: every non-redirect HTML response in a browser HAR export
+- ``.cassette``: every non-redirect hop recorded by cassette.py
+
+Records are streamed from each file in turn and sent to the workers in
+chunks of ``CHUNK_SIZE``, so a season archived as one large file is still
+classified in parallel. Only a few chunks are in flight at a time, so memory
+doesn't grow with the archive.
+
+Run ``python replay.py --help`` for the command line.
+"""
+
+import argparse
+import base64
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+import check_wrb2526
+from cassette import Cassette, interaction_body
+from check_wrb2526 import URL, classify_many
+
+CHUNK_SIZE = 200        # Responses sent to a worker at a time
+
+LOADERS = {}
+
+
+def loader(*suffixes):
+    """Register a function that yields (record_id, text, final_url, status) from a file."""
+    def register(func):
+        for suffix in suffixes:
+            LOADERS[suffix] = func
+        return func
+    return register
+
+
+@loader(".html", ".htm")
+def load_snapshot(path: str):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        yield path, f.read(), URL, 200
+
+
+@loader(".jsonl")
+def load_jsonl(path: str):
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if line.strip():
+                record = json.loads(line)
+                yield f"{path}#{i}", record["text"], record.get("url", URL), record.get("status")
+
+
+@loader(".har")
+def load_har(path: str):
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)["log"]["entries"]
+    for i, entry in enumerate(entries):
+        response = entry["response"]
+        content = response.get("content", {})
+        if 300 <= response["status"] < 400 or "html" not in content.get("mimeType", ""):
+            continue            # Redirect hops and assets; the page they lead to is its own entry
+        text = content.get("text", "")
+        if content.get("encoding") == "base64":
+            text = base64.b64decode(text).decode("utf-8", errors="replace")
+        yield f"{path}#{i}", text, entry["request"]["url"], response["status"]
+
+
+@loader(".cassette")
+def load_cassette(path: str):
+    for i, hop in enumerate(Cassette.load(path)):
+        if not 300 <= hop["status"] < 400:
+            yield f"{path}#{i}", interaction_body(hop).decode("utf-8", errors="replace"), hop["url"], hop["status"]
+
+
+def find_archives(paths):
+    """Every file under ``paths`` that a loader knows how to read."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, files in os.walk(path):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in LOADERS:
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def load_records(paths):
+    """Every archived response under ``paths``, streamed file by file."""
+    for path in find_archives(paths):
+        yield from LOADERS[os.path.splitext(path)[1].lower()](path)
+
+
+def chunked(records, size: int = CHUNK_SIZE):
+    """Group records into lists of ``(record_id, text, final_url)``."""
+    chunk = []
+    for record_id, text, url, _status in records:
+        chunk.append((record_id, text, url))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def replay_chunk(chunk: list) -> list:
+    """Classify a chunk of responses."""
+    results = classify_many((text, url) for _id, text, url in chunk)
+    return [(record[0], result.state, result.reason, result.hash) for record, result in zip(chunk, results)]
+
+
+def _init_worker(parse_mode: str):
+    check_wrb2526.PARSE_MODE = parse_mode
+
+
+def replay(paths, workers: int = None, parse_mode: str = None, chunk_size: int = CHUNK_SIZE) -> list:
+    """Classify every archived response under ``paths``; returns (id, state, reason, hash) tuples."""
+    parse_mode = parse_mode or check_wrb2526.PARSE_MODE
+    chunks = chunked(load_records(paths), chunk_size)
+    first = list(next(chunks, []) for _ in range(2))
+    chunks = chain(filter(None, first), chunks)
+    if workers == 1 or not first[1]:        # A single chunk isn't worth starting processes for
+        saved, check_wrb2526.PARSE_MODE = check_wrb2526.PARSE_MODE, parse_mode
+        try:
+            return [row for chunk in chunks for row in replay_chunk(chunk)]
+        finally:
+            check_wrb2526.PARSE_MODE = saved
+
+    rows, pending = [], deque()
+    limit = 2 * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(parse_mode,)) as pool:
+        for chunk in chunks:
+            pending.append(pool.submit(replay_chunk, chunk))
+            if len(pending) >= limit:
+                rows += pending.popleft().result()
+        while pending:
+            rows += pending.popleft().result()
+    return rows
+
+
+def compare(rows, baseline: dict) -> list:
+    """Records whose state differs from the baseline: (id, old, new, reason)."""
+    return [(record_id, baseline[record_id][0], state, reason)
+            for record_id, state, reason, _hash in rows
+            if record_id in baseline and baseline[record_id][0] != state]
+
+
+def load_baseline(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, rows):
+    with open(path, "w") as f:
+        json.dump({record_id: [state, digest] for record_id, state, _reason, digest in rows}, f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay archived WRB responses through the classifier.")
+    parser.add_argument("paths", nargs="+", help="Archive files or directories")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--mode", choices=("substring", "events"), default=None,
+                        help="Parse mode (default: WRB_PARSE_MODE)")
+    parser.add_argument("--baseline", help="Compare against a saved baseline")
+    parser.add_argument("--save-baseline", help="Save this run as a baseline")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    rows = replay(args.paths, args.workers, args.mode)
+    elapsed = time.perf_counter() - started
+
+    print(f"📼 Replayed {len(rows)} responses in {elapsed:.2f}s")
+    for state, count in Counter(state for _id, state, _reason, _hash in rows).most_common():
+        print(f"   {state:<12} {count}")
+
+    changed = []
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        changed = compare(rows, baseline)
+        missing = len(rows) - sum(record_id in baseline for record_id, *_ in rows)
+        print(f"🔀 {len(changed)} changed since baseline ({missing} not in baseline)")
+        for record_id, old, new, reason in changed:
+            print(f"   {record_id}: {old} → {new} ({reason})")
+    if args.save_baseline:
+        save_baseline(args.save_baseline, rows)
+        print(f"💾 Baseline saved to {args.save_baseline}")
+    return 1 if changed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,273 @@
+"""
+A pool of logged-in WRB sessions for several officer accounts.
+
+SSO login is a chain of redirects through Login.aspx and is far too slow for
+go-live, so the pool logs every account in up front and a background thread
+keeps them that way: sessions are touched to keep them alive while idle and
+logged in again before they expire. Workers borrow a session with
+``acquire()``, which never logs in itself, so login is never on the critical
+path. A worker that holds a session for a long time keeps it logged in with
+``renew()`` between requests.
+
+Accounts come from WRB_ACCOUNTS as ``user1:pass1,user2:pass2``.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+
+from check_wrb2526 import URL
+from formstate import form_inputs
+
+LOGIN_URL = "https://abs.warwick.ac.uk/Login.aspx?ReturnUrl=/WRB2526/"
+REQUEST_TIMEOUT = 15
+SESSION_TTL = 20 * 60       # ASP.NET's default session timeout
+REFRESH_AHEAD = 0.75        # Log in again once a session is this far through its TTL
+KEEPALIVE_INTERVAL = 5 * 60
+
+
+def is_login_page(url: str) -> bool:
+    return "Login.aspx" in url or "ReturnUrl" in url
+
+
+def login(session, url, username, password, timeout=REQUEST_TIMEOUT):
+    """
+    Log a session in through the WRB's Login.aspx page.
+
+    ``url`` may be the login page itself or any page that redirects to it. The
+    login form's user name, password and submit inputs are found by type, so
+    nothing depends on the control names Scientia happens to use.
+    """
+    r = session.get(url, allow_redirects=True, timeout=timeout)
+    if not is_login_page(r.url):
+        return r        # Already logged in
+
+    data = {}
+    user_field = password_field = None
+    for kind, name, value in form_inputs(r.text):
+        if kind == "hidden":
+            data[name] = value
+        elif kind == "password" and password_field is None:
+            password_field = name
+        elif kind == "text" and password_field is None:
+            user_field = name
+        elif kind == "submit" and name not in data:
+            data[name] = value
+    if user_field is None or password_field is None:
+        raise RuntimeError(f"No login form found at {r.url}")
+    data[user_field] = username
+    data[password_field] = password
+
+    r = session.post(r.url, data=data, allow_redirects=True, timeout=timeout)
+    if is_login_page(r.url):
+        raise RuntimeError(f"Login failed for {username}")
+    return r
+
+
+def parse_accounts(value: str) -> list:
+    """Parse ``user1:pass1,user2:pass2`` into ``[(user, password), ...]``."""
+    accounts = []
+    for item in (value or "").split(","):
+        username, sep, password = item.strip().partition(":")
+        if sep:
+            accounts.append((username, password))
+    return accounts
+
+
+class PooledSession:
+    """One account's logged-in session and its bookkeeping."""
+
+    __slots__ = ("username", "password", "session", "logged_in_at", "last_used",
+                 "uses", "failures", "healthy", "busy")
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.session = requests.Session()
+        self.logged_in_at = 0.0
+        self.last_used = 0.0
+        self.uses = 0
+        self.failures = 0
+        self.healthy = False
+        self.busy = False
+
+
+class SessionPool:
+    """Hand out pre-authenticated sessions and keep them authenticated."""
+
+    def __init__(self, accounts, login_url=LOGIN_URL, touch_url=URL, ttl=SESSION_TTL,
+                 refresh_ahead=REFRESH_AHEAD, keepalive_interval=KEEPALIVE_INTERVAL,
+                 timeout=REQUEST_TIMEOUT):
+        self.login_url = login_url
+        self.touch_url = touch_url
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+        self.entries = [PooledSession(username, password) for username, password in accounts]
+        self.counters = {"logins": 0, "login_failures": 0, "touches": 0, "acquired": 0, "waits": 0}
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        return cls(parse_accounts(os.getenv("WRB_ACCOUNTS")), **kwargs)
+
+    def _login(self, entry) -> bool:
+        try:
+            entry.session.cookies.clear()
+            login(entry.session, self.login_url, entry.username, entry.password, self.timeout)
+        except (requests.RequestException, RuntimeError) as e:
+            print(f"⚠️  Login failed for {entry.username}: {e}")
+            with self._cond:
+                entry.healthy = False
+                entry.failures += 1
+                self.counters["login_failures"] += 1
+            return False
+        with self._cond:
+            entry.logged_in_at = entry.last_used = time.time()
+            entry.healthy = True
+            self.counters["logins"] += 1
+            self._cond.notify_all()
+        return True
+
+    def _touch(self, entry) -> bool:
+        """Make a cheap request to keep an idle session alive."""
+        try:
+            r = entry.session.get(self.touch_url, allow_redirects=True, timeout=self.timeout)
+        except requests.RequestException:
+            return False
+        with self._cond:
+            self.counters["touches"] += 1
+            entry.last_used = time.time()
+        return not is_login_page(r.url)
+
+    def start(self, interval=None):
+        """Log every account in concurrently, then keep them alive in the background."""
+        if self.entries:
+            with ThreadPoolExecutor(max_workers=len(self.entries)) as executor:
+                list(executor.map(self._login, self.entries))
+        if self._thread is None:
+            interval = interval or max(min(self.ttl * (1 - self.refresh_ahead) / 2, self.keepalive_interval), 0.01)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,),
+                                            name="session-keepalive", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for entry in self.entries:
+            entry.session.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _claim_for_maintenance(self, now):
+        """Pick the idle sessions that need a login or a touch, marking them busy."""
+        due = []
+        with self._cond:
+            for entry in self.entries:
+                if entry.busy:
+                    continue
+                if not entry.healthy or now - entry.logged_in_at >= self.ttl * self.refresh_ahead:
+                    due.append((entry, "login"))
+                elif now - entry.last_used >= self.keepalive_interval:
+                    due.append((entry, "touch"))
+                else:
+                    continue
+                entry.busy = True
+        return due
+
+    def maintain(self, now=None):
+        """Re-login sessions near expiry and touch idle ones."""
+        for entry, action in self._claim_for_maintenance(time.time() if now is None else now):
+            try:
+                if action == "touch" and not self._touch(entry):
+                    action = "login"
+                if action == "login":
+                    self._login(entry)
+            finally:
+                with self._cond:
+                    entry.busy = False
+                    self._cond.notify_all()
+
+    def renew(self, session, force=False) -> bool:
+        """
+        Log a borrowed session in again if it is due, or unconditionally with ``force``.
+
+        Maintenance skips sessions that are out on loan, so a worker that holds
+        one across many requests calls this between them to keep it logged in.
+        """
+        with self._cond:
+            entry = next((e for e in self.entries if e.session is session), None)
+            if entry is None:
+                raise ValueError("Session does not belong to this pool")
+            due = force or not entry.healthy or time.time() - entry.logged_in_at >= self.ttl * self.refresh_ahead
+        return self._login(entry) if due else True
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.maintain()
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """
+        Borrow the least recently used healthy session.
+
+        Blocks until one is free; raises TimeoutError after ``timeout`` seconds
+        and RuntimeError if no account is logged in at all.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                idle = [e for e in self.entries if e.healthy and not e.busy]
+                if idle:
+                    entry = min(idle, key=lambda e: e.last_used)
+                    break
+                if not any(e.healthy for e in self.entries) and not any(e.busy for e in self.entries):
+                    raise RuntimeError("No logged-in sessions available")
+                self.counters["waits"] += 1
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a session")
+                self._cond.wait(remaining)
+            entry.busy = True
+            entry.uses += 1
+            self.counters["acquired"] += 1
+        try:
+            yield entry.session
+        except BaseException:
+            with self._cond:
+                entry.failures += 1
+            raise
+        finally:
+            with self._cond:
+                entry.busy = False
+                entry.last_used = time.time()
+                self._cond.notify_all()
+
+    def health(self) -> dict:
+        """Return pool health metrics."""
+        now = time.time()
+        with self._cond:
+            healthy = [e for e in self.entries if e.healthy]
+            return {
+                "accounts": len(self.entries),
+                "healthy": len(healthy),
+                "busy": sum(e.busy for e in self.entries),
+                "oldest_login_age": max((now - e.logged_in_at for e in healthy), default=None),
+                "failures": {e.username: e.failures for e in self.entries},
+                **self.counters,
+            }
@@ -0,0 +1,271 @@
+"""
+Discrete-event simulator for comparing polling strategies.
+
+Each simulated season draws a go-live time, from a ReleaseForecast or from
+past events projected into the season, and plays a strategy's poll schedule
+against it on a virtual clock. Polls go through the real ``check_page()``,
+with ``requests.get`` answered by a VirtualSite that serves the unavailable
+page until go-live and the login redirect after it. Each request takes a
+latency drawn from a LatencyModel, and the server sees the page as it is
+when the request arrives. Alerts, the state file, history, pre-probes and
+observers are all switched off for the run (``OFFLINE``), so a simulation
+never touches anything outside the process, whatever the environment sets.
+
+A schedule is a sorted array of poll times, so nothing before go-live needs
+simulating. Every poll more than MAX_LATENCY before it must have seen the
+unavailable page; a bisection counts those, and only the last few polls are
+actually run. That keeps each season to a handful of ``check_page()`` calls,
+so tens of thousands of seasons a second are possible for parameter sweeps.
+
+Run ``python simulator.py --help`` for the command line.
+"""
+
+import argparse
+import io
+import math
+import os
+import random
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import redirect_stdout
+from datetime import timedelta
+from itertools import accumulate
+from unittest.mock import patch
+
+import check_wrb2526
+from check_wrb2526 import URL, UNAVAILABLE, check_page
+from prediction import PollScheduler, ReleaseForecast, load_events, season_anchor
+
+MAX_LATENCY = 30.0      # Requests slower than this time out in check_page
+LATENCY_MEDIAN = 0.4
+LATENCY_SIGMA = 0.6
+LOGIN_URL = "https://abs.warwick.ac.uk/Login.aspx?ReturnUrl=%2fWRB2526%2f"
+UNAVAILABLE_PAGE = (
+    "<html><head><title>Scientia Web Room Booking</title></head><body>"
+    "<div class='Banner'><span class='BannerTitle'>Application Unavailable</span></div>"
+    "</body></html>"
+)
+LOGIN_PAGE = "<html><head><title>Log in</title></head><body><form></form></body></html>"
+
+
+class LatencyModel:
+    """Server response times: log-normal, or resampled from recorded polls."""
+
+    def __init__(self, median: float = LATENCY_MEDIAN, sigma: float = LATENCY_SIGMA,
+                 samples=None, rng: random.Random = None):
+        self.median = median
+        self.sigma = sigma
+        # Clamped like the log-normal draws: a slower request times out, and the bisection relies on it
+        self.samples = [min(sample, MAX_LATENCY) for sample in samples] if samples else None
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def from_history(cls, history, target: str = URL, rng: random.Random = None):
+        """Resample the response times the poll history recorded."""
+        rows = history.db.execute("SELECT elapsed FROM polls WHERE target = ? AND elapsed IS NOT NULL",
+                                  (target,)).fetchall()
+        return cls(samples=[row[0] for row in rows], rng=rng)
+
+    def sample(self) -> float:
+        if self.samples:
+            return self.rng.choice(self.samples)
+        return min(self.rng.lognormvariate(math.log(self.median), self.sigma), MAX_LATENCY)
+
+
+class VirtualResponse:
+    """Just enough of a requests Response for check_page()."""
+
+    def __init__(self, text: str, url: str, latency: float):
+        self.text = text
+        self.content = text.encode()
+        self.url = url
+        self.status_code = 200
+        self.encoding = "utf-8"
+        self.elapsed = timedelta(seconds=latency)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class VirtualSite:
+    """The WRB as seen from a virtual clock: unavailable until ``go_live``."""
+
+    def __init__(self):
+        self.go_live = math.inf
+        self.arrival = 0.0
+        self.latency = 0.0
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        if self.arrival >= self.go_live:
+            return VirtualResponse(LOGIN_PAGE, LOGIN_URL, self.latency)
+        return VirtualResponse(UNAVAILABLE_PAGE, url, self.latency)
+
+
+class StrategyResult:
+    """Detection latency and request counts over many seasons."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = array("d")
+        self.requests = array("L")
+        self.misses = 0         # Go-live after the schedule ended
+
+    @property
+    def seasons(self) -> int:
+        return len(self.latencies) + self.misses
+
+    @property
+    def mean_latency(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else math.nan
+
+    def latency_quantile(self, q: float) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else math.nan
+
+    @property
+    def worst_latency(self) -> float:
+        return max(self.latencies, default=math.nan)
+
+    @property
+    def mean_requests(self) -> float:
+        return sum(self.requests) / len(self.requests) if self.requests else math.nan
+
+    @property
+    def max_requests(self) -> int:
+        return max(self.requests, default=0)
+
+    def __repr__(self):
+        return (f"{self.name}: latency mean {self.mean_latency:.1f}s p95 {self.latency_quantile(0.95):.1f}s "
+                f"worst {self.worst_latency:.1f}s, requests mean {self.mean_requests:.0f} "
+                f"max {self.max_requests}, {self.misses} missed")
+
+
+def fixed_schedule(start: float, end: float, interval: float):
+    """Poll every ``interval`` seconds, like a cron job."""
+    return array("d", (start + i * interval for i in range(int((end - start) // interval) + 1)))
+
+
+def forecast_sampler(forecast: ReleaseForecast, rng: random.Random):
+    """Draw go-live times from a forecast by inverting its cumulative distribution."""
+    cumulative = list(accumulate(forecast.probs))
+    width, start = forecast.bin_seconds, forecast.start
+
+    def sample():
+        u = rng.random() * cumulative[-1]
+        i = min(bisect_right(cumulative, u), len(cumulative) - 1)
+        return start + (i + rng.random()) * width
+    return sample
+
+
+def project_events(events, now: float):
+    """Where past go-live times fall in the season containing ``now``."""
+    anchor = season_anchor(now)
+    return [anchor + ts - season_anchor(ts) for ts in events]
+
+
+def _discard(*args, **kwargs):
+    pass
+
+
+# Everything check_page() could reach beyond the virtual site, switched off for a run
+OFFLINE = {
+    "send_email": _discard,
+    "notify": _discard,
+    "HISTORY_DB": None,
+    "STATE_FILE": None,
+    "NOTIFY_CHANNELS": None,
+    "COALESCE_WINDOW": 0,
+    "RATE_LIMIT_DB": None,
+    "SMTP_ACCOUNTS": None,
+    "PRE_PROBE": None,
+    "FETCH_SESSION": None,
+    "OBSERVERS": [],
+    "_history": None,       # Already opened or set up by an earlier poll in this process
+    "_pre_probe": None,
+}
+
+
+class Simulator:
+    """Plays poll schedules against go-live times through the real check_page()."""
+
+    def __init__(self, latency: LatencyModel = None):
+        self.latency = latency or LatencyModel()
+        self.site = VirtualSite()
+
+    def season(self, schedule, go_live: float):
+        """Detection latency and requests for one season, or None if it was missed."""
+        site = self.site
+        site.go_live = go_live
+        # Polls sent this long before go-live can't have seen it, whatever their latency
+        i = bisect_left(schedule, go_live - MAX_LATENCY)
+        requests = i
+        for j in range(i, len(schedule)):
+            sent = schedule[j]
+            site.latency = self.latency.sample()
+            site.arrival = sent + site.latency
+            requests += 1
+            if check_page().state != UNAVAILABLE:
+                return site.arrival - go_live, requests
+        return None
+
+    def run(self, strategies: dict, go_lives) -> list:
+        """Simulate every strategy (name -> schedule) against every go-live time."""
+        results = [StrategyResult(name) for name in strategies]
+        with patch.object(check_wrb2526.requests, "get", self.site.get), \
+             patch.multiple(check_wrb2526, **OFFLINE), \
+             redirect_stdout(io.StringIO()):
+            for go_live in go_lives:
+                for result, schedule in zip(results, strategies.values()):
+                    outcome = self.season(schedule, go_live)
+                    if outcome is None:
+                        result.misses += 1
+                    else:
+                        result.latencies.append(outcome[0])
+                        result.requests.append(outcome[1])
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare WRB polling strategies in simulation.")
+    parser.add_argument("--seasons", type=int, default=10000)
+    parser.add_argument("--intervals", type=float, nargs="*", default=[300, 30],
+                        help="Fixed poll intervals to compare, in seconds")
+    parser.add_argument("--events", default=os.getenv("WRB_GO_LIVE_EVENTS"),
+                        help="Past go-live events JSON for the forecast")
+    parser.add_argument("--now", type=float, default=None, help="Season start (Unix time)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-median", type=float, default=LATENCY_MEDIAN)
+    parser.add_argument("--latency-sigma", type=float, default=LATENCY_SIGMA)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    now = args.now if args.now is not None else time.time()
+    events = load_events(args.events) if args.events else []
+    forecast = ReleaseForecast.build(events, now=now)
+    scheduler = PollScheduler(forecast)
+
+    strategies = {f"every {interval:g}s": fixed_schedule(forecast.start, forecast.end, interval)
+                  for interval in args.intervals}
+    strategies["forecast"] = scheduler.schedule
+    sample = forecast_sampler(forecast, rng)
+    go_lives = [sample() for _ in range(args.seasons)]
+
+    simulator = Simulator(LatencyModel(args.latency_median, args.latency_sigma, rng=rng))
+    started = time.perf_counter()
+    results = simulator.run(strategies, go_lives)
+    elapsed = time.perf_counter() - started
+
+    for result in results:
+        print(result)
+    print(f"⏱️ {args.seasons * len(strategies) / elapsed:,.0f} seasons/s")
+
+
+if __name__ == "__main__":
+    main()
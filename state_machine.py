@@ -0,0 +1,239 @@
+"""
+Per-target state machine with hysteresis, so each real transition alerts once.
+
+On its own ``check_page()`` has no memory, so a page that flips between
+"Application Unavailable" and a generic error page alerts on every flip. A
+``StateMachine`` keeps each target's stable state, persisted in a JSON file,
+and only moves it once a new state has been seen ``hysteresis[state]`` polls
+in a row. Noisy states (ERROR, UNKNOWN, WRONG_YEAR) need confirming.
+Unambiguous ones (the live states, UNAVAILABLE) take effect on the first
+poll that sees them, so a clean go-live alerts with no added latency. Seeing
+the stable state again resets the count, which is what absorbs flapping.
+
+Each transition runs the actions registered for it, as
+``(from_state, to_state, action)`` entries where either end can be a state, a
+tuple of states or "*". By default entering a live state from a non-live
+one sends the go-live alert, and entering WRONG_YEAR or UNKNOWN sends
+UNEXPECTED CHANGE. The new state is saved only once the actions have run:
+if an alert fails to send, the next poll tries the transition again.
+``observe_async()`` does the same from an event loop, awaiting any action
+that returns a coroutine.
+
+``check_page()`` runs through this whenever WRB_STATE_FILE is set. Fetch
+failures, and server errors the classifier can't place, then count as ERROR
+rather than raising.
+"""
+
+import inspect
+import json
+import os
+import threading
+import time
+
+import check_wrb2526
+from check_wrb2526 import (ERROR, LIVE_FORM, LIVE_LOGIN, STATUS_MESSAGES, UNAVAILABLE, UNEXPECTED_STATUS, UNKNOWN,
+                           WRONG_YEAR)
+
+LIVE_STATES = (LIVE_LOGIN, LIVE_FORM)
+STATES = (UNAVAILABLE, LIVE_LOGIN, LIVE_FORM, WRONG_YEAR, UNKNOWN, ERROR)
+
+# Polls in a row a state must be seen before the target moves to it; unlisted states take 1
+HYSTERESIS = {ERROR: 3, UNKNOWN: 2, WRONG_YEAR: 2}
+
+
+def parse_hysteresis(spec: str) -> dict:
+    """Overrides from WRB_HYSTERESIS, e.g. ``"ERROR=5,UNKNOWN=3"``, on top of HYSTERESIS."""
+    hysteresis = dict(HYSTERESIS)
+    for entry in filter(None, (part.strip() for part in (spec or "").split(","))):
+        state, _, polls = entry.partition("=")
+        if state not in STATES:
+            raise ValueError(f"Unknown state {state!r} in WRB_HYSTERESIS")
+        hysteresis[state] = max(int(polls), 1)
+    return hysteresis
+
+
+class TargetState:
+    """A target's stable state, and the state it may be moving to."""
+
+    __slots__ = ("state", "since", "candidate", "count")
+
+    def __init__(self, state: str, since: float, candidate: str = None, count: int = 0):
+        self.state = state
+        self.since = since
+        self.candidate = candidate
+        self.count = count
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        pending = f", {self.candidate} x{self.count}" if self.candidate else ""
+        return f"TargetState({self.state}{pending})"
+
+
+class Transition:
+    """A target moving from one stable state to another."""
+
+    __slots__ = ("target", "old", "new", "at", "result")
+
+    def __init__(self, target: str, old: str, new: str, at: float, result=None):
+        self.target = target
+        self.old = old
+        self.new = new
+        self.at = at
+        self.result = result
+
+    def __repr__(self):
+        return f"Transition({self.target}: {self.old} -> {self.new})"
+
+
+def _matches(pattern, state: str) -> bool:
+    return pattern == "*" or state == pattern or (isinstance(pattern, tuple) and state in pattern)
+
+
+def alert_live(transition: Transition):
+    check_wrb2526.notify(STATUS_MESSAGES[transition.new])
+
+
+def alert_unexpected(transition: Transition):
+    print("Page changed, but not sure what it is. Check manually.")
+    check_wrb2526.notify(UNEXPECTED_STATUS)
+
+
+def report(transition: Transition):
+    detail = f" ({transition.result.error or transition.result.reason})" if transition.result is not None else ""
+    print(f"🔁 {transition.target}: {transition.old} -> {transition.new}{detail}")
+
+
+DEFAULT_ACTIONS = [
+    ("*", "*", report),
+    (tuple(s for s in STATES if s not in LIVE_STATES), LIVE_STATES, alert_live),
+    ("*", (WRONG_YEAR, UNKNOWN), alert_unexpected),
+]
+
+
+def state_of(result) -> str:
+    """The state a CheckResult counts as: a failed fetch, or a server error page nothing matched, is ERROR."""
+    if result.error is not None:
+        return ERROR
+    if result.state == UNKNOWN and result.status_code is not None and result.status_code >= 500:
+        return ERROR
+    return result.state
+
+
+class StateMachine:
+    """Stable per-target states, moved with hysteresis and persisted to ``path`` (None keeps them in memory)."""
+
+    def __init__(self, path: str = None, hysteresis: dict = None, actions=None, initial: str = UNAVAILABLE,
+                 clock=time.time):
+        self.path = path
+        self.hysteresis = HYSTERESIS if hysteresis is None else hysteresis
+        self.actions = DEFAULT_ACTIONS if actions is None else actions
+        self.initial = initial      # What a target is assumed to be before its first poll
+        self.clock = clock
+        self.targets = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def get(self, target: str) -> str:
+        entry = self.targets.get(target)
+        return entry.state if entry is not None else self.initial
+
+    def observe(self, target: str, state: str, result=None, now: float = None, initial: str = None) -> Transition:
+        """Feed one poll; returns the Transition it completed, if any, after running its actions.
+
+        ``initial`` overrides the machine's assumed starting state for a target seen for the first time.
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            transition = self._confirm(target, state, result, now, initial)
+            if transition is None:
+                return None
+            try:
+                self.run_actions(transition)
+            except Exception:
+                self.save()     # Still confirmed, so the next poll retries the transition
+                raise
+            self._take(transition)
+            return transition
+
+    async def observe_async(self, target: str, state: str, result=None, now: float = None,
+                            initial: str = None) -> Transition:
+        """``observe()`` from an event loop: actions that return a coroutine are awaited."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            transition = self._confirm(target, state, result, now, initial)
+        if transition is None:
+            return None
+        try:
+            for action in self._actions_for(transition):
+                outcome = action(transition)
+                if inspect.isawaitable(outcome):
+                    await outcome
+        except Exception:
+            with self._lock:
+                self.save()
+            raise
+        with self._lock:
+            self._take(transition)
+        return transition
+
+    def _confirm(self, target: str, state: str, result, now: float, initial: str) -> Transition:
+        """Count one poll towards ``state``; returns the Transition once confirmed, without taking it yet."""
+        entry = self.targets.get(target)
+        if entry is None:
+            entry = self.targets[target] = TargetState(initial or self.initial, now)
+        if state == entry.state:
+            if entry.candidate is not None:
+                entry.candidate, entry.count = None, 0
+                self.save()
+            return None
+        if state == entry.candidate:
+            entry.count += 1
+        else:
+            entry.candidate, entry.count = state, 1
+        if entry.count < self.hysteresis.get(state, 1):
+            self.save()
+            return None
+        return Transition(target, entry.state, state, now, result)
+
+    def _take(self, transition: Transition):
+        entry = self.targets[transition.target]
+        entry.state, entry.since, entry.candidate, entry.count = transition.new, transition.at, None, 0
+        self.save()
+
+    def observe_result(self, target: str, result, initial: str = None) -> Transition:
+        return self.observe(target, state_of(result), result, initial=initial)
+
+    def _actions_for(self, transition: Transition) -> list:
+        return [action for from_state, to_state, action in self.actions
+                if _matches(from_state, transition.old) and _matches(to_state, transition.new)]
+
+    def run_actions(self, transition: Transition):
+        for action in self._actions_for(transition):
+            action(transition)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({target: entry.as_dict() for target, entry in self.targets.items()}, f)
+        os.replace(tmp, self.path)
+
+    def load(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        self.targets = {target: TargetState(**item) for target, item in data.items()}
+
+
+_machine = None
+
+
+def get_state_machine() -> StateMachine:
+    """The state machine for this process, persisted to WRB_STATE_FILE."""
+    global _machine
+    if _machine is None:
+        _machine = StateMachine(check_wrb2526.STATE_FILE, parse_hysteresis(os.getenv("WRB_HYSTERESIS")))
+    return _machine
@@ -0,0 +1,361 @@
+"""
+Subscriptions: several tenants on one instance, each with their own targets,
+rooms and recipients.
+
+EMAIL_USER and TO_EMAIL give an instance one recipient. A ``Registry`` maps
+targets and event types to any number of subscribers instead, each
+subscription a row in a SQLite database (``WRB_SUBSCRIPTIONS``)::
+
+    (tenant, target, event, recipient)
+
+- ``target`` is a WRB URL, a site name from targets.py (every year's URL at
+  that site), a room code, or "*" for every target
+- ``event`` is one of ``EVENTS`` or "*": "live", "changed" and "appeared"
+  from targets.py, and "cancellation" for a freed slot in a room
+- ``recipient`` is an email address, or a channel in WRB_NOTIFY form such as
+  ``ntfy:https://ntfy.sh/my-topic`` (see notifiers.py)
+
+The registry keeps an in-memory index keyed by ``(target, event)``, like a
+Watchlist's, so an event finds its recipients with two lookups per name for
+the target, plus two for "*". The cost is proportional to the subscriptions that match, not to the
+number of tenants. Changes made by another process (the command line, say)
+are picked up on the next round.
+
+Fetching is shared: ``SubscribedMonitor`` polls each URL with at least one
+subscriber exactly once a round, however many tenants watch it. Each
+transition is then fanned out to every matching recipient. A recipient in
+several tenants gets one alert, and recipients are sent to concurrently, in
+the monitor's event loop. Rooms work the same way. Given a
+TimetableSync and a Watchlist, the monitor watches every room in ``rooms()``
+at the fast rate, and each round ``Fanout.cancellations()`` sends the
+watchlist's freed slots to the subscribers of their room.
+
+Run ``python subscriptions.py --help`` to manage subscriptions, or
+``python subscriptions.py run`` to poll for every tenant. ``run`` syncs room
+timetables too when WRB_WATCHLIST names a watchlist file (see watchlist.py).
+"""
+
+import argparse
+import asyncio
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+import check_wrb2526
+from state_machine import StateMachine, parse_hysteresis
+from targets import EVENTS as TARGET_EVENTS
+from targets import DEFAULT_STATE_FILE, POLL_INTERVAL, PROFILES, TargetMonitor, load_profiles
+from timetable_sync import TimetableSync
+from watchlist import load_watchlist
+
+DEFAULT_DB = "wrb_subscriptions.sqlite3"
+ANY = "*"
+CANCELLATION = "cancellation"
+EVENTS = TARGET_EVENTS + (CANCELLATION,)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenants (
+    name TEXT PRIMARY KEY,
+    created REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY,
+    tenant TEXT NOT NULL REFERENCES tenants (name) ON DELETE CASCADE,
+    target TEXT NOT NULL,
+    event TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    UNIQUE (tenant, target, event, recipient)
+);
+"""
+
+
+class Subscription:
+    """One tenant's recipient for one target and event."""
+
+    __slots__ = ("id", "tenant", "target", "event", "recipient")
+
+    def __init__(self, id: int, tenant: str, target: str, event: str, recipient: str):
+        self.id = id
+        self.tenant = tenant
+        self.target = target
+        self.event = event
+        self.recipient = recipient
+
+    def __repr__(self):
+        return f"Subscription({self.tenant}: {self.target} {self.event} -> {self.recipient})"
+
+
+class Registry:
+    """Subscriptions persisted in SQLite, indexed in memory by (target, event)."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.execute("PRAGMA foreign_keys=ON")
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._index = defaultdict(list)     # (target, event) -> [Subscription]
+        self._targets = set()               # Targets with any subscription
+        self._version = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        return sum(len(subscriptions) for subscriptions in self._index.values())
+
+    def _data_version(self) -> int:
+        # Changes whenever another connection commits to the database
+        return self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def reload(self):
+        """Rebuild the index from the database."""
+        with self._lock:
+            self._index.clear()
+            for row in self.db.execute("SELECT id, tenant, target, event, recipient FROM subscriptions ORDER BY id"):
+                subscription = Subscription(*row)
+                self._index[(subscription.target, subscription.event)].append(subscription)
+            self._targets = {target for target, _ in self._index}
+            self._version = self._data_version()
+
+    def refresh(self) -> bool:
+        """Reload if another process has changed the subscriptions since; returns whether it did."""
+        if self._data_version() == self._version:
+            return False
+        self.reload()
+        return True
+
+    def subscribe(self, tenant: str, target: str, event: str, recipient: str) -> Subscription:
+        """Add a subscription, creating the tenant if it is new; subscribing twice is a no-op."""
+        if event != ANY and event not in EVENTS:
+            raise ValueError(f"Unknown event {event!r}; expected one of {', '.join(EVENTS)} or {ANY}")
+        self.refresh()
+        with self._lock:
+            for subscription in self._index.get((target, event), ()):
+                if (subscription.tenant, subscription.recipient) == (tenant, recipient):
+                    return subscription
+            self.db.execute("INSERT OR IGNORE INTO tenants VALUES (?, ?)", (tenant, time.time()))
+            # Another process may have added the same row since the index was loaded
+            row = (tenant, target, event, recipient)
+            self.db.execute("INSERT OR IGNORE INTO subscriptions (tenant, target, event, recipient) VALUES (?, ?, ?, ?)",
+                            row)
+            subscription_id, = self.db.execute("SELECT id FROM subscriptions WHERE tenant = ? AND target = ? AND event = ? "
+                                  "AND recipient = ?", row).fetchone()
+            subscription = Subscription(subscription_id, *row)
+            self._index[(target, event)].append(subscription)
+            self._targets.add(target)
+        return subscription
+
+    def unsubscribe(self, tenant: str, target: str = None, event: str = None, recipient: str = None) -> int:
+        """Remove a tenant's subscriptions matching whichever of target, event and recipient are given."""
+        where = {"tenant": tenant, "target": target, "event": event, "recipient": recipient}
+        where = {column: value for column, value in where.items() if value is not None}
+        with self._lock:
+            removed = self.db.execute(f"DELETE FROM subscriptions WHERE {' AND '.join(f'{c} = ?' for c in where)}",
+                                      tuple(where.values())).rowcount
+        self.reload()
+        return removed
+
+    def remove_tenant(self, tenant: str) -> int:
+        """Remove a tenant and all of its subscriptions."""
+        with self._lock:
+            removed = self.db.execute("DELETE FROM subscriptions WHERE tenant = ?", (tenant,)).rowcount
+            self.db.execute("DELETE FROM tenants WHERE name = ?", (tenant,))
+        self.reload()
+        return removed
+
+    def tenants(self) -> list:
+        return [row[0] for row in self.db.execute("SELECT name FROM tenants ORDER BY name")]
+
+    def subscriptions(self, tenant: str = None) -> list:
+        every = [s for subscriptions in self._index.values() for s in subscriptions]
+        return sorted((s for s in every if tenant is None or s.tenant == tenant), key=lambda s: s.id)
+
+    def matching(self, event: str, *targets) -> list:
+        """Subscriptions for an event on any of ``targets`` (a URL and its site name, say), wildcards included."""
+        found = []
+        for target in targets + (ANY,):
+            for key in ((target, event), (target, ANY)):
+                found += self._index.get(key, ())
+        return found
+
+    def recipients(self, event: str, *targets) -> list:
+        """Everyone to alert about an event, each once, in subscription order."""
+        return list(dict.fromkeys(s.recipient for s in sorted(self.matching(event, *targets), key=lambda s: s.id)))
+
+    def watched(self, *targets) -> bool:
+        """Whether anyone subscribes to any event on any of ``targets``."""
+        return any(target in self._targets for target in targets + (ANY,))
+
+    def rooms(self) -> list:
+        """Rooms with cancellation subscribers, for ``TimetableSync.watch()``."""
+        return sorted({target for target, event in self._index if event == CANCELLATION and target != ANY})
+
+
+def email_recipient(to: str, status: str, subject: str, body: str, target: str = None):
+    if check_wrb2526.COALESCE_WINDOW > 0:
+        from coalesce import get_coalescer
+        get_coalescer().send(status, subject, body, to=to, target=target)
+    else:
+        check_wrb2526.send_email(status, subject=subject, body=body, to=to)
+
+
+async def deliver(recipient: str, status: str, subject: str, body: str, target: str = None):
+    """Send one alert to one recipient: an email address (from a worker thread), or a WRB_NOTIFY channel."""
+    kind, _, address = recipient.partition(":")
+    if kind == "email" or "@" in kind:
+        await asyncio.to_thread(email_recipient, address if kind == "email" else recipient, status, subject, body, target)
+        return
+    from notifiers import notify_channels_async      # httpx is only needed for push channels
+    await notify_channels_async(status, recipient, subject=subject, body=body)
+
+
+class Fanout:
+    """Sends each event to every subscriber of it, once per recipient."""
+
+    def __init__(self, registry: Registry, send=None):
+        self.registry = registry
+        self.send_one = send or deliver
+
+    async def _send_one(self, recipient: str, status: str, subject: str, body: str, target: str) -> bool:
+        try:
+            outcome = self.send_one(recipient, status, subject, body, target=target)
+            if inspect.isawaitable(outcome):
+                await outcome
+        except Exception as e:
+            print(f"❌ Alert to {recipient} failed: {type(e).__name__}: {e}")
+            return False
+        return True
+
+    async def send(self, event: str, targets, status: str, subject: str, body: str) -> int:
+        """Alert every recipient of ``event`` on ``targets`` at once; returns how many were sent.
+
+        A recipient that fails doesn't stop the rest. Raises NotificationError
+        only if there were recipients and none of them could be sent to.
+        """
+        recipients = self.registry.recipients(event, *targets)
+        sent = await asyncio.gather(*(self._send_one(recipient, status, subject, body, targets[0])
+                                      for recipient in recipients))
+        failed = len(recipients) - sum(sent)
+        if recipients and failed == len(recipients):
+            from notifiers import NotificationError
+            raise NotificationError(f"No subscriber could be sent the alert: {status}")
+        return len(recipients) - failed
+
+    async def cancellations(self, watchlist, changes) -> list:
+        """Evaluate a Watchlist against timetable changes, alerting each freed room's subscribers."""
+        freed = watchlist.evaluate(changes)
+        for watch, week in freed:
+            status, subject, body = watch.message(week)
+            await self.send(CANCELLATION, (watch.room,), status, subject, body)
+        return freed
+
+
+class SubscribedMonitor(TargetMonitor):
+    """A TargetMonitor that polls only subscribed targets, once each, and alerts their subscribers.
+
+    With a TimetableSync and a Watchlist, each round also refreshes the room
+    timetables that are due and alerts cancellation subscribers.
+    """
+
+    def __init__(self, registry: Registry, profiles=None, machine: StateMachine = None, sync: TimetableSync = None,
+                 watchlist=None, **options):
+        self.registry = registry
+        self.fanout = Fanout(registry)
+        self.sync = sync
+        self.watchlist = watchlist
+        super().__init__(profiles, machine, **options)
+
+    def refresh(self):
+        self.registry.refresh()
+        super().refresh()
+        self.targets = {url: target for url, target in self.targets.items()
+                        if self.registry.watched(url, target.site.name)}
+
+    async def alert(self, target, event, status, subject, body):
+        await self.fanout.send(event, (target.url, target.site.name), status, subject, body)
+
+    async def poll_with(self, checker) -> list:
+        outcomes = await super().poll_with(checker)
+        if self.sync is not None and self.watchlist is not None:
+            await self.cancellations()
+        return outcomes
+
+    async def cancellations(self) -> list:
+        """Watch the subscribed rooms, refresh the timetables that are due and alert on freed slots.
+
+        The timetable fetches run in a worker thread, so other targets' polls carry on meanwhile.
+        """
+        rooms = set(self.registry.rooms())
+        for room in rooms - self.sync.watched:
+            self.sync.watch(room)
+        for room in self.sync.watched - rooms:
+            self.sync.unwatch(room)
+        return await self.fanout.cancellations(self.watchlist, await asyncio.to_thread(self.sync.run_due))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage WRB subscriptions, or poll for every tenant.")
+    parser.add_argument("--db", default=os.getenv("WRB_SUBSCRIPTIONS", DEFAULT_DB))
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help in (("add", "Subscribe a recipient"), ("remove", "Unsubscribe a recipient")):
+        command = sub.add_parser(name, help=help)
+        command.add_argument("tenant")
+        command.add_argument("target", help="WRB URL, site name, room code or *")
+        command.add_argument("event", help=f"{', '.join(EVENTS)} or *")
+        command.add_argument("recipient", help="Email address or WRB_NOTIFY channel")
+    listing = sub.add_parser("list", help="Subscriptions, by tenant")
+    listing.add_argument("--tenant")
+    drop = sub.add_parser("drop", help="Remove a tenant and its subscriptions")
+    drop.add_argument("tenant")
+    sub.add_parser("run", help="Poll every subscribed target")
+    args = parser.parse_args(argv)
+
+    registry = Registry(args.db)
+    try:
+        if args.command == "add":
+            print(registry.subscribe(args.tenant, args.target, args.event, args.recipient))
+        elif args.command == "remove":
+            print(f"Removed {registry.unsubscribe(args.tenant, args.target, args.event, args.recipient)}.")
+        elif args.command == "list":
+            for subscription in sorted(registry.subscriptions(args.tenant), key=lambda s: s.tenant):
+                print(f"{subscription.tenant}: {subscription.target} {subscription.event} -> {subscription.recipient}")
+        elif args.command == "drop":
+            print(f"Removed {args.tenant} and {registry.remove_tenant(args.tenant)} subscriptions.")
+        elif args.command == "run":
+            profiles = dict(PROFILES)
+            if os.getenv("WRB_SITES"):
+                profiles.update(load_profiles(os.environ["WRB_SITES"]))
+            machine = StateMachine(check_wrb2526.STATE_FILE or DEFAULT_STATE_FILE,
+                                   parse_hysteresis(os.getenv("WRB_HYSTERESIS")))
+            sync = watchlist = None
+            if os.getenv("WRB_WATCHLIST"):
+                watchlist = load_watchlist(os.environ["WRB_WATCHLIST"])
+                sync = TimetableSync(watchlist.rooms(), watchlist.weeks(), watched=registry.rooms(),
+                                     state_file=os.getenv("WRB_TIMETABLE_FILE"))
+            monitor = SubscribedMonitor(registry, profiles, machine, sync=sync, watchlist=watchlist)
+            print(f"🎯 Watching {len(monitor.targets)} targets for {len(registry.tenants())} tenants")
+            try:
+                monitor.run(interval=float(os.getenv("WRB_POLL_INTERVAL", POLL_INTERVAL)))
+            finally:
+                if sync is not None:
+                    sync.close()
+    finally:
+        registry.close()
+
+
+if __name__ == "__main__":
+    main()
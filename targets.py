@@ -0,0 +1,241 @@
+"""
+Targets for any Scientia WRB site, derived from the date.
+
+check_wrb2526.py watches one URL, ``WRB2526``, with the 2025/26 and 2024/25
+markers built into its RuleSet. Here targets come from the calendar instead.
+From ``ROLLOVER_MONTH`` (June) on, the system to watch for is the one for
+the academic year starting that autumn, e.g. ``WRB2627`` with "2026/27" as
+the right year and "2025/26" as the wrong one. Each site also gets a
+speculative target for the year after: it is probed once every
+``SPECULATIVE_EVERY`` rounds, and only alerts if a real system turns up
+there. Once one does, it is polled every round.
+
+Sites are ``SiteProfile`` objects: a base URL, a path template and any markers
+that differ from Warwick's. ``PROFILES`` has Warwick; more come from a JSON file
+named by WRB_SITES::
+
+    [{"name": "example", "title": "Example", "base_url": "https://rooms.example.ac.uk/",
+      "path": "WRB{yy}{next_yy}/", "unavailable": "Service Unavailable"}]
+
+``TargetMonitor`` polls every site's targets from one process. All checks in
+a round run concurrently on one shared AsyncChecker client (httpx, the
+``async`` extra). Each target feeds the StateMachine from state_machine.py, so
+each real transition alerts once. Run ``python targets.py``, with WRB_ROUNDS=1
+for a single round from cron; that is what the GitHub workflow runs, keeping
+the state file between runs in the Actions cache.
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import date
+
+import check_wrb2526
+from async_check import AsyncChecker
+from check_wrb2526 import (ERROR, STATUS_MESSAGES, UNAVAILABLE, UNEXPECTED_STATUS, UNKNOWN, WRONG_YEAR, RuleSet,
+                           year_label)
+from state_machine import LIVE_STATES, STATES, StateMachine, parse_hysteresis, report, state_of
+
+ROLLOVER_MONTH = 6          # From June, watch for the academic year starting that autumn
+SPECULATIVE_EVERY = 10      # Rounds between probes of next year's URL
+POLL_INTERVAL = 60          # Seconds between rounds
+DEFAULT_STATE_FILE = "wrb_targets.json"
+
+# Events a target's transitions raise, for alert routing (see subscriptions.py)
+LIVE = "live"               # Went live
+CHANGED = "changed"         # Turned into something unrecognised, or the wrong year
+APPEARED = "appeared"       # Next year's system turned up
+EVENTS = (LIVE, CHANGED, APPEARED)
+
+
+class SiteProfile:
+    """One site running Scientia WRB: where it lives and how its pages read."""
+
+    __slots__ = ("name", "title", "base_url", "path", "rollover_month", "rule_options")
+
+    def __init__(self, name: str, base_url: str, title: str = None, path: str = "WRB{yy}{next_yy}/",
+                 rollover_month: int = ROLLOVER_MONTH, **rule_options):
+        self.name = name
+        self.title = title or name
+        self.base_url = base_url.rstrip("/") + "/"
+        self.path = path
+        self.rollover_month = rollover_month
+        self.rule_options = rule_options        # RuleSet overrides: unavailable, heading, login_markers, form_field
+
+    def url(self, year: int) -> str:
+        return self.base_url + self.path.format(yy=f"{year % 100:02d}", next_yy=f"{(year + 1) % 100:02d}", year=year)
+
+    def rules(self, year: int) -> RuleSet:
+        return RuleSet(year, **self.rule_options)
+
+    def booking_year(self, today: date) -> int:
+        """The academic year whose system should be watched for on ``today``."""
+        return today.year if today.month >= self.rollover_month else today.year - 1
+
+    def __repr__(self):
+        return f"SiteProfile({self.name}, {self.base_url})"
+
+
+PROFILES = {"warwick": SiteProfile("warwick", "https://abs.warwick.ac.uk/", title="Warwick")}
+
+
+def load_profiles(path: str) -> dict:
+    """Site profiles from a JSON list of SiteProfile keyword arguments, keyed by name."""
+    with open(path) as f:
+        items = json.load(f)
+    return {item["name"]: SiteProfile(**item) for item in items}
+
+
+class Target:
+    """One year's WRB at one site."""
+
+    __slots__ = ("site", "year", "url", "rules", "speculative")
+
+    def __init__(self, site: SiteProfile, year: int, speculative: bool = False):
+        self.site = site
+        self.year = year
+        self.url = site.url(year)
+        self.rules = site.rules(year)
+        self.speculative = speculative
+
+    @property
+    def title(self) -> str:
+        return f"{self.site.title} WRB {year_label(self.year)}"
+
+    def __repr__(self):
+        return f"Target({self.url}{', speculative' if self.speculative else ''})"
+
+
+def discover(profiles, today: date = None) -> list:
+    """This year's target and next year's speculative one, for every site."""
+    today = today or date.today()
+    targets = []
+    for site in profiles.values():
+        year = site.booking_year(today)
+        targets += [Target(site, year), Target(site, year + 1, speculative=True)]
+    return targets
+
+
+def probe_state(result) -> str:
+    """A speculative probe's state: a URL that isn't there yet (any 4xx) counts as ERROR, like an outage."""
+    if result.status_code is not None and 400 <= result.status_code < 500:
+        return ERROR
+    return state_of(result)
+
+
+class TargetMonitor:
+    """Polls every site's targets concurrently, alerting once per stable transition."""
+
+    def __init__(self, profiles=None, machine: StateMachine = None, speculative_every: int = SPECULATIVE_EVERY,
+                 today=date.today, client=None, concurrency: int = 20):
+        self.profiles = PROFILES if profiles is None else profiles
+        self.machine = machine or StateMachine()
+        self.machine.actions = [
+            ("*", "*", report),
+            (tuple(s for s in STATES if s not in LIVE_STATES), LIVE_STATES, self.alert_live),
+            ("*", (WRONG_YEAR, UNKNOWN), self.alert_unexpected),
+            (ERROR, UNAVAILABLE, self.alert_appeared),
+        ]
+        self.speculative_every = speculative_every
+        self.today = today
+        self.client = client
+        self.concurrency = concurrency
+        self.rounds = 0
+        self.targets = {}
+        self.refresh()
+
+    def refresh(self):
+        """Rediscover targets, so the academic year rolls over without a restart."""
+        self.targets = {target.url: target for target in discover(self.profiles, self.today())}
+
+    def due(self, round_number: int) -> list:
+        """Targets to check this round.
+
+        A speculative target is probed when first discovered and then every
+        ``speculative_every`` rounds, until it turns up.
+        """
+        return [target for target in self.targets.values()
+                if not target.speculative or round_number % self.speculative_every == 0
+                or self.machine.get(target.url) != ERROR]
+
+    def checker(self) -> AsyncChecker:
+        return AsyncChecker(self.client, concurrency=self.concurrency)
+
+    async def poll_with(self, checker: AsyncChecker) -> list:
+        """Run one round on ``checker``; returns ``(target, result, transition)`` for each target checked."""
+        self.refresh()
+        targets = self.due(self.rounds)
+        self.rounds += 1
+        results = await asyncio.gather(*(checker.check(target.url, target.rules) for target in targets))
+        history = check_wrb2526.get_history()
+        outcomes = []
+        for target, result in zip(targets, results):
+            if history is not None:
+                history.record(target.url, result.state or ERROR, status=result.status_code, url=result.url,
+                               content_hash=result.hash, elapsed=result.elapsed)
+            if target.speculative:
+                transition = await self.machine.observe_async(target.url, probe_state(result), result, initial=ERROR)
+            else:
+                transition = await self.machine.observe_async(target.url, state_of(result), result)
+            outcomes.append((target, result, transition))
+        return outcomes
+
+    def poll(self) -> list:
+        """Run one round on a client of its own; ``run()`` keeps one client for every round."""
+        async def once():
+            async with self.checker() as checker:
+                return await self.poll_with(checker)
+        return asyncio.run(once())
+
+    def run(self, rounds: int = None, interval: float = POLL_INTERVAL, sleep=asyncio.sleep):
+        """Poll ``rounds`` rounds, or forever, on one client and one event loop, so connections are reused."""
+        async def loop():
+            async with self.checker() as checker:
+                while rounds is None or self.rounds < rounds:
+                    started = time.monotonic()
+                    await self.poll_with(checker)
+                    if rounds is None or self.rounds < rounds:
+                        await sleep(max(interval - (time.monotonic() - started), 0))
+        asyncio.run(loop())
+
+    async def alert(self, target: Target, event: str, status: str, subject: str, body: str):
+        """Send one target's alert without blocking the other polls; subclasses can route it by ``event``."""
+        await check_wrb2526.notify_async(status, subject=subject, body=body)
+
+    # Transition actions, awaited by the state machine
+
+    async def alert_live(self, transition):
+        target = self.targets[transition.target]
+        status = STATUS_MESSAGES[transition.new]
+        await self.alert(target, LIVE, status, f"{target.title} is LIVE!",
+                         f"The {target.title} booking page is now live (status: {status}).\n\n{target.url}")
+
+    async def alert_unexpected(self, transition):
+        target = self.targets[transition.target]
+        if target.speculative:
+            return      # Whatever sits at a URL that isn't in use yet
+        await self.alert(target, CHANGED, UNEXPECTED_STATUS, f"{target.title}: page changed",
+                         f"{UNEXPECTED_STATUS}\n\n{target.url}")
+
+    async def alert_appeared(self, transition):
+        target = self.targets[transition.target]
+        if target.speculative:
+            await self.alert(target, APPEARED, f"{target.title} has appeared", f"{target.title} has appeared",
+                             f"Next year's system is up, though not open yet:\n\n{target.url}")
+
+
+def main():
+    profiles = dict(PROFILES)
+    if os.getenv("WRB_SITES"):
+        profiles.update(load_profiles(os.environ["WRB_SITES"]))
+    machine = StateMachine(check_wrb2526.STATE_FILE or DEFAULT_STATE_FILE,
+                           parse_hysteresis(os.getenv("WRB_HYSTERESIS")))
+    monitor = TargetMonitor(profiles, machine)
+    print(f"🎯 Watching {', '.join(target.url for target in monitor.targets.values())}")
+    rounds = os.getenv("WRB_ROUNDS")       # e.g. 1 for a cron job
+    monitor.run(int(rounds) if rounds else None, float(os.getenv("WRB_POLL_INTERVAL", POLL_INTERVAL)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+pytest configuration: keep the suite hermetic and safe to run in parallel.
+
+Unless ENABLE_REAL_EMAIL_TESTS=true, placeholder credentials are set before
+anything loads .env, so no test can log in to a real mailbox. Settings that
+send alerts elsewhere or write state (WRB_NOTIFY, WRB_STATE_FILE and the rest
+of ``OFFLINE_SETTINGS``) are always blanked. They are set to empty values
+rather than removed, so a .env file can't fill them back in. The interactive
+and network-bound scripts in this directory are left out of collection; run
+them directly. ``wrb_stand_in`` and ``smtp_sink`` give pytest-style tests the
+local stand-ins from stand_ins.py, with check_page() and send_email() pointed
+at them. The pages the tests share are in scenarios.py.
+
+Nothing waits on real time for longer than the behaviour under test needs, so
+the suite is quick serially and quicker still with ``pytest -n auto``.
+"""
+
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if os.getenv("ENABLE_REAL_EMAIL_TESTS") != "true":
+    os.environ.setdefault("EMAIL_USER", "bot@example.com")
+    os.environ.setdefault("EMAIL_PASS", "app-password")
+    os.environ.setdefault("TO_EMAIL", "alerts@example.com")
+
+# Blank, not unset: load_dotenv() never overrides a variable that is already set
+OFFLINE_SETTINGS = {
+    "WRB_NOTIFY": "",
+    "WRB_STATE_FILE": "",
+    "WRB_PRE_PROBE": "",
+    "WRB_PROBE_FILE": "",
+    "WRB_RATE_LIMIT_DB": "",
+    "WRB_SMTP_ACCOUNTS": "",
+    "WRB_COALESCE_WINDOW": "0",
+    "WRB_HISTORY_DB": "",
+}
+os.environ.update(OFFLINE_SETTINGS)
+
+from tests.stand_ins import SMTPSink, WRBStandIn  # noqa: E402
+
+# Scripts that prompt, send real email or fetch the live site
+collect_ignore = [
+    "test_email.py",
+    "test_email_simple.py",
+    "test_live.py",
+    "test_real_2425_page.py",
+    "test_real_email.py",
+    "test_scenarios.py",
+    "test_with_real_email.py",
+]
+
+
+@pytest.fixture
+def wrb_stand_in():
+    """A local WRB that check_page() fetches instead of the real one."""
+    import check_wrb2526
+
+    with WRBStandIn() as stand_in, patch.object(check_wrb2526, "URL", stand_in.url):
+        yield stand_in
+
+
+@pytest.fixture
+def smtp_sink():
+    """A local SMTP server that send_email() delivers to in plain text."""
+    import check_wrb2526
+
+    with SMTPSink() as sink, patch.multiple(check_wrb2526, SMTP_SERVER=sink.host, SMTP_PORT=sink.port,
+                                            SMTP_USE_SSL=False):
+        yield sink
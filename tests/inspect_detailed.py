@@ -7,8 +7,8 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import requests
-from check_wrb2526 import URL, CHECK_STRING, check_page
+from cassette import cassette_from_env
+from check_wrb2526 import URL, CHECK_STRING, check_page, fetch
 from unittest.mock import patch
 
 def show_full_page():
@@ -17,7 +17,7 @@ def show_full_page():
     print("=" * 60)
     
     try:
-        response = requests.get(URL, allow_redirects=True)
+        response = fetch()
         text = response.text
         
         print(f"Page length: {len(text)} characters")
@@ -27,11 +27,11 @@ def show_full_page():
         print(text)
         print("-" * 60)
         
-        return text, response.url
+        return response
         
     except Exception as e:
         print(f"Error: {e}")
-        return None, None
+        return None
 
 def analyze_bot_logic(text, final_url):
     """Analyze exactly what the bot would do with this content."""
@@ -87,21 +87,24 @@ def analyze_bot_logic(text, final_url):
     
     return action
 
-def run_actual_bot():
-    """Run the actual bot and capture its behavior."""
+def run_actual_bot(response):
+    """Run the actual bot on the already-fetched response and capture its behavior."""
     print(f"\n🤖 ACTUAL BOT EXECUTION")
     print("=" * 30)
     
     email_sent = None
     print_called = None
     
-    with patch('check_wrb2526.send_email') as mock_send_email:
+    # notify() covers every alert channel; the state file and pre-probe stay untouched
+    with patch('check_wrb2526.fetch', return_value=response), \
+         patch.multiple('check_wrb2526', STATE_FILE=None, PRE_PROBE=None, HISTORY_DB=None), \
+         patch('check_wrb2526.notify') as mock_notify:
         with patch('builtins.print') as mock_print:
             try:
                 check_page()
                 
-                if mock_send_email.called:
-                    email_sent = mock_send_email.call_args[0][0]
+                if mock_notify.called:
+                    email_sent = mock_notify.call_args[0][0]
                     print(f"📧 Email sent: '{email_sent}'")
                 else:
                     print("📧 No email sent")
@@ -123,15 +126,15 @@ def main():
     print("=" * 50)
     
     # Get page content
-    text, final_url = show_full_page()
-    if not text:
+    response = show_full_page()
+    if response is None:
         return
     
     # Analyze what bot should do
-    predicted_action = analyze_bot_logic(text, final_url)
+    predicted_action = analyze_bot_logic(response.text, response.url)
     
-    # Run actual bot
-    email_sent, print_called = run_actual_bot()
+    # Run actual bot on the same response, so both see the same page
+    email_sent, print_called = run_actual_bot(response)
     
     # Compare prediction vs reality
     print(f"\n✅ VERIFICATION")
@@ -154,4 +157,5 @@ def main():
         print("❌ UNKNOWN: Bot did something unexpected")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    with cassette_from_env():
+        main() 
\ No newline at end of file
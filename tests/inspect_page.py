@@ -9,10 +9,11 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import requests
-from check_wrb2526 import URL, CHECK_STRING
+from cassette import cassette_from_env
+from check_wrb2526 import URL, CHECK_STRING, fetch
 
 def inspect_page():
-    """Inspect the current state of the Warwick booking page."""
+    """Inspect the current state of the Warwick booking page; returns the response, or None on failure."""
     print("🔍 Warwick Room Booking Page Inspector")
     print("=" * 50)
     print(f"📡 Target URL: {URL}")
@@ -21,7 +22,7 @@ def inspect_page():
     
     try:
         print("📥 Making HTTP request...")
-        response = requests.get(URL, allow_redirects=True)
+        response = fetch()
         
         print(f"✅ Request successful!")
         print(f"   Status Code: {response.status_code}")
@@ -101,32 +102,35 @@ def inspect_page():
                 title = text[title_start:title_end].strip()
                 print(f"\n📰 Page Title: '{title}'")
         
-        return True
+        return response
         
     except requests.RequestException as e:
         print(f"❌ Request failed: {e}")
         print("   ➜ Bot would crash with this error")
-        return False
+        return None
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
-        return False
+        return None
 
-def compare_with_bot():
-    """Run the actual bot logic and compare."""
+def compare_with_bot(response):
+    """Run the actual bot logic on the inspected response and compare."""
     print(f"\n🤖 Running Actual Bot Logic:")
     print("-" * 30)
     
     from check_wrb2526 import check_page
     from unittest.mock import patch
     
-    # Capture the bot's output
-    with patch('check_wrb2526.send_email') as mock_send_email:
+    # Capture the bot's output, reusing the response rather than fetching again
+    # notify() covers every alert channel; the state file and pre-probe stay untouched
+    with patch('check_wrb2526.fetch', return_value=response), \
+         patch.multiple('check_wrb2526', STATE_FILE=None, PRE_PROBE=None, HISTORY_DB=None), \
+         patch('check_wrb2526.notify') as mock_notify:
         with patch('builtins.print') as mock_print:
             try:
                 check_page()
                 
-                if mock_send_email.called:
-                    args = mock_send_email.call_args[0]
+                if mock_notify.called:
+                    args = mock_notify.call_args[0]
                     print(f"📧 Bot would send email: '{args[0]}'")
                 elif mock_print.called:
                     args = mock_print.call_args[0]
@@ -138,9 +142,10 @@ def compare_with_bot():
                 print(f"❌ Bot crashed: {e}")
 
 if __name__ == "__main__":
-    success = inspect_page()
-    if success:
-        compare_with_bot()
+    with cassette_from_env():
+        response = inspect_page()
+        if response is not None:
+            compare_with_bot(response)
     
     print(f"\n" + "=" * 50)
     print("✅ Page inspection complete!")
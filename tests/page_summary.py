@@ -7,8 +7,8 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import requests
-from check_wrb2526 import URL, CHECK_STRING, check_page
+from cassette import cassette_from_env
+from check_wrb2526 import URL, CHECK_STRING, check_page, fetch
 from unittest.mock import patch
 
 def main():
@@ -18,7 +18,7 @@ def main():
     
     try:
         # Get page
-        response = requests.get(URL, allow_redirects=True)
+        response = fetch()
         text = response.text
         
         # Basic info
@@ -68,12 +68,15 @@ def main():
         
         # Test actual bot
         print(f"\n🧪 ACTUAL BOT TEST:")
-        with patch('check_wrb2526.send_email') as mock_send_email:
+        # notify() covers every alert channel; the state file and pre-probe stay untouched
+        with patch('check_wrb2526.fetch', return_value=response), \
+             patch.multiple('check_wrb2526', STATE_FILE=None, PRE_PROBE=None, HISTORY_DB=None), \
+             patch('check_wrb2526.notify') as mock_notify:
             with patch('builtins.print') as mock_print:
                 check_page()
                 
-                if mock_send_email.called:
-                    email_msg = mock_send_email.call_args[0][0]
+                if mock_notify.called:
+                    email_msg = mock_notify.call_args[0][0]
                     print(f"   📧 Result: Email sent - '{email_msg}'")
                     print("   🚨 ALERT: BOOKING SYSTEM DETECTED AS LIVE!")
                 elif mock_print.called:
@@ -90,4 +93,5 @@ def main():
         print(f"❌ Error: {e}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    with cassette_from_env():
+        main() 
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+Pages the WRB has served, or might serve, and what the bot should do about each.
+
+Shared by the unit tests and by the interactive scripts (test_scenarios.py,
+test_with_real_email.py). Each entry has the page ``content``, the ``url`` it
+was fetched from after redirects, and the expected action and message.
+"""
+
+from check_wrb2526 import URL
+
+TEST_SCENARIOS = {
+    "unavailable": {
+        "name": "🔴 System Unavailable (Current State)",
+        "description": "Page shows 'Application Unavailable'",
+        "url": URL,
+        "content": """
+<!DOCTYPE html>
+<html>
+<head><title>Scientia Web Room Booking</title></head>
+<body>
+    <div class="Banner">
+        <span class="BannerTitle">Application Unavailable</span>
+        <span class="Text">The web room booking facility is currently unavailable. Please try again later.</span>
+    </div>
+    <td>Web Room Booking System 2025/26</td>
+</body>
+</html>
+        """,
+        "expected_action": "print",
+        "expected_message": "Still unavailable."
+    },
+    
+    "login_redirect": {
+        "name": "🟡 Login Redirect (System Live)",
+        "description": "Page redirects to login - system is live but requires auth",
+        "url": "https://abs.warwick.ac.uk/Login.aspx?ReturnUrl=/WRB2526/",
+        "content": """
+<!DOCTYPE html>
+<html>
+<head><title>Login - Warwick</title></head>
+<body>
+    <form>
+        <h2>Please log in</h2>
+        <input type="text" name="username" placeholder="Username">
+        <input type="password" name="password" placeholder="Password">
+        <button>Log In</button>
+    </form>
+</body>
+</html>
+        """,
+        "expected_action": "email",
+        "expected_message": "Redirected to login (system live)"
+    },
+    
+    "return_url": {
+        "name": "🟡 Return URL (System Live)",
+        "description": "Page has ReturnUrl parameter - another login scenario",
+        "url": "https://abs.warwick.ac.uk/some/path?ReturnUrl=/WRB2526/",
+        "content": """
+<!DOCTYPE html>
+<html>
+<head><title>Access Required</title></head>
+<body>
+    <h1>Access Required</h1>
+    <p>Please authenticate to continue</p>
+</body>
+</html>
+        """,
+        "expected_action": "email",
+        "expected_message": "Redirected to login (system live)"
+    },
+    
+    "booking_form_wrb": {
+        "name": "🟢 Booking Form (WRB Text)",
+        "description": "Booking form detected via 'Web Room Booking System 2025/26'",
+        "url": URL,
+        "content": """
+<!DOCTYPE html>
+<html>
+<head><title>Room Booking System</title></head>
+<body>
+    <h1>Web Room Booking System 2025/26</h1>
+    <form>
+        <label>Select Room:</label>
+        <select name="room">
+            <option>Meeting Room A</option>
+            <option>Conference Room B</option>
+        </select>
+        <label>Date:</label>
+        <input type="date" name="date">
+        <button>Book Room</button>
+    </form>
+</body>
+</html>
+        """,
+        "expected_action": "email",
+        "expected_message": "Booking form detected"
+    },
+    
+    "booking_form_preferred": {
+        "name": "🟢 Booking Form (Preferred Start)",
+        "description": "Booking form detected via 'Preferred Start' text",
+        "url": URL,
+        "content": """
+<!DOCTYPE html>
+<html>
+<head><title>Room Booking</title></head>
+<body>
+    <h1>Room Booking System</h1>
+    <form>
+        <label>Preferred Start Time:</label>
+        <input type="time" name="start_time">
+        <label>Duration:</label>
+        <select name="duration">
+            <option>1 hour</option>
+            <option>2 hours</option>
+        </select>
+        <button>Submit Booking</button>
+    </form>
+</body>
+</html>
+        """,
+        "expected_action": "email", 
+        "expected_message": "Booking form detected"
+    },
+    
+    "wrb_2425": {
+        "name": "🟠 WRB 2024/25 (Wrong Year)",
+        "description": "Page shows 2024/25 system instead of 2025/26",
+        "url": URL,
+        "content": """
+<!DOCTYPE html>
+<html>
+<head><title>Room Booking System</title></head>
+<body>
+    <h1>Web Room Booking System 2024/25</h1>
+    <form>
+        <label>Select Room:</label>
+        <select name="room">
+            <option>Meeting Room A</option>
+            <option>Conference Room B</option>
+        </select>
+        <label>Preferred Start Time:</label>
+        <input type="time" name="start_time">
+        <button>Book Room</button>
+    </form>
+</body>
+</html>
+        """,
+        "expected_action": "email",
+        "expected_message": "UNEXPECTED CHANGE - Page changed but not recognized as booking system. Manual check required."
+    },
+    
+    "unknown_change": {
+        "name": "🔵 Unknown Page Change",
+        "description": "Page changed but doesn't match expected patterns",
+        "url": URL,
+        "content": """
+<!DOCTYPE html>
+<html>
+<head><title>System Maintenance</title></head>
+<body>
+    <h1>System Maintenance</h1>
+    <p>The room booking system is undergoing maintenance.</p>
+    <p>Expected completion: 2 hours</p>
+</body>
+</html>
+        """,
+        "expected_action": "email",
+        "expected_message": "UNEXPECTED CHANGE - Page changed but not recognized as booking system. Manual check required."
+    }
+}
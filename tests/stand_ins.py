@@ -0,0 +1,478 @@
+"""
+Local stand-ins for the services the bot talks to.
+
+WRBStandIn serves a small imitation of the Scientia WRB WebForms app on
+127.0.0.1: an "Application Unavailable" page until it is switched live, then a
+login redirect, a Login.aspx form and a booking form carrying ASP.NET
+__VIEWSTATE / __EVENTVALIDATION tokens that submissions must echo back.
+Individual paths can be overridden with ``serve()`` to stage any page.
+
+PushStandIn accepts anything POSTed to it, like a webhook, ntfy or Gotify
+server, and records it; paths can be made slow or failing.
+
+SMTPSink is an in-process SMTP server that accepts AUTH and keeps every
+message it is sent, parsed, so tests can assert on the MIME that went out.
+Any command can be made slow or failing, to stand in for a degraded provider.
+SinkTestCase points send_email() at a fresh SMTPSink for each test.
+"""
+
+import base64
+import secrets
+import socketserver
+import threading
+import time
+import unittest
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+UNAVAILABLE_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Scientia Web Room Booking</title></head>
+<body>
+    <div class="Banner">
+        <span class="BannerTitle">Application Unavailable</span>
+        <span class="Text">The web room booking facility is currently unavailable. Please try again later.</span>
+    </div>
+</body>
+</html>
+"""
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Login</title></head>
+<body>
+<form method="post" action="/Login.aspx{query}" id="form1">
+    <input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{viewstate}" />
+    <input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{validation}" />
+    <span>User Name</span><input name="txtUserName" type="text" id="txtUserName" />
+    <span>User Password</span><input name="txtPassword" type="password" id="txtPassword" />
+    <input type="submit" name="btnLogin" value="Log In" id="btnLogin" />
+</form>
+</body>
+</html>
+"""
+
+FORM_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Web Room Booking System 2025/26</title></head>
+<body>
+<form method="post" action="/WRB2526/" id="form1">
+    <input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{viewstate}" />
+    <input type="hidden" name="__VIEWSTATEGENERATOR" id="__VIEWSTATEGENERATOR" value="CA0B0334" />
+    <input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{validation}" />
+    <span class="BannerTitle">Web Room Booking System 2025/26</span>
+    <p>{message}</p>
+    <label>Room</label><input name="ctl00$Main$txtRoom" type="text" />
+    <label>Preferred Start</label><input name="ctl00$Main$txtStart" type="text" />
+    <input type="submit" name="ctl00$Main$btnBook" value="Book" />
+    <input type="hidden" name="ctl00$Main$hidTerm" id="ctl00_Main_hidTerm" value="1" />
+</form>
+</body>
+</html>
+"""
+
+
+def stream_text(response, text: str):
+    """Give a mocked requests response a body to stream, the way fetch(stream=True) callers read it."""
+    response.text = text
+    response.encoding = "utf-8"
+    response.iter_content.return_value = [text.encode()]
+    return response
+
+
+class WRBStandIn:
+    """A local imitation of the WRB booking app, run on a background thread."""
+
+    def __init__(self, live=False, users=None, latency=0.0, session_ttl=3600.0,
+                 single_use_tokens=False):
+        self.live = live
+        self.users = users if users is not None else {"officer": "secret"}
+        self.latency = latency
+        self.session_ttl = session_ttl
+        self.single_use_tokens = single_use_tokens
+        self.bookings = []
+        self.requests = []
+        self.pages = {}
+        self.sessions = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.01,), daemon=True)
+
+    @property
+    def origin(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def url(self) -> str:
+        return f"{self.origin}/WRB2526/"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def serve(self, path, body="", status=200, location=None):
+        """Answer every request for ``path`` with a fixed page, or a redirect to ``location``."""
+        headers = [("Location", location)] if location else []
+        self.pages[path] = (status, body, headers)
+
+    def count(self, method, path) -> int:
+        """Return how many requests were made for a method and path."""
+        return sum(1 for m, p in self.requests if m == method and p == path)
+
+    def issue_tokens(self) -> tuple:
+        """Mint a __VIEWSTATE / __EVENTVALIDATION pair."""
+        viewstate = secrets.token_urlsafe(24)
+        validation = secrets.token_urlsafe(12)
+        with self._lock:
+            self.tokens[viewstate] = validation
+        return viewstate, validation
+
+    def redeem_tokens(self, fields) -> bool:
+        """Check posted tokens were issued by this server."""
+        viewstate = fields.get("__VIEWSTATE")
+        with self._lock:
+            if self.tokens.get(viewstate) != fields.get("__EVENTVALIDATION"):
+                return False
+            if self.single_use_tokens:
+                del self.tokens[viewstate]
+        return True
+
+    def session_valid(self, cookie_header) -> bool:
+        for part in (cookie_header or "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "ASP.NET_SessionId":
+                with self._lock:
+                    return self.sessions.get(value, 0) > time.time()
+        return False
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True      # Or each keep-alive reply waits ~40ms on a delayed ACK
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body="", headers=()):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            def _form(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode()
+                return {k: v[0] for k, v in parse_qs(body, keep_blank_values=True).items()}
+
+            def _route(self, method):
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                parsed = urlparse(self.path)
+                fields = self._form() if method == "POST" else {}
+                with stand_in._lock:
+                    stand_in.requests.append((method, parsed.path))
+
+                if parsed.path in stand_in.pages:
+                    return self._reply(*stand_in.pages[parsed.path])
+                if parsed.path == "/Login.aspx":
+                    return self._login(method, parsed, fields)
+                if not stand_in.live:
+                    return self._reply(200, UNAVAILABLE_PAGE)
+                if not stand_in.session_valid(self.headers.get("Cookie")):
+                    return self._reply(302, headers=[("Location", "/Login.aspx?ReturnUrl=/WRB2526/")])
+                if method == "POST":
+                    return self._book(fields)
+                return self._reply(200, self._form_page(""))
+
+            def _form_page(self, message):
+                viewstate, validation = stand_in.issue_tokens()
+                return FORM_PAGE.format(viewstate=viewstate, validation=validation, message=message)
+
+            def _login(self, method, parsed, fields):
+                if method == "GET":
+                    viewstate, validation = stand_in.issue_tokens()
+                    query = f"?{parsed.query}" if parsed.query else ""
+                    return self._reply(200, LOGIN_PAGE.format(query=query, viewstate=viewstate, validation=validation))
+                user = fields.get("txtUserName")
+                if (not stand_in.redeem_tokens(fields) or "btnLogin" not in fields
+                        or stand_in.users.get(user) != fields.get("txtPassword")):
+                    return self._reply(200, LOGIN_PAGE.format(query="", viewstate="", validation=""))
+                sid = secrets.token_hex(12)
+                with stand_in._lock:
+                    stand_in.sessions[sid] = time.time() + stand_in.session_ttl
+                target = parse_qs(parsed.query).get("ReturnUrl", ["/WRB2526/"])[0]
+                return self._reply(302, headers=[
+                    ("Location", target),
+                    ("Set-Cookie", f"ASP.NET_SessionId={sid}; path=/; HttpOnly"),
+                ])
+
+            def _book(self, fields):
+                if not stand_in.redeem_tokens(fields):
+                    return self._reply(500, "<html><body>Invalid viewstate.</body></html>")
+                if fields.get("ctl00$Main$hidTerm") != "1":
+                    return self._reply(200, self._form_page("Please choose a term"))
+                with stand_in._lock:
+                    stand_in.bookings.append(fields)
+                return self._reply(200, self._form_page("Booking confirmed"))
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_HEAD(self):
+                self._route("HEAD")
+
+            def do_POST(self):
+                self._route("POST")
+
+        return Handler
+
+
+class PushStandIn:
+    """Records every request, as a webhook or push server would receive it."""
+
+    def __init__(self):
+        self.received = []          # (method, path, headers, body) in arrival order
+        self.delays = {}            # path -> seconds to wait before answering
+        self.statuses = {}          # path -> status code to answer with
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.01,), daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}{path}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True      # Or each keep-alive reply waits ~40ms on a delayed ACK
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                path = urlparse(self.path).path
+                time.sleep(stand_in.delays.get(path, 0))
+                with stand_in._lock:
+                    stand_in.received.append(("POST", self.path, dict(self.headers), body))
+                status = stand_in.statuses.get(path, 200)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+        return Handler
+
+
+class SMTPSink:
+    """An in-process SMTP server that keeps every message it receives."""
+
+    def __init__(self, users=None, reject=(), delays=None, failures=None):
+        self.users = users          # {user: password}; None accepts any login
+        self.reject = set(reject)   # Recipients refused with a 550
+        # Injected faults, by command ("CONNECT" for the greeting): seconds to
+        # stall before answering, and a reply to answer with instead
+        self.delays = dict(delays or {})
+        self.failures = dict(failures or {})
+        self.messages = []          # Parsed email.message.EmailMessage objects
+        self.envelopes = []         # (mail_from, rcpt_tos) for each message
+        self.logins = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.01,), daemon=True)
+
+    @property
+    def host(self) -> str:
+        return "127.0.0.1"
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            disable_nagle_algorithm = True
+
+            def reply(self, line):
+                self.wfile.write(line.encode() + b"\r\n")
+
+            def read_line(self) -> str:
+                return self.rfile.readline().decode("utf-8", errors="replace").rstrip("\r\n")
+
+            def handle(self):
+                with sink._lock:
+                    sink.connections += 1
+                if self.injected("CONNECT"):
+                    return
+                self.reply("220 localhost SMTP sink")
+                mail_from, rcpt_tos = None, []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command, _, arg = line.decode("utf-8", errors="replace").rstrip("\r\n").partition(" ")
+                    command = command.upper()
+                    if self.injected(command):
+                        continue
+                    if command == "EHLO":
+                        self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+                    elif command == "HELO":
+                        self.reply("250 localhost")
+                    elif command == "AUTH":
+                        self.auth(*arg.split())
+                    elif command == "MAIL":
+                        mail_from, rcpt_tos = arg.partition(":")[2].split()[0].strip("<>"), []
+                        self.reply("250 OK")
+                    elif command == "RCPT":
+                        address = arg.partition(":")[2].split()[0].strip("<>")
+                        if address in sink.reject:
+                            self.reply("550 5.1.1 Recipient rejected")
+                        else:
+                            rcpt_tos.append(address)
+                            self.reply("250 OK")
+                    elif command == "DATA":
+                        if not rcpt_tos:
+                            self.reply("503 5.5.1 No recipients")
+                            continue
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        self.data(mail_from, rcpt_tos)
+                        self.reply("250 OK: queued")
+                    elif command in ("RSET", "NOOP"):
+                        if command == "RSET":
+                            mail_from, rcpt_tos = None, []
+                        self.reply("250 OK")
+                    elif command == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 5.5.2 Command not implemented")
+
+            def injected(self, command) -> bool:
+                """Stall and/or fail as configured for this command; True if it failed."""
+                time.sleep(sink.delays.get(command, 0))
+                if command in sink.failures:
+                    self.reply(sink.failures[command])
+                    return True
+                return False
+
+            def auth(self, mechanism, initial=None):
+                if mechanism.upper() == "PLAIN":
+                    if initial is None:
+                        self.reply("334 ")
+                        initial = self.read_line()
+                    _, user, password = base64.b64decode(initial).decode().split("\0")
+                else:
+                    if initial is None:
+                        self.reply("334 VXNlcm5hbWU6")
+                        initial = self.read_line()
+                    user = base64.b64decode(initial).decode()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    password = base64.b64decode(self.read_line()).decode()
+                if sink.users is not None and sink.users.get(user) != password:
+                    self.reply("535 5.7.8 Authentication credentials invalid")
+                    return
+                with sink._lock:
+                    sink.logins.append(user)
+                self.reply("235 2.7.0 Authentication successful")
+
+            def data(self, mail_from, rcpt_tos):
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if line in (b".\r\n", b".\n", b""):
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                data = b"".join(lines).replace(b"\r\n", b"\n")
+                message = BytesParser(policy=default_policy).parsebytes(data)
+                with sink._lock:
+                    sink.messages.append(message)
+                    sink.envelopes.append((mail_from, list(rcpt_tos)))
+
+        return Handler
+
+
+class SinkTestCase(unittest.TestCase):
+    """Points send_email() at a local SMTP sink for each test."""
+
+    sink_options = {}
+
+    def setUp(self):
+        import check_wrb2526
+
+        self.sink = SMTPSink(**self.sink_options).start()
+        self.addCleanup(self.sink.stop)
+        smtp = patch.multiple(check_wrb2526, SMTP_SERVER=self.sink.host, SMTP_PORT=self.sink.port,
+                              SMTP_USE_SSL=False)
+        smtp.start()
+        self.addCleanup(smtp.stop)
+        quiet = patch('builtins.print')
+        self.print = quiet.start()
+        self.addCleanup(quiet.stop)
+
+
+class Clock:
+    """A clock that only moves when a test sets ``now``."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,173 @@
+import unittest
+from unittest.mock import patch, Mock
+import os
+import random
+import sys
+from datetime import timedelta
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from urllib3 import HTTPHeaderDict
+
+import check_wrb2526
+import monitor
+from check_wrb2526 import CheckResult
+from anomaly import AnomalyDetector, QuantileSketch, header_signature, set_cookies
+from prediction import parse_event
+from tests.stand_ins import stream_text
+
+URL = "https://abs.warwick.ac.uk/WRB2526/"
+HEADERS = {"Server": "Microsoft-IIS/10.0", "X-AspNet-Version": "4.0.30319",
+           "Set-Cookie": "ASP.NET_SessionId=abc; path=/; HttpOnly"}
+
+
+class TestQuantileSketch(unittest.TestCase):
+    """Tests for the streaming quantile sketch."""
+
+    def test_relative_accuracy(self):
+        """Test that quantiles are within the sketch's relative error."""
+        rng = random.Random(3)
+        values = [rng.lognormvariate(-1, 0.5) for _ in range(20000)]
+        sketch = QuantileSketch(accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+        ordered = sorted(values)
+        for q in (0.5, 0.95, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q) / exact, 1, delta=0.02)
+        self.assertLess(len(sketch.buckets), 400)
+
+
+class TestAnomalyDetector(unittest.TestCase):
+    """Tests for latency and header anomaly detection."""
+
+    def setUp(self):
+        self.now = [0.0]
+        self.send = Mock()
+        self.detector = AnomalyDetector(warmup=30, clock=lambda: self.now[0], send=self.send)
+        self.rng = random.Random(7)
+
+    def feed(self, n, median, headers=HEADERS):
+        found = []
+        for _ in range(n):
+            self.now[0] += 60
+            found += self.detector.observe(URL, median * self.rng.uniform(0.9, 1.1), headers)
+        return found
+
+    def test_steady_latency_is_quiet(self):
+        """Test that normal jitter raises nothing."""
+        self.assertEqual(self.feed(300, 0.4), [])
+        self.assertFalse(self.detector.boosted())
+
+    def test_latency_shift_flagged_once(self):
+        """Test that a sustained slowdown is flagged once and boosts polling."""
+        self.feed(100, 0.4)
+        found = self.feed(20, 1.5)
+        self.assertEqual([a.kind for a in found], ["latency"])
+        self.assertTrue(self.detector.boosted())
+        self.send.assert_not_called()       # Pre-alerts are opt-in
+
+    def test_single_slow_request_ignored(self):
+        """Test that one slow response doesn't move the fast EWMA far enough."""
+        self.feed(100, 0.4)
+        self.now[0] += 60
+        self.assertEqual(self.detector.observe(URL, 0.9, HEADERS), [])
+
+    def test_header_change(self):
+        """Test that a new deployment's headers are flagged after a stable run."""
+        self.feed(40, 0.4)
+        found = self.feed(1, 0.4, dict(HEADERS, Server="Microsoft-IIS/10.0", **{"X-AspNet-Version": "4.8"}))
+        self.assertEqual([a.kind for a in found], ["headers"])
+
+    def test_headers_unstable_during_warmup(self):
+        """Test that header changes before the baseline settles aren't flagged."""
+        self.feed(5, 0.4)
+        self.assertEqual(self.feed(1, 0.4, {"Server": "nginx"}), [])
+
+    def test_pre_alert_cooldown(self):
+        """Test that pre-alerts go through send_email's signature at most once per cooldown."""
+        self.detector.pre_alert = True
+        self.feed(40, 0.4)
+        self.feed(1, 0.4, {"Server": "nginx"})
+        self.feed(40, 0.4, {"Server": "nginx"})
+        self.feed(1, 0.4, {"Server": "apache"})
+        self.send.assert_called_once()
+        self.assertEqual(self.send.call_args[0][0], "Activity detected")
+        self.assertIn("upstream activity", self.send.call_args[1]["subject"])
+
+    @patch('check_wrb2526.requests.get')
+    def test_check_page_observer(self, mock_get):
+        """Test that check_page hands each response to registered observers."""
+        r = Mock()
+        stream_text(r, "<html><body>Application Unavailable</body></html>")
+        r.url = URL
+        r.headers = HEADERS
+        r.elapsed = timedelta(milliseconds=350)
+        mock_get.return_value = r
+        with patch.object(check_wrb2526, "OBSERVERS", [self.detector]), patch('builtins.print'):
+            check_wrb2526.check_page()
+        stats = self.detector.targets[URL]
+        self.assertEqual(stats.count, 1)
+        self.assertAlmostEqual(stats.fast, 0.35)
+
+    def test_probe_latency_kept_apart(self):
+        """Test that fast pre-probe responses don't make full GETs look slow once the probe stops."""
+        for _ in range(60):
+            self.now[0] += 60
+            self.detector.observe(URL, 0.05 * self.rng.uniform(0.9, 1.1), HEADERS, probed=True)
+        self.assertEqual(self.feed(60, 0.4), [])
+        self.assertEqual(set(self.detector.targets), {URL, (URL, "probe")})
+        self.assertAlmostEqual(self.detector.targets[URL].slow, 0.4, delta=0.05)
+
+    def test_no_cookies(self):
+        """Test that a response without Set-Cookie has no cookies rather than None."""
+        r = requests.Response()
+        r.raw = Mock(headers=HTTPHeaderDict({"Server": "Microsoft-IIS/10.0"}))
+        self.assertEqual(set_cookies(r), [])
+        r.raw = None
+        self.assertEqual(set_cookies(r), [])
+
+    def test_cookie_expiry_dates(self):
+        """Test that cookie names are read per Set-Cookie header, not split on the commas in Expires."""
+        raw = HTTPHeaderDict({"Server": "Microsoft-IIS/10.0"})
+        raw.add("Set-Cookie", "ASP.NET_SessionId=abc; path=/; HttpOnly")
+        raw.add("Set-Cookie", "BIGipServer=123; expires=Wed, 21 Oct 2026 07:28:00 GMT; path=/")
+        r = requests.Response()
+        r.raw = Mock(headers=raw)
+        r.headers = requests.structures.CaseInsensitiveDict(raw)
+        self.assertEqual(header_signature(r.headers, set_cookies(r))[-2:],
+                         ("ASP.NET_SessionId", "BIGipServer"))
+
+
+class TestMonitorBoost(unittest.TestCase):
+    """Tests for anomaly-driven polling in the monitor."""
+
+    def test_polls_quickly_while_boosted(self):
+        """Test that an anomaly replans and drops the poll interval."""
+        clock = [parse_event("2026-06-20T00:00:00")]
+        detector = AnomalyDetector(clock=lambda: clock[0])
+        polled_at = []
+        states = iter(["UNAVAILABLE"] * 6 + ["LIVE_FORM"])
+
+        def check():
+            polled_at.append(clock[0])
+            if len(polled_at) == 1:
+                detector.anomalies.append(Mock(at=clock[0]))
+                detector.boosted_until = clock[0] + 600
+            return CheckResult(next(states))
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with patch('builtins.print'):
+            monitor.run(check=check, clock=lambda: clock[0], sleep=sleep, detector=detector)
+
+        gaps = [b - a for a, b in zip(polled_at, polled_at[1:])]
+        self.assertEqual(len(polled_at), 7)
+        self.assertTrue(all(gap <= monitor.BOOST_INTERVAL for gap in gaps))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,134 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+import check_wrb2526
+from check_wrb2526 import classify, content_hash, URL, UNAVAILABLE, LIVE_LOGIN
+from tests.stand_ins import WRBStandIn
+from tests.scenarios import TEST_SCENARIOS
+
+if httpx is not None:
+    from async_check import AsyncChecker, check_page_async
+
+
+def scenario_transport(delay=0.0):
+    """Serve each scenario at https://test/<name>, redirecting where the scenario was redirected."""
+    pages = {scenario["url"]: scenario["content"] for scenario in TEST_SCENARIOS.values() if scenario["url"] != URL}
+
+    async def handler(request):
+        if delay:
+            await asyncio.sleep(delay)
+        url = str(request.url)
+        if url in pages:
+            return httpx.Response(200, text=pages[url])
+        scenario = TEST_SCENARIOS[request.url.path.strip("/")]
+        if scenario["url"] != URL:
+            return httpx.Response(302, headers={"Location": scenario["url"]})
+        return httpx.Response(200, text=scenario["content"])
+    return httpx.MockTransport(handler)
+
+
+@unittest.skipIf(httpx is None, "httpx not installed")
+class TestAsyncChecker(unittest.TestCase):
+    """Tests for the async check API."""
+
+    def test_matches_sync_classifier(self):
+        """Test that every scenario gets the same state as the sync path."""
+        async def run():
+            async with httpx.AsyncClient(transport=scenario_transport()) as client:
+                checker = AsyncChecker(client)
+                return await checker.check_many(f"https://test/{name}" for name in TEST_SCENARIOS)
+
+        results = asyncio.run(run())
+        for (name, scenario), result in zip(TEST_SCENARIOS.items(), results):
+            with self.subTest(name):
+                self.assertEqual(result.state, classify(scenario["content"], scenario["url"]))
+                self.assertEqual(result.status_code, 200)
+
+    def test_follows_login_redirect(self):
+        """Test that the final URL after redirects is what gets classified."""
+        async def run():
+            async with httpx.AsyncClient(transport=scenario_transport()) as client:
+                return await check_page_async("https://test/login_redirect", client=client)
+
+        result = asyncio.run(run())
+        self.assertEqual(result.state, LIVE_LOGIN)
+        self.assertTrue(result.live)
+        self.assertIn("Login.aspx", result.url)
+
+    def test_events_mode_shared(self):
+        """Test that the async path honours WRB_PARSE_MODE too."""
+        async def run():
+            async with httpx.AsyncClient(transport=scenario_transport()) as client:
+                return await AsyncChecker(client).check("https://test/unavailable")
+
+        with patch.object(check_wrb2526, "PARSE_MODE", "events"):
+            self.assertEqual(asyncio.run(run()).state, UNAVAILABLE)
+
+    def test_events_mode_hash_matches_sync(self):
+        """Test that a page the parser stops reading early hashes the same on the async and sync paths."""
+        page = TEST_SCENARIOS["unavailable"]["content"].replace(
+            "<body>", "<body><!--" + "x" * 20000 + "-->").replace("</body>", "<p>" + "padding " * 20000 + "</p></body>")
+
+        async def run(url):
+            async with AsyncChecker() as checker:
+                return await checker.check(url)
+
+        with WRBStandIn() as site, patch.multiple(check_wrb2526, PARSE_MODE="events", URL=site.url):
+            site.serve("/WRB2526/", page)
+            expected, _ = check_wrb2526._fetch_and_classify()
+            result = asyncio.run(run(site.url))
+        self.assertEqual((result.state, expected.state), (UNAVAILABLE, UNAVAILABLE))
+        self.assertEqual(result.hash, expected.hash)
+        self.assertNotEqual(result.hash, content_hash(page.encode()))      # Reading did stop early
+
+    def test_errors_returned_not_raised(self):
+        """Test that a failed request comes back as a result with an error."""
+        def refuse(request):
+            raise httpx.ConnectError("connection refused", request=request)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(refuse)) as client:
+                return await AsyncChecker(client).check(URL)
+
+        result = asyncio.run(run())
+        self.assertIsNone(result.state)
+        self.assertIn("ConnectError", result.error)
+
+    def test_thousands_concurrently(self):
+        """Test that thousands of slow checks overlap rather than queue."""
+        async def run():
+            async with httpx.AsyncClient(transport=scenario_transport(delay=0.2)) as client:
+                checker = AsyncChecker(client, concurrency=2000)
+                started = asyncio.get_running_loop().time()
+                results = await checker.check_many(["https://test/unavailable"] * 2000)
+                return results, asyncio.get_running_loop().time() - started
+
+        results, elapsed = asyncio.run(run())
+        self.assertEqual({r.state for r in results}, {UNAVAILABLE})
+        self.assertLess(elapsed, 5)       # 2000 × 0.2s one at a time would take 400s
+
+    def test_no_side_effects(self):
+        """Test that async checks neither print nor email."""
+        async def run():
+            async with httpx.AsyncClient(transport=scenario_transport()) as client:
+                return await AsyncChecker(client).check("https://test/booking_form_wrb")
+
+        with patch('check_wrb2526.send_email') as mock_send_email, patch('builtins.print') as mock_print:
+            asyncio.run(run())
+        mock_send_email.assert_not_called()
+        mock_print.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,199 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import threading
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from booking import LOGIN_BACKOFF_MAX, Booking, BookingPipeline, accepted
+from formstate import hidden_fields
+from session_pool import SessionPool, login
+from tests.stand_ins import WRBStandIn, FORM_PAGE
+
+
+def bookings(n):
+    return [Booking(f"Room {i}", {"ctl00$Main$txtRoom": f"OC0.0{i}", "ctl00$Main$txtStart": "18:00"})
+            for i in range(n)]
+
+
+class TestBookingHelpers(unittest.TestCase):
+    """Tests for the WebForms helpers."""
+
+    def test_hidden_fields(self):
+        """Test that the ASP.NET tokens are extracted."""
+        fields = hidden_fields(FORM_PAGE.format(viewstate="vs", validation="ev", message=""))
+        self.assertEqual(fields["__VIEWSTATE"], "vs")
+        self.assertEqual(fields["__EVENTVALIDATION"], "ev")
+        self.assertNotIn("ctl00$Main$txtRoom", fields)
+
+    def test_login(self):
+        """Test logging in through the Login.aspx redirect."""
+        with WRBStandIn(live=True) as wrb:
+            session = requests.Session()
+            r = login(session, wrb.url, "officer", "secret")
+            self.assertEqual(r.url, wrb.url)
+            self.assertIn("Preferred Start", r.text)
+
+    def test_accepted(self):
+        """Test that only a confirmation page, or a redirect to one, counts as booked."""
+        def response(status, location=None, message=""):
+            r = requests.Response()
+            r.status_code = status
+            r._content = FORM_PAGE.format(viewstate="vs", validation="ev", message=message).encode()
+            if location:
+                r.headers["Location"] = location
+            return r
+        self.assertTrue(accepted(response(200, message="Booking confirmed")))
+        self.assertFalse(accepted(response(200, message="Please choose a term")))
+        self.assertTrue(accepted(response(302, "/WRB2526/Confirmation.aspx?id=42")))
+        self.assertFalse(accepted(response(302, "/Login.aspx?ReturnUrl=/WRB2526/")))
+        self.assertFalse(accepted(response(303)))
+        self.assertFalse(accepted(response(500)))
+
+    def test_login_bad_password(self):
+        """Test that a rejected login raises."""
+        with WRBStandIn(live=True) as wrb:
+            with self.assertRaises(RuntimeError):
+                login(requests.Session(), wrb.url, "officer", "wrong")
+
+
+class TestBookingPipeline(unittest.TestCase):
+    """Tests for the auto-booking pipeline against the local stand-in."""
+
+    def setUp(self):
+        self.wrb = WRBStandIn(live=True).start()
+        self.addCleanup(self.wrb.stop)
+
+    def test_submit_books_everything(self):
+        """Test that every pre-computed booking is accepted."""
+        with BookingPipeline(bookings(3), self.wrb.url, "officer", "secret") as pipeline:
+            pipeline.prewarm()
+            outcomes = pipeline.submit()
+
+        self.assertTrue(all(outcome.ok for outcome in outcomes), outcomes)
+        self.assertEqual(sorted(b["ctl00$Main$txtRoom"] for b in self.wrb.bookings),
+                         ["OC0.00", "OC0.01", "OC0.02"])
+
+    def test_expired_session_not_booked(self):
+        """Test that a POST redirected to the login page is reported as failed."""
+        with BookingPipeline(bookings(2), self.wrb.url, "officer", "secret") as pipeline:
+            pipeline.prewarm()
+            self.wrb.sessions.clear()
+            outcomes = pipeline.submit()
+
+        self.assertEqual([(outcome.ok, outcome.status_code) for outcome in outcomes], [(False, 302)] * 2)
+        self.assertEqual(self.wrb.bookings, [])
+
+    def test_failed_validation_not_booked(self):
+        """Test that a postback re-rendering the form with an error is reported as failed."""
+        with BookingPipeline([Booking("No term", {"ctl00$Main$hidTerm": ""})], self.wrb.url,
+                             "officer", "secret") as pipeline:
+            pipeline.prewarm()
+            outcome, = pipeline.submit()
+
+        self.assertEqual((outcome.ok, outcome.status_code), (False, 200))
+        self.assertEqual(self.wrb.bookings, [])
+
+    def test_borrowed_session_left_open(self):
+        """Test that closing the pipeline doesn't close a session it was lent."""
+        session = requests.Session()
+        with patch.object(session, "close") as close:
+            BookingPipeline(bookings(1), self.wrb.url, session=session).close()
+        close.assert_not_called()
+
+    def test_submit_is_concurrent(self):
+        """Test that submissions overlap instead of queueing behind each other."""
+        with BookingPipeline(bookings(5), self.wrb.url, "officer", "secret") as pipeline:
+            pipeline.prewarm()
+            self.wrb.latency = 0.05
+            outcomes = pipeline.submit()
+
+        # Each request takes >= 50ms at the stand-in; serially the last would start ~200ms in
+        self.assertLess(max(outcome.started for outcome in outcomes), 0.04)
+        self.assertTrue(all(outcome.elapsed >= 0.05 for outcome in outcomes))
+
+    def test_submit_uses_detection_page_tokens(self):
+        """Test that the page that showed the form supplies the tokens, with no extra GET."""
+        with BookingPipeline(bookings(1), self.wrb.url, "officer", "secret") as pipeline:
+            pipeline.prewarm()
+            page = pipeline.session.get(self.wrb.url).text
+            gets = self.wrb.count("GET", "/WRB2526/")
+            pipeline.submit(page)
+
+        self.assertEqual(self.wrb.count("GET", "/WRB2526/"), gets)
+        self.assertEqual(self.wrb.bookings[0]["__VIEWSTATE"], hidden_fields(page)["__VIEWSTATE"])
+
+    def test_watch_books_when_form_appears(self):
+        """Test that watch() waits out the unavailable page and books at go-live."""
+        self.wrb.live = False
+        timer = threading.Timer(0.2, lambda: setattr(self.wrb, "live", True))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        with BookingPipeline(bookings(2), self.wrb.url, "officer", "secret") as pipeline:
+            with patch("booking.login", wraps=login) as mock_login:
+                outcomes = pipeline.watch(interval=0.05, deadline=None)
+
+        self.assertEqual(len(outcomes), 2)
+        self.assertTrue(all(outcome.ok for outcome in outcomes))
+        # Nothing to log in to before go-live; the first login redirect triggers a real login
+        self.assertEqual(mock_login.call_count, 2)
+
+    def test_watch_renews_pooled_session(self):
+        """Test that a pooled session held through the watch is logged back in by the pool once it expires."""
+        login_url = f"{self.wrb.origin}/Login.aspx?ReturnUrl=/WRB2526/"
+        with SessionPool([("officer", "secret")], login_url=login_url, touch_url=self.wrb.url) as pool, \
+             pool.acquire() as session:
+            with BookingPipeline(bookings(1), self.wrb.url, session=session, pool=pool) as pipeline:
+                self.wrb.sessions.clear()       # Expired while the pipeline held it
+                outcomes = pipeline.watch(interval=0.05)
+            logins = pool.health()["logins"]
+
+        self.assertTrue(all(outcome.ok for outcome in outcomes), outcomes)
+        self.assertEqual(logins, 2)
+
+    def test_watch_survives_network_errors(self):
+        """Test that a failed poll is logged and retried rather than ending the watch."""
+        with BookingPipeline(bookings(1), self.wrb.url, "officer", "secret") as pipeline:
+            get, failures = pipeline.session.get, []
+
+            def flaky_get(*args, **kwargs):
+                if failures:
+                    raise failures.pop()
+                return get(*args, **kwargs)
+            with patch.object(pipeline.session, "get", side_effect=flaky_get), patch('builtins.print'):
+                pipeline.prewarm()
+                pipeline.prewarm = lambda expired=False: None      # Already warm
+                failures.append(requests.ConnectionError("reset by peer"))
+                outcomes = pipeline.watch(interval=0.01, deadline=time.time() + 5)
+
+        self.assertEqual(failures, [])
+        self.assertEqual([outcome.ok for outcome in outcomes], [True])
+
+    def test_watch_backs_off_failed_logins(self):
+        """Test that logins rejected again and again are retried with a growing delay."""
+        self.wrb.live = False
+        delays = []
+
+        def sleep(seconds):
+            self.wrb.live = True
+            delays.append(seconds)
+            if len(delays) == 10:
+                raise InterruptedError
+        with BookingPipeline(bookings(1), self.wrb.url, "officer", "wrong") as pipeline, \
+             patch('builtins.print'), patch('booking.time', wraps=time) as clock:
+            clock.sleep.side_effect = sleep
+            with self.assertRaises(InterruptedError):
+                pipeline.watch(interval=1)
+
+        # The unavailable page, then each failed login
+        self.assertEqual(delays, [1, 2, 4, 8, 16, 32, 64, 128, 256, LOGIN_BACKOFF_MAX])
+        self.assertEqual(self.wrb.count("POST", "/Login.aspx"), 9)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,149 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+import check_wrb2526
+import replay
+from cassette import Cassette, CassetteMiss, use_cassette
+from check_wrb2526 import URL, UNAVAILABLE, LIVE_LOGIN, fetch
+from tests.scenarios import TEST_SCENARIOS
+
+LOGIN_URL = "https://abs.warwick.ac.uk/Login.aspx?ReturnUrl=%2fWRB2526%2f"
+LOGIN_PAGE = b"<html><head><title>Log in</title></head><body><form></form></body></html>"
+
+
+class Handler(BaseHTTPRequestHandler):
+    """/WRB2526/ redirects to /Login.aspx; /logo.png is binary."""
+
+    hits = []
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        if self.path == "/WRB2526/":
+            self.send_response(302)
+            self.send_header("Location", "/Login.aspx?ReturnUrl=%2fWRB2526%2f")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = bytes(range(256)) if self.path == "/logo.png" else LOGIN_PAGE
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png" if self.path == "/logo.png" else "text/html; charset=utf-8")
+        self.send_header("X-Powered-By", "ASP.NET")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestCassette(unittest.TestCase):
+    """Tests for recording and replaying the fetch layer."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, args=(0.01,), daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        Handler.hits.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "wrb.cassette")
+
+    def test_record_then_replay(self):
+        """Test that every hop is recorded once and replayed with the same redirect chain."""
+        with use_cassette(self.path) as cassette:
+            live = fetch(self.base + "/WRB2526/")
+        self.assertTrue(cassette.recording)
+        self.assertEqual(len(Handler.hits), 2)
+
+        with use_cassette(self.path) as cassette:
+            replayed = fetch(self.base + "/WRB2526/")
+        self.assertFalse(cassette.recording)
+        self.assertEqual(len(Handler.hits), 2)
+        self.assertEqual(replayed.url, live.url)
+        self.assertEqual([r.status_code for r in replayed.history], [302])
+        self.assertEqual(replayed.content, LOGIN_PAGE)
+        self.assertEqual(replayed.headers["X-Powered-By"], "ASP.NET")
+        self.assertEqual(replayed.encoding, "utf-8")
+
+    def test_binary_body(self):
+        """Test that bodies that aren't UTF-8 survive the round trip."""
+        with use_cassette(self.path):
+            fetch(self.base + "/logo.png")
+        with use_cassette(self.path, "replay"):
+            self.assertEqual(fetch(self.base + "/logo.png").content, bytes(range(256)))
+
+    def test_replay_miss(self):
+        """Test that replay mode never reaches the network for unrecorded requests."""
+        with use_cassette(self.path):
+            fetch(self.base + "/Login.aspx")
+        with use_cassette(self.path, "replay"), self.assertRaises(CassetteMiss) as caught:
+            fetch(self.base + "/WRB2526/")
+        self.assertIsInstance(caught.exception, requests.ConnectionError)
+        self.assertEqual(Handler.hits, ["/Login.aspx"])
+
+    def test_fetch_restored(self):
+        """Test that fetch() goes back to requests.get after the block."""
+        with use_cassette(self.path):
+            self.assertIsNotNone(check_wrb2526.FETCH_SESSION)
+        self.assertIsNone(check_wrb2526.FETCH_SESSION)
+
+
+class TestCassetteReplay(unittest.TestCase):
+    """Tests for replaying hand-built cassettes of the WRB page."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "wrb.cassette")
+        cassette = Cassette(self.path, "record")
+        html = {"Content-Type": "text/html; charset=utf-8"}
+        cassette.record("GET", URL, 200, "OK", html, TEST_SCENARIOS["unavailable"]["content"].encode())
+        cassette.record("GET", URL, 302, "Found", {"Location": LOGIN_URL}, b"")
+        cassette.record("GET", LOGIN_URL, 200, "OK", html, LOGIN_PAGE)
+        cassette.save()
+
+    def test_check_page_replays_in_order(self):
+        """Test that repeated polls replay successive recordings, then the last one."""
+        states = []
+        with use_cassette(self.path, "replay"), patch('check_wrb2526.send_email'), patch('builtins.print'):
+            for mode in ("substring", "events", "events"):
+                with patch.object(check_wrb2526, "PARSE_MODE", mode):
+                    states.append(check_wrb2526.check_page().state)
+        self.assertEqual(states, [UNAVAILABLE, LIVE_LOGIN, LIVE_LOGIN])
+
+    def test_inspection_tool_fetches_once(self):
+        """Test that the inspection tool runs the bot on the response it already has."""
+        from tests.inspect_page import compare_with_bot, inspect_page
+
+        with use_cassette(self.path, "replay") as cassette, patch('builtins.print'):
+            with patch.object(cassette, "find", wraps=cassette.find) as find:
+                compare_with_bot(inspect_page())
+        self.assertEqual([c.args[1] for c in find.call_args_list], [URL])
+
+    def test_replay_loader(self):
+        """Test that replay.py classifies the final hop of every recorded fetch."""
+        rows = replay.replay([self.path], workers=1)
+        self.assertEqual([(row[0], row[1]) for row in rows],
+                         [(self.path + "#0", UNAVAILABLE), (self.path + "#2", LIVE_LOGIN)])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,102 @@
+import unittest
+from unittest.mock import patch, Mock
+import os
+import sys
+import time
+from datetime import timedelta
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_wrb2526
+from check_wrb2526 import (CheckResult, check_page, classify, classify_many, explain, URL,
+                           UNAVAILABLE, LIVE_LOGIN, LIVE_FORM)
+from tests.scenarios import TEST_SCENARIOS
+from tests.stand_ins import stream_text
+
+
+class TestCheckResult(unittest.TestCase):
+    """Tests for structured check results."""
+
+    def test_slots(self):
+        """Test that results are slotted and carry no per-instance dict."""
+        result = CheckResult(UNAVAILABLE)
+        self.assertFalse(hasattr(result, "__dict__"))
+        self.assertEqual(result.timings, {})
+        self.assertIsNone(result.elapsed)
+
+    def test_reasons(self):
+        """Test that the reason names the rule that decided the state."""
+        scenario = TEST_SCENARIOS["booking_form_preferred"]
+        self.assertEqual(explain(scenario["content"], scenario["url"]),
+                         (LIVE_FORM, "'Preferred Start' field without an older year"))
+        self.assertEqual(explain("", "https://abs.warwick.ac.uk/Login.aspx")[1], "redirected to login")
+
+    @patch('check_wrb2526.requests.get')
+    @patch('check_wrb2526.send_email')
+    def test_check_page_returns_result(self, mock_send_email, mock_get):
+        """Test that check_page reports what it found as well as acting on it."""
+        r = Mock()
+        stream_text(r, TEST_SCENARIOS["login_redirect"]["content"])
+        r.url = TEST_SCENARIOS["login_redirect"]["url"]
+        r.status_code = 200
+        r.elapsed = timedelta(milliseconds=80)
+        mock_get.return_value = r
+
+        with patch('builtins.print'):
+            result = check_page()
+
+        self.assertEqual(result.state, LIVE_LOGIN)
+        self.assertEqual(result.reason, "redirected to login")
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(len(result.hash), 32)
+        self.assertEqual(result.timings["ttfb"], 0.08)
+        self.assertGreaterEqual(result.elapsed, result.timings["classify"])
+        mock_send_email.assert_called_once()
+
+
+class TestClassifyMany(unittest.TestCase):
+    """Tests for bulk classification of recorded responses."""
+
+    def test_matches_classify(self):
+        """Test that bulk results match one-at-a-time classification."""
+        pages = [(s["content"], s["url"]) for s in TEST_SCENARIOS.values()]
+        results = classify_many(pages)
+        self.assertEqual([r.state for r in results], [classify(*page) for page in pages])
+        self.assertEqual(len({r.hash for r in results}), len(pages))
+
+    def test_response_objects(self):
+        """Test that anything with text, url and status_code can be classified."""
+        r = Mock(text=TEST_SCENARIOS["unavailable"]["content"], url=URL, status_code=503)
+        result, = classify_many([r], hash=False)
+        self.assertEqual((result.state, result.status_code, result.hash), (UNAVAILABLE, 503, None))
+
+    def test_no_side_effects(self):
+        """Test that bulk classification never prints, emails or fetches."""
+        pages = [(s["content"], s["url"]) for s in TEST_SCENARIOS.values()]
+        with patch('check_wrb2526.send_email') as mock_send_email, \
+             patch('check_wrb2526.requests.get') as mock_get, \
+             patch('builtins.print') as mock_print:
+            classify_many(pages)
+        mock_send_email.assert_not_called()
+        mock_get.assert_not_called()
+        mock_print.assert_not_called()
+
+    def test_events_mode(self):
+        """Test that bulk classification follows WRB_PARSE_MODE."""
+        page = ("<html><body><table><tr><td>Web Room Booking System 2025/26</td></tr></table></body></html>", URL)
+        with patch.object(check_wrb2526, "PARSE_MODE", "events"):
+            result, = classify_many([page])
+        self.assertEqual(result.state, "UNKNOWN")
+
+    def test_bulk_throughput(self):
+        """Test that a large corpus classifies with little per-item overhead."""
+        pages = [(s["content"], s["url"]) for s in TEST_SCENARIOS.values()] * 3000
+        started = time.perf_counter()
+        results = classify_many(pages)
+        self.assertEqual(len(results), len(pages))
+        self.assertLess(time.perf_counter() - started, 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
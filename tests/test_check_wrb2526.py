@@ -13,6 +13,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 load_dotenv()
 
 from check_wrb2526 import check_page, send_email, URL, CHECK_STRING
+from tests.stand_ins import stream_text
 
 
 class TestWRBChecker(unittest.TestCase):
@@ -65,7 +66,7 @@ class TestWRBChecker(unittest.TestCase):
         """Test when page still shows 'Application Unavailable'."""
         # Mock response with unavailable message
         mock_response = Mock()
-        mock_response.text = f"Some text {CHECK_STRING} more text"
+        stream_text(mock_response, f"Some text {CHECK_STRING} more text")
         mock_response.url = URL
         mock_get.return_value = mock_response
 
@@ -80,7 +81,7 @@ class TestWRBChecker(unittest.TestCase):
         """Test when page redirects to login (system is live)."""
         # Mock response with login redirect
         mock_response = Mock()
-        mock_response.text = "Login page content"
+        stream_text(mock_response, "Login page content")
         mock_response.url = "https://abs.warwick.ac.uk/Login.aspx?ReturnUrl=/WRB2526/"
         mock_get.return_value = mock_response
 
@@ -93,7 +94,7 @@ class TestWRBChecker(unittest.TestCase):
         """Test when ReturnUrl is in the URL (another login scenario)."""
         # Mock response with ReturnUrl in URL
         mock_response = Mock()
-        mock_response.text = "Some content"
+        stream_text(mock_response, "Some content")
         mock_response.url = "https://abs.warwick.ac.uk/some/path?ReturnUrl=/WRB2526/"
         mock_get.return_value = mock_response
 
@@ -106,7 +107,7 @@ class TestWRBChecker(unittest.TestCase):
         """Test when the booking form is detected (Web Room Booking System 2025/26)."""
         # Mock response with booking form
         mock_response = Mock()
-        mock_response.text = "Welcome to Web Room Booking System 2025/26"
+        stream_text(mock_response, "Welcome to Web Room Booking System 2025/26")
         mock_response.url = URL
         mock_get.return_value = mock_response
 
@@ -119,7 +120,7 @@ class TestWRBChecker(unittest.TestCase):
         """Test when the booking form is detected (Preferred Start text)."""
         # Mock response with booking form (no year mentioned)
         mock_response = Mock()
-        mock_response.text = "Please select your Preferred Start date"
+        stream_text(mock_response, "Please select your Preferred Start date")
         mock_response.url = URL
         mock_get.return_value = mock_response
 
@@ -132,7 +133,7 @@ class TestWRBChecker(unittest.TestCase):
         """Test when Preferred Start is found but with wrong year (2024/25)."""
         # Mock response with wrong year
         mock_response = Mock()
-        mock_response.text = "Web Room Booking System 2024/25 - Please select your Preferred Start date"
+        stream_text(mock_response, "Web Room Booking System 2024/25 - Please select your Preferred Start date")
         mock_response.url = URL
         mock_get.return_value = mock_response
 
@@ -147,7 +148,7 @@ class TestWRBChecker(unittest.TestCase):
         """Test when Preferred Start is found with correct year (2025/26)."""
         # Mock response with correct year
         mock_response = Mock()
-        mock_response.text = "Room Booking 2025/26 - Please select your Preferred Start date"
+        stream_text(mock_response, "Room Booking 2025/26 - Please select your Preferred Start date")
         mock_response.url = URL
         mock_get.return_value = mock_response
 
@@ -160,7 +161,7 @@ class TestWRBChecker(unittest.TestCase):
         """Test when page changes but doesn't match expected patterns."""
         # Mock response with unknown content
         mock_response = Mock()
-        mock_response.text = "Some completely different content"
+        stream_text(mock_response, "Some completely different content")
         mock_response.url = URL
         mock_get.return_value = mock_response
 
@@ -184,14 +185,14 @@ class TestWRBChecker(unittest.TestCase):
     def test_check_page_redirects_allowed(self, mock_send_email, mock_get):
         """Test that redirects are properly followed."""
         mock_response = Mock()
-        mock_response.text = "Login page"
+        stream_text(mock_response, "Login page")
         mock_response.url = "https://abs.warwick.ac.uk/Login.aspx"
         mock_get.return_value = mock_response
 
         check_page()
         
         # Verify requests.get was called with allow_redirects=True
-        mock_get.assert_called_once_with(URL, allow_redirects=True)
+        mock_get.assert_called_once_with(URL, allow_redirects=True, stream=True)
 
     def test_constants_defined(self):
         """Test that required constants are properly defined."""
@@ -233,7 +234,7 @@ class TestIntegration(unittest.TestCase):
         """Test complete workflow when booking becomes available."""
         # Mock HTTP response indicating booking is available
         mock_response = Mock()
-        mock_response.text = "Web Room Booking System 2025/26 - Please select your preferred dates"
+        stream_text(mock_response, "Web Room Booking System 2025/26 - Please select your preferred dates")
         mock_response.url = URL
         mock_get.return_value = mock_response
 
@@ -245,7 +246,7 @@ class TestIntegration(unittest.TestCase):
         check_page()
 
         # Verify HTTP request was made
-        mock_get.assert_called_once_with(URL, allow_redirects=True)
+        mock_get.assert_called_once_with(URL, allow_redirects=True, stream=True)
         
         # Verify email was sent with SSL on port 465
         mock_smtp_ssl.assert_called_once_with("smtp.gmail.com", 465, timeout=30)
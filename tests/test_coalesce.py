@@ -0,0 +1,168 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_wrb2526
+import coalesce
+from check_wrb2526 import STATUS_MESSAGES, LIVE_LOGIN, LIVE_FORM, UNEXPECTED_STATUS
+from coalesce import Coalescer, Mailer
+from tests.stand_ins import Clock, SinkTestCase, stream_text
+
+LIVE = STATUS_MESSAGES[LIVE_LOGIN]
+
+
+class CoalescerTestCase(SinkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = Clock()
+        self.coalescer = Coalescer(window=60, mailer=Mailer(clock=self.clock), clock=self.clock, schedule=None)
+        self.addCleanup(self.coalescer.mailer.close)
+
+    def subjects(self):
+        return [message["Subject"] for message in self.sink.messages]
+
+
+class TestCoalescer(CoalescerTestCase):
+    """Tests for batching alerts into digests."""
+
+    def test_burst_becomes_one_digest(self):
+        """Test that a burst of alerts costs one urgent email, one digest and one SMTP login."""
+        self.coalescer.send(LIVE)
+        for room in ("OC0.01", "OC0.02", "OC0.03"):
+            self.clock.now += 5
+            self.coalescer.send(f"Slot free: {room}", subject=f"WRB slot free: {room}", body=f"{room} is free")
+        self.assertEqual(self.subjects(), [check_wrb2526.ALERT_SUBJECT])     # Urgent alert wasn't held back
+
+        self.assertEqual(self.coalescer.flush_due(), 0)     # Window still open
+        self.clock.now += 45
+        self.assertEqual(self.coalescer.flush_due(), 1)
+        self.assertEqual(self.subjects()[1], "WRB slot free: OC0.01 (+2 more)")
+        digest = self.sink.messages[1].get_content()
+        self.assertTrue(digest.startswith("3 alerts:"))
+        self.assertLess(digest.index("OC0.01 is free"), digest.index("OC0.03 is free"))
+        self.assertEqual((self.sink.connections, self.sink.logins), (1, [check_wrb2526.EMAIL_USER]))
+
+    def test_first_urgent_alert_jumps_the_queue(self):
+        """Test that a go-live alert is sent at once, heading a digest of what was already waiting."""
+        self.coalescer.send(UNEXPECTED_STATUS, subject="Manual check")
+        self.clock.now += 10
+        self.assertEqual(self.sink.messages, [])
+        self.coalescer.send(STATUS_MESSAGES[LIVE_FORM])
+        self.assertEqual(self.subjects(), [f"{check_wrb2526.ALERT_SUBJECT} (+1 more)"])
+        self.assertIn("Manual check", self.sink.messages[0].get_content())
+
+        self.clock.now += 10
+        self.coalescer.send(LIVE)       # The window's second urgent alert is batched
+        self.assertEqual(len(self.sink.messages), 1)
+        self.coalescer.flush()
+        self.assertEqual(len(self.sink.messages), 2)
+
+    def test_digest_per_recipient(self):
+        """Test that each recipient gets their own digest."""
+        for to in ("a@example.com", "b@example.com", "a@example.com"):
+            self.coalescer.send("Activity detected", subject="Activity", to=to)
+        self.coalescer.flush()
+        self.assertEqual(sorted(rcpts for _, rcpts in self.sink.envelopes),
+                         [["a@example.com"], ["b@example.com"]])
+        self.assertEqual(self.sink.connections, 1)
+
+    def test_new_window_after_expiry(self):
+        """Test that an alert after the window has closed starts a new one, flushing the old."""
+        self.coalescer.send("first", subject="first")
+        self.clock.now += 61
+        self.coalescer.send("second", subject="second")
+        self.assertEqual(self.subjects(), ["first"])
+        self.coalescer.flush()
+        self.assertEqual(self.subjects(), ["first", "second"])
+
+    def test_zero_window_sends_each_alert(self):
+        """Test that a zero window sends every alert as it is raised, still on one session."""
+        self.coalescer.window = 0
+        for n in range(3):
+            self.coalescer.send(f"alert {n}", subject=f"alert {n}")
+        self.assertEqual(self.subjects(), ["alert 0", "alert 1", "alert 2"])
+        self.assertEqual(self.sink.connections, 1)
+
+    def test_failed_digest_kept(self):
+        """Test that a digest the server refused goes out with the next one instead of being lost."""
+        self.coalescer.send("first", subject="first")
+        self.sink.failures["DATA"] = "451 4.3.0 Try again later"
+        self.clock.now += 60
+        with self.assertRaises(coalesce.smtplib.SMTPException):
+            self.coalescer.flush_due()
+        del self.sink.failures["DATA"]
+        self.coalescer.send("second", subject="second")
+        self.coalescer.flush()
+        self.assertEqual(self.subjects(), ["first (+1 more)"])
+
+
+class TestMailer(CoalescerTestCase):
+    """Tests for SMTP session reuse."""
+
+    def test_idle_session_reconnects(self):
+        """Test that a session idle past the limit is replaced rather than reused."""
+        self.coalescer.window = 0
+        self.coalescer.send("one")
+        self.clock.now += coalesce.SMTP_IDLE + 1
+        self.coalescer.send("two")
+        self.assertEqual((self.sink.connections, self.coalescer.mailer.sessions), (2, 2))
+
+    def test_dropped_session_reconnects(self):
+        """Test that a session the server dropped is reopened once, transparently."""
+        self.coalescer.window = 0
+        self.coalescer.send("one")
+        self.coalescer.mailer._server.close()     # As smtplib does when the server hangs up
+        self.coalescer.send("two")
+        self.assertEqual(len(self.sink.messages), 2)
+        self.assertEqual(self.coalescer.mailer.sessions, 2)
+
+
+class TestTimersAndWiring(SinkTestCase):
+    """Tests for windows closing on their own, and check_page() using the shared Coalescer."""
+
+    def test_timer_closes_window(self):
+        """Test that a digest goes out when its window ends, without anyone flushing."""
+        with Coalescer(window=0.2) as coalescer:
+            coalescer.send("a", subject="a")
+            coalescer.send("b", subject="b")
+            deadline = time.monotonic() + 5
+            while not self.sink.messages and time.monotonic() < deadline:
+                time.sleep(0.02)
+            self.assertEqual([m["Subject"] for m in self.sink.messages], ["a (+1 more)"])
+
+    def test_timer_survives_failed_send(self):
+        """Test that a timer whose digest fails logs it and retries when the next window closes."""
+        self.sink.failures["MAIL"] = "421 4.7.0 Try again later"
+        with Coalescer(window=0.1) as coalescer:
+            coalescer.send("a", subject="a")
+            deadline = time.monotonic() + 5
+            while not self.print.call_args_list and time.monotonic() < deadline:
+                time.sleep(0.02)
+            self.assertIn("keeping it for the next window", self.print.call_args[0][0])
+            del self.sink.failures["MAIL"]
+            while not self.sink.messages and time.monotonic() < deadline:
+                time.sleep(0.02)
+        self.assertEqual([m["Subject"] for m in self.sink.messages], ["a"])
+
+    def test_check_page_uses_coalescer(self):
+        """Test that go-live alerts from check_page() go through the shared Coalescer when enabled."""
+        coalescer = Coalescer(window=60, schedule=None)
+        self.addCleanup(coalescer.close)
+        with patch.object(check_wrb2526, "COALESCE_WINDOW", 60), patch.object(coalesce, "_coalescer", coalescer), \
+             patch('check_wrb2526.fetch') as fetch:
+            stream_text(fetch.return_value, "Web Room Booking System 2025/26")
+            fetch.return_value.url = check_wrb2526.URL
+            check_wrb2526.check_page()
+            check_wrb2526.check_page()
+        self.assertEqual(len(self.sink.messages), 1)    # Second alert waits for the digest
+        self.assertEqual(coalescer.raised, 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
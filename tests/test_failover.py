@@ -0,0 +1,169 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+import time
+from email.mime.text import MIMEText
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_wrb2526
+import failover
+from check_wrb2526 import send_email
+from coalesce import Coalescer
+from failover import FailoverError, HedgedSender, SMTPAccount, parse_accounts, smtp_accounts
+from notifiers import HIGH
+from ratelimit import RateLimiter
+from tests.stand_ins import SMTPSink
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+
+class FailoverTestCase(unittest.TestCase):
+    """A primary and a backup SMTP sink; tests set their faults before sending."""
+
+    primary_options = {}
+    backup_options = {}
+
+    def setUp(self):
+        self.primary = SMTPSink(**self.primary_options).start()
+        self.backup = SMTPSink(**self.backup_options).start()
+        self.addCleanup(self.primary.stop)
+        self.addCleanup(self.backup.stop)
+        quiet = patch('builtins.print')
+        quiet.start()
+        self.addCleanup(quiet.stop)
+        self.accounts = [SMTPAccount(self.primary.host, self.primary.port, "bot@example.com", "pw", False),
+                         SMTPAccount(self.backup.host, self.backup.port, "backup@example.org", "pw", False)]
+
+    def message(self, text="Redirected to login (system live)"):
+        msg = MIMEText(text)
+        msg["Subject"] = check_wrb2526.ALERT_SUBJECT
+        msg["From"] = "bot@example.com"
+        msg["To"] = "alerts@example.com"
+        return msg
+
+    def send(self, hedge_delay=0.1, msg=None, priority=None):
+        sender = HedgedSender(self.accounts, hedge_delay=hedge_delay, timeout=5)
+        started = time.perf_counter()
+        account = sender.send(msg or self.message(), priority)
+        return account, time.perf_counter() - started
+
+
+class TestHedging(FailoverTestCase):
+    """Tests for racing the backup against a slow or failing primary."""
+
+    def test_healthy_primary(self):
+        """Test that a healthy primary delivers on its own, without waking the backup."""
+        account, _ = self.send(hedge_delay=1.0)
+        self.assertIs(account, self.accounts[0])
+        self.assertEqual(len(self.primary.messages), 1)
+        self.assertEqual(self.backup.connections, 0)
+
+    def test_slow_primary_hedged(self):
+        """Test that a stalled primary costs only the hedging delay, and then sends nothing itself."""
+        self.primary.delays["CONNECT"] = 0.4
+        account, elapsed = self.send()
+        self.assertIs(account, self.accounts[1])
+        self.assertLess(elapsed, 0.3)
+        message, = self.backup.messages
+        self.assertEqual(message["From"], "backup@example.org")
+        wait_for(lambda: self.primary.logins)
+        time.sleep(0.1)
+        self.assertEqual(self.primary.messages, [])     # Lost the race before sending
+
+    def test_rejected_login_fails_over_at_once(self):
+        """Test that an outright failure starts the backup without waiting out the delay."""
+        self.primary.failures["AUTH"] = "535 5.7.8 Username and Password not accepted"
+        account, elapsed = self.send(hedge_delay=5.0)
+        self.assertIs(account, self.accounts[1])
+        self.assertLess(elapsed, 1.0)
+
+    def test_all_fail(self):
+        """Test that the send raises an SMTP error naming every account's failure."""
+        self.primary.failures["CONNECT"] = "421 4.3.2 Service not available"
+        self.backup.failures["DATA"] = "451 4.3.0 Try again later"
+        with self.assertRaises(FailoverError) as caught:
+            self.send()
+        self.assertEqual(set(caught.exception.errors), {a.name for a in self.accounts})
+        self.assertIsInstance(caught.exception, check_wrb2526.smtplib.SMTPException)
+
+
+class TestDuplicates(FailoverTestCase):
+    """Tests for Message-ID duplicate suppression."""
+
+    def test_both_copies_share_message_id(self):
+        """Test that when both providers deliver, the copies carry the same Message-ID."""
+        self.primary.delays["DATA"] = 0.3       # Degraded mid-send
+        account, elapsed = self.send()
+        self.assertIs(account, self.accounts[1])
+        self.assertLess(elapsed, 0.25)
+        wait_for(lambda: self.primary.messages)
+        self.assertEqual(self.primary.messages[0]["Message-ID"], self.backup.messages[0]["Message-ID"])
+
+    def test_redelivery_suppressed(self):
+        """Test that a message already delivered is not sent again."""
+        sender = HedgedSender(self.accounts, hedge_delay=1.0)
+        msg = self.message()
+        self.assertIsNotNone(sender.send(msg))
+        self.assertIsNone(sender.send(msg))
+        self.assertEqual(len(self.primary.messages), 1)
+
+
+class TestSendEmailFailover(FailoverTestCase):
+    """Tests for send_email() with backup accounts configured."""
+
+    def test_send_email_survives_primary_outage(self):
+        """Test that the alert still goes out when the primary provider is down."""
+        self.primary.failures["CONNECT"] = "421 4.3.2 Service not available"
+        with patch.multiple(check_wrb2526, SMTP_SERVER=self.primary.host, SMTP_PORT=self.primary.port,
+                            SMTP_USE_SSL=False,
+                            SMTP_ACCOUNTS=f"backup@example.org:p:w@127.0.0.1:{self.backup.port}"), \
+             patch.object(failover, "_sender", None):
+            send_email("Redirected to login (system live)")
+        message, = self.backup.messages
+        self.assertIn("(status: Redirected to login", message.get_content())
+        self.assertEqual(self.backup.logins, ["backup@example.org"])
+
+    def test_limits_charged_to_sending_account(self):
+        """Test that a rate-limited send is charged to the backup that delivered it, not the primary."""
+        self.primary.failures["CONNECT"] = "421 4.3.2 Service not available"
+        with tempfile.TemporaryDirectory() as tmp, \
+             RateLimiter(os.path.join(tmp, "limits.sqlite3")) as limiter, \
+             patch.multiple(check_wrb2526, RATE_LIMIT_DB=limiter.path, _rate_limiter=limiter):
+            account, _ = self.send(priority=HIGH)
+            usage = {a.user: limiter.usage(a.user)["sent"] for a in self.accounts}
+        self.assertIs(account, self.accounts[1])
+        self.assertEqual(usage, {"bot@example.com": 0, "backup@example.org": 1})
+
+    def test_coalesced_digest_fails_over(self):
+        """Test that the Coalescer's mailer uses the backup accounts too."""
+        self.primary.failures["CONNECT"] = "421 4.3.2 Service not available"
+        with patch.multiple(check_wrb2526, SMTP_SERVER=self.primary.host, SMTP_PORT=self.primary.port,
+                            SMTP_USE_SSL=False,
+                            SMTP_ACCOUNTS=f"backup@example.org:pw@127.0.0.1:{self.backup.port}"), \
+             patch.object(failover, "_sender", None), \
+             Coalescer(window=0, schedule=None) as coalescer:
+            coalescer.send("Redirected to login (system live)", to="alerts@example.com")
+        message, = self.backup.messages
+        self.assertEqual(message["To"], "alerts@example.com")
+
+    def test_accounts_from_settings(self):
+        """Test the primary from the usual settings, then parsed backups."""
+        with patch.object(check_wrb2526, "SMTP_ACCOUNTS", "b@x.org:app pass@smtp.x.org:587,c@y.org:pw@smtp.y.org"):
+            primary, second, third = smtp_accounts()
+        self.assertEqual((primary.host, primary.user), (check_wrb2526.SMTP_SERVER, check_wrb2526.EMAIL_USER))
+        self.assertEqual((second.port, second.password, second.use_ssl), (587, "app pass", False))
+        self.assertEqual((third.port, third.use_ssl), (465, True))
+        with self.assertRaises(ValueError):
+            parse_accounts("no-host")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,133 @@
+import unittest
+from unittest.mock import Mock
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from session_pool import login
+from formstate import FormParser, FormStateCache, hidden_fields, rejected, stream_hidden_fields
+from tests.stand_ins import WRBStandIn, FORM_PAGE
+
+
+def streamed(html, chunk=16):
+    """Build a mock streamed response that records how much was read."""
+    data = html.encode()
+    r = Mock()
+    r.encoding = "utf-8"
+    r.headers = {}
+    r.read = 0
+
+    def iter_content(size):
+        for i in range(0, len(data), chunk):
+            r.read = i + chunk
+            yield data[i:i + chunk]
+
+    r.iter_content = iter_content
+    return r
+
+
+class TestFormParser(unittest.TestCase):
+    """Tests for the streaming WebForms parser."""
+
+    def setUp(self):
+        self.page = FORM_PAGE.format(viewstate="vs", validation="ev", message="")
+
+    def test_incremental_feed(self):
+        """Test that tokens split across chunks are still found."""
+        parser = FormParser()
+        for i in range(0, len(self.page), 7):
+            parser.feed(self.page[i:i + 7])
+        self.assertEqual(parser.hidden()["__VIEWSTATE"], "vs")
+        self.assertEqual(parser.hidden()["__EVENTVALIDATION"], "ev")
+
+    def test_hidden_fields_after_tokens(self):
+        """Test that hidden inputs further down the form than the ASP.NET tokens are kept."""
+        self.assertEqual(hidden_fields(self.page)["ctl00$Main$hidTerm"], "1")
+        self.assertEqual(stream_hidden_fields(streamed(self.page))["ctl00$Main$hidTerm"], "1")
+
+    def test_stream_stops_early(self):
+        """Test that streaming stops once the form state has been read."""
+        padded = self.page.replace("</body>", "<p>" + "x" * 100_000 + "</p></body>")
+        r = streamed(padded)
+        fields = stream_hidden_fields(r)
+        self.assertEqual(fields["__VIEWSTATE"], "vs")
+        self.assertLess(r.read, len(padded) // 10)
+        r.close.assert_called_once()
+
+    def test_no_form(self):
+        """Test that a page without a form has no state."""
+        self.assertEqual(hidden_fields("<html><body>Application Unavailable</body></html>"), {})
+
+    def test_only_state_errors_rejected(self):
+        """Test that a MAC or validation error means stale state, but a bare 5xx doesn't."""
+        self.assertTrue(rejected(Mock(status_code=500, text="Validation of viewstate MAC failed.")))
+        self.assertTrue(rejected(Mock(status_code=200, text="Invalid postback or callback argument.")))
+        self.assertFalse(rejected(Mock(status_code=503, text="Service Unavailable")))
+        self.assertFalse(rejected(Mock(status_code=500, text="Runtime Error")))
+
+
+class TestFormStateCache(unittest.TestCase):
+    """Tests for reusing form state against the local stand-in."""
+
+    def setUp(self):
+        self.wrb = WRBStandIn(live=True).start()
+        self.addCleanup(self.wrb.stop)
+        self.session = requests.Session()
+        login(self.session, self.wrb.url, "officer", "secret")
+
+    def test_one_round_trip_per_action(self):
+        """Test that consecutive posts reuse response tokens instead of GETting first."""
+        cache = FormStateCache(self.session)
+        cache.fetch(self.wrb.url)
+        gets = self.wrb.count("GET", "/WRB2526/")
+
+        for room in ("OC0.01", "OC0.02", "OC0.03"):
+            r = cache.post(self.wrb.url, {"ctl00$Main$txtRoom": room})
+            self.assertEqual(r.status_code, 200)
+
+        self.assertEqual(self.wrb.count("GET", "/WRB2526/"), gets)
+        self.assertEqual(self.wrb.count("POST", "/WRB2526/"), 3)
+        self.assertEqual(len(self.wrb.bookings), 3)
+
+    def test_rejected_state_refetched(self):
+        """Test that tokens the server refuses are refreshed and the post retried."""
+        self.wrb.single_use_tokens = True
+        cache = FormStateCache(self.session)
+        html = self.session.get(self.wrb.url).text
+        cache.update(self.wrb.url, html)
+        self.session.post(self.wrb.url, data=hidden_fields(html))     # Burn the tokens
+
+        r = cache.post(self.wrb.url, {"ctl00$Main$txtRoom": "OC0.01"})
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(cache.stats["rejected"], 1)
+        self.assertEqual(len(self.wrb.bookings), 2)
+
+    def test_get_hits_cache_while_fresh(self):
+        """Test that fresh entries are served without a request."""
+        cache = FormStateCache(self.session, max_age=60)
+        cache.fetch(self.wrb.url)
+        gets = self.wrb.count("GET", "/WRB2526/")
+        cache.get(self.wrb.url)
+        self.assertEqual(self.wrb.count("GET", "/WRB2526/"), gets)
+        self.assertEqual(cache.stats["hits"], 1)
+
+    def test_background_refresh(self):
+        """Test that entries near expiry are re-fetched in the background."""
+        cache = FormStateCache(self.session, max_age=0.2, refresh_ahead=0.5)
+        first = cache.fetch(self.wrb.url)["__VIEWSTATE"]
+        cache.start(interval=0.02)
+        self.addCleanup(cache.stop)
+        time.sleep(0.3)
+        self.assertGreaterEqual(cache.stats["refreshed"], 1)
+        self.assertNotEqual(cache.peek(self.wrb.url)["__VIEWSTATE"], first)
+        self.assertLess(cache.age(self.wrb.url), 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,112 @@
+import unittest
+from unittest.mock import patch
+import os
+import smtplib
+import sys
+from urllib.parse import urlparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_wrb2526
+from check_wrb2526 import URL, check_page, send_email
+from tests.stand_ins import SinkTestCase, SMTPSink, WRBStandIn
+from tests.scenarios import TEST_SCENARIOS
+
+
+class TestScenariosHermetic(SinkTestCase):
+    """Every scenario from scenarios.py, served over HTTP and mailed over SMTP, all locally."""
+
+    def setUp(self):
+        super().setUp()
+        self.site = WRBStandIn().start()
+        self.addCleanup(self.site.stop)
+        target = patch.object(check_wrb2526, "URL", self.site.url)
+        target.start()
+        self.addCleanup(target.stop)
+
+    def stage(self, scenario):
+        """Serve the scenario's page at the URL the bot ends up on."""
+        self.site.pages.clear()
+        if scenario["url"] == URL:
+            self.site.serve("/WRB2526/", scenario["content"])
+            return
+        final = urlparse(scenario["url"])
+        self.site.serve("/WRB2526/", status=302, location=f"{final.path}?{final.query}")
+        self.site.serve(final.path, scenario["content"])
+
+    def test_scenarios(self):
+        """Test that each scenario prints or emails exactly what it expects."""
+        for mode in ("substring", "events"):
+            for key, scenario in TEST_SCENARIOS.items():
+                with self.subTest(mode=mode, scenario=key), patch.object(check_wrb2526, "PARSE_MODE", mode):
+                    self.stage(scenario)
+                    self.sink.messages.clear()
+                    self.print.reset_mock()
+                    check_page()
+
+                    if scenario["expected_action"] == "print":
+                        self.assertEqual(self.sink.messages, [])
+                        self.print.assert_any_call(scenario["expected_message"])
+                        continue
+                    message, = self.sink.messages
+                    self.assertEqual(message["Subject"], "Warwick WRB 25/26 is LIVE!")
+                    self.assertIn(f"(status: {scenario['expected_message']})", message.get_content())
+
+    def test_login_redirect_followed(self):
+        """Test that the stand-in's own login redirect is detected as the system going live."""
+        self.site.live = True
+        check_page()
+        self.assertEqual(self.site.count("GET", "/Login.aspx"), 1)
+        self.assertIn("Redirected to login", self.sink.messages[0].get_content())
+
+
+class TestSendEmail(SinkTestCase):
+    """Tests for send_email() against a real SMTP conversation."""
+
+    def test_message(self):
+        """Test the envelope, headers and body that go out."""
+        send_email("Booking form detected")
+        message, = self.sink.messages
+        self.assertEqual(self.sink.logins, [check_wrb2526.EMAIL_USER])
+        self.assertEqual(self.sink.envelopes, [(check_wrb2526.EMAIL_USER, [check_wrb2526.TO_EMAIL])])
+        self.assertEqual(message["From"], check_wrb2526.EMAIL_USER)
+        self.assertEqual(message["To"], check_wrb2526.TO_EMAIL)
+        self.assertEqual(message.get_content_type(), "text/plain")
+        self.assertIn("(status: Booking form detected)", message.get_content())
+        self.assertIn(URL, message.get_content())
+
+    def test_custom_subject_and_body(self):
+        """Test that callers can replace the subject and body."""
+        send_email("Activity detected", subject="WRB: upstream activity", body="Latency up 4x\n")
+        message, = self.sink.messages
+        self.assertEqual(message["Subject"], "WRB: upstream activity")
+        self.assertEqual(message.get_content(), "Latency up 4x\n")
+
+    def test_non_ascii_body(self):
+        """Test that non-ASCII text survives encoding."""
+        send_email("x", body="Réservation ouverte ✅")
+        self.assertEqual(self.sink.messages[0].get_content().strip(), "Réservation ouverte ✅")
+
+
+class TestSendEmailRejected(SinkTestCase):
+    """Tests for SMTP failures surfacing from send_email()."""
+
+    sink_options = {"users": {"someone-else@example.com": "x"}, "reject": {"nobody@example.com"}}
+
+    def test_bad_credentials(self):
+        """Test that an authentication failure is raised, with nothing delivered."""
+        with self.assertRaises(smtplib.SMTPAuthenticationError):
+            send_email("x")
+        self.assertEqual(self.sink.messages, [])
+
+    def test_rejected_recipient(self):
+        """Test that a refused recipient raises an SMTP error."""
+        with patch.multiple(check_wrb2526, EMAIL_USER="someone-else@example.com", EMAIL_PASS="x",
+                            TO_EMAIL="nobody@example.com"), \
+             self.assertRaises(smtplib.SMTPRecipientsRefused):
+            send_email("x")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,138 @@
+import unittest
+from unittest.mock import patch, Mock
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from datetime import timedelta
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_wrb2526
+from history import PollHistory, main, parse_time, bucket_start
+from tests.stand_ins import stream_text
+
+URL = "https://abs.warwick.ac.uk/WRB2526/"
+DAY = 86400
+
+
+class TestPollHistory(unittest.TestCase):
+    """Tests for the SQLite poll history."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "history.sqlite3")
+        self.history = PollHistory(self.path, batch_size=10, flush_interval=3600)
+        self.addCleanup(self.history.close)
+
+    def test_writes_are_batched(self):
+        """Test that polls are buffered until the batch fills."""
+        for i in range(9):
+            self.history.record(URL, "UNAVAILABLE", status=200, elapsed=0.1, ts=i)
+        self.assertEqual(self.history.polls(), [])
+        self.history.record(URL, "UNAVAILABLE", status=200, elapsed=0.1, ts=9)
+        self.assertEqual(len(self.history.polls()), 10)
+
+    def test_rollups_match_raw_polls(self):
+        """Test that incrementally maintained rollups agree with the raw rows."""
+        for i in range(95):
+            state = "LIVE_FORM" if i >= 80 else "UNAVAILABLE"
+            self.history.record(URL, state, status=500 if i % 30 == 0 else 200,
+                                elapsed=i / 100, ts=i * 600)
+        self.history.flush()
+
+        hours = self.history.rollups("hour")
+        self.assertEqual(len(hours), 95 * 600 // 3600 + 1)
+        self.assertEqual(sum(row["polls"] for row in hours), 95)
+        day, = self.history.rollups("day", since=DAY / 2, until=DAY)     # Bucket `since` falls in
+        self.assertEqual(day["polls"], 95)
+        self.assertEqual(day["live"], 15)
+        self.assertEqual(day["errors"], 4)
+        self.assertAlmostEqual(day["elapsed_max"], 0.94)
+
+    def test_transitions_record_go_live(self):
+        """Test that state changes are recorded and first_seen finds them."""
+        states = ["UNAVAILABLE"] * 5 + ["LIVE_LOGIN"] * 3 + ["UNAVAILABLE", "LIVE_LOGIN"]
+        for i, state in enumerate(states):
+            self.history.record(URL, state, ts=i * 60)
+        self.history.flush()
+
+        changes = [(row["ts"], row["old_state"], row["new_state"]) for row in self.history.transitions()]
+        self.assertEqual(changes, [(0, None, "UNAVAILABLE"), (300, "UNAVAILABLE", "LIVE_LOGIN"),
+                                   (480, "LIVE_LOGIN", "UNAVAILABLE"), (540, "UNAVAILABLE", "LIVE_LOGIN")])
+        self.assertEqual(self.history.first_seen("LIVE_LOGIN")["ts"], 300)
+        self.assertIsNone(self.history.first_seen("LIVE_FORM"))
+
+    def test_state_carried_across_restarts(self):
+        """Test that a reopened database doesn't report a spurious transition."""
+        self.history.record(URL, "UNAVAILABLE", ts=0)
+        self.history.close()
+        with PollHistory(self.path) as reopened:
+            reopened.record(URL, "UNAVAILABLE", ts=60)
+            reopened.flush()
+            self.assertEqual(len(reopened.transitions()), 1)
+            self.assertEqual(reopened.rollups("day")[0]["polls"], 2)
+        self.history = PollHistory(self.path)
+
+    def test_time_range_uses_index(self):
+        """Test that a time range over every target is answered from an index, not a table scan."""
+        plan = self.history.db.execute("EXPLAIN QUERY PLAN SELECT * FROM polls WHERE ts >= ? ORDER BY ts DESC",
+                                       (0,)).fetchall()
+        self.assertIn("polls_ts", " ".join(row[-1] for row in plan))
+
+    def test_cli(self):
+        """Test the query command line."""
+        self.history.record(URL, "UNAVAILABLE", status=200, elapsed=0.2, ts=0)
+        self.history.record(URL, "LIVE_FORM", status=200, elapsed=0.4, ts=3600)
+        self.history.flush()
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            main(["--db", self.path, "first", "LIVE_FORM"])
+            main(["--db", self.path, "summary"])
+        self.assertEqual(out.getvalue().splitlines()[0], "1970-01-01 01:00:00")
+        self.assertIn("2 polls, 1 live, 0 errors, avg 0.300s", out.getvalue())
+
+    def test_parse_time(self):
+        """Test absolute and relative times."""
+        self.assertEqual(parse_time("1970-01-02"), DAY)
+        self.assertEqual(parse_time("36h", now=2 * DAY), DAY / 2)
+        self.assertEqual(bucket_start(DAY + 5000, "hour"), DAY + 3600)
+
+
+class TestCheckPageHistory(unittest.TestCase):
+    """Tests for recording check_page polls."""
+
+    @patch('check_wrb2526.requests.get')
+    @patch('check_wrb2526.send_email')
+    def test_poll_recorded(self, mock_send_email, mock_get):
+        """Test that check_page records each poll when WRB_HISTORY_DB is set."""
+        r = Mock()
+        stream_text(r, "<html><body><h1>Application Unavailable</h1></body></html>")
+        r.content = r.text.encode()
+        r.url = URL
+        r.status_code = 200
+        r.elapsed = timedelta(milliseconds=120)
+        mock_get.return_value = r
+
+        with tempfile.TemporaryDirectory() as tmp:
+            history = PollHistory(os.path.join(tmp, "h.sqlite3"))
+            with patch.object(check_wrb2526, "HISTORY_DB", "unused"), \
+                 patch.object(check_wrb2526, "_history", history), \
+                 patch('builtins.print'):
+                check_wrb2526.check_page()
+            history.flush()
+            poll, = history.polls()
+            history.close()
+
+        self.assertEqual(poll["state"], "UNAVAILABLE")
+        self.assertEqual(poll["status"], 200)
+        self.assertEqual(poll["ttfb"], 0.12)
+        self.assertEqual(len(poll["hash"]), 32)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
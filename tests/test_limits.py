@@ -0,0 +1,157 @@
+import unittest
+from unittest.mock import patch
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_wrb2526
+from check_wrb2526 import URL, UNKNOWN, explain_page
+from page_events import CHUNK_SIZE
+from tests.scenarios import TEST_SCENARIOS
+
+# Fragments that nearly match a marker, so every substring search has to keep looking
+NEAR_MISSES = ["2025/2", "2024/2", "Application Unavailabl", "Preferred Star", "Login.asp",
+               "Web Room Booking System 2025/", "BannerTitl"]
+TAG_SOUP = ["<b>", "</b>", "<span class='BannerTitle'>", "</span>", "<h1>", "</h1>", "<title>", "</title>",
+            "<form>", "<input name=x>", "x", " ", "\n", "&amp;", "&#", "&", "<", "<!", "<?", "<!--", "-->",
+            "<a href='", "'>", "<script>", "</script>"]
+# Every marker at once, to put beyond the size limit
+ALL_MARKERS = ("<h1>Application Unavailable</h1><h1>Web Room Booking System 2024/25</h1>"
+               "<form>Preferred Start</form>")
+
+# Per-byte budget for classification, well above the parser's worst case
+SECONDS_PER_MB = 4.0
+
+
+def fill(rng, size, parts):
+    out, n = [], 0
+    while n < size:
+        part = rng.choice(parts)
+        out.append(part)
+        n += len(part)
+    return "".join(out)
+
+
+GENERATORS = {
+    "near_misses": lambda rng, n: fill(rng, n, [p + " " for p in NEAR_MISSES]),
+    "unclosed_comment": lambda rng, n: "<!--" + fill(rng, n, [p + " " for p in NEAR_MISSES]),
+    "unclosed_tag": lambda rng, n: '<div class="' + fill(rng, n, [p + " " for p in NEAR_MISSES]),
+    "tag_soup": lambda rng, n: fill(rng, n, TAG_SOUP),
+    "nested_banners": lambda rng, n: "<span class='BannerTitle'>" * (n // 26),
+    "tiny_form_events": lambda rng, n: "<form>" + "<b>x</b>" * (n // 8),
+    "title_entities": lambda rng, n: "<title>" + "&amp;x" * (n // 6),
+    "random_bytes": lambda rng, n: rng.randbytes(n).decode("latin-1"),
+}
+
+
+class EndlessResponse:
+    """A streamed response whose body repeats ``block`` for ``size`` bytes, generated lazily."""
+
+    def __init__(self, block: bytes, size: int):
+        self.block = block
+        self.size = size
+        self.served = 0
+        self.closed = False
+        self.url = URL
+        self.status_code = 200
+        self.encoding = "utf-8"
+        self.headers = {}
+        self.elapsed = timedelta(milliseconds=50)
+
+    def iter_content(self, chunk_size=1):
+        while self.served < self.size:
+            start = self.served % len(self.block)
+            chunk = self.block[start:start + chunk_size]
+            self.served += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+class TestPathologicalInputs(unittest.TestCase):
+    """Fuzz tests: classification time and memory stay bounded whatever the page."""
+
+    def setUp(self):
+        # The bounds scale with the limit, so a smaller one keeps the suite quick
+        self.limit = 128 * 1024
+        self.budget = SECONDS_PER_MB * self.limit / 1e6
+        limit = patch.object(check_wrb2526, "MAX_BODY_BYTES", self.limit)
+        limit.start()
+        self.addCleanup(limit.stop)
+
+    def test_random_pages_bounded(self):
+        """Test that random adversarial pages up to 4x the limit classify within budget."""
+        rng = random.Random(2526)
+        for mode in ("substring", "events"):
+            for name, generate in GENERATORS.items():
+                page = generate(rng, rng.randint(self.limit // 4, 4 * self.limit))
+                with self.subTest(mode=mode, generator=name), patch.object(check_wrb2526, "PARSE_MODE", mode):
+                    (state, _reason), elapsed = timed(explain_page, page, URL)
+                    self.assertEqual(state, UNKNOWN)
+                    self.assertLess(elapsed, self.budget)
+
+    @unittest.skipUnless(os.getenv("WRB_BENCHMARKS") == "1", "timing ratio benchmark; set WRB_BENCHMARKS=1")
+    def test_matching_is_linear(self):
+        """Test that four times the input takes about four times as long, not sixteen."""
+        rng = random.Random(7)
+        with patch.object(check_wrb2526, "MAX_BODY_BYTES", 10 ** 9), patch.object(check_wrb2526, "PARSE_MODE", "events"):
+            for name in ("tag_soup", "tiny_form_events", "unclosed_comment"):
+                small, large = (GENERATORS[name](rng, size) for size in (32 * 1024, 128 * 1024))
+                with self.subTest(generator=name):
+                    small_time = min(timed(explain_page, small, URL)[1] for _ in range(3))
+                    large_time = min(timed(explain_page, large, URL)[1] for _ in range(3))
+                    self.assertLess(large_time, 8 * small_time + 0.01)
+
+    def test_streamed_body_truncated(self):
+        """Test that a 256 MB stream is read only up to the limit, in bounded time and memory."""
+        rng = random.Random(11)
+        cases = [(mode, name) for mode in ("substring", "events")
+                 for name in ("tag_soup", "unclosed_comment", "unclosed_tag", "random_bytes")]
+        for mode, name in cases:
+            block = GENERATORS[name](rng, 64 * 1024).encode("utf-8", errors="replace")
+            r = EndlessResponse(block, 256 * 1024 * 1024)
+            with self.subTest(mode=mode, generator=name), patch.object(check_wrb2526, "PARSE_MODE", mode), \
+                 patch('check_wrb2526.requests.get', return_value=r), \
+                 patch('check_wrb2526.send_email'), patch('builtins.print'):
+                tracemalloc.start()
+                try:
+                    result, elapsed = timed(check_wrb2526.check_page)
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                self.assertEqual(result.state, UNKNOWN)
+                self.assertLessEqual(r.served, self.limit + CHUNK_SIZE)
+                self.assertTrue(r.closed)
+                self.assertLess(elapsed, 2 * self.budget)       # tracemalloc slows allocation down
+                # HTMLParser's start-tag regex needs ~45 bytes a character on one huge unclosed tag
+                self.assertLess(peak, 64 * self.limit)
+
+    def test_nothing_past_the_limit_counts(self):
+        """Test that markers beyond the limit never change a page's classification."""
+        rng = random.Random(3)
+        limit = 16 * 1024
+        with patch.object(check_wrb2526, "MAX_BODY_BYTES", limit):
+            for mode in ("substring", "events"):
+                for key, scenario in TEST_SCENARIOS.items():
+                    content, url = scenario["content"], scenario["url"]
+                    padding = GENERATORS["near_misses"](rng, limit)[:limit - len(content)]
+                    with self.subTest(mode=mode, scenario=key), patch.object(check_wrb2526, "PARSE_MODE", mode):
+                        self.assertEqual(explain_page(content + padding + ALL_MARKERS, url)[0],
+                                         explain_page(content, url)[0])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,183 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+import check_wrb2526
+from check_wrb2526 import STATUS_MESSAGES, LIVE_LOGIN, UNEXPECTED_STATUS
+from tests.stand_ins import PushStandIn, SMTPSink, WRBStandIn
+
+if httpx is not None:
+    from notifiers import (Alert, ChatNotifier, Dispatcher, EmailNotifier, GotifyNotifier, NotificationError,
+                           NtfyNotifier, WebhookNotifier, HIGH, DEFAULT, notify_async, notify_channels,
+                           notify_channels_async, parse_channels)
+
+LIVE = STATUS_MESSAGES[LIVE_LOGIN]
+
+
+@unittest.skipIf(httpx is None, "httpx not installed")
+class TestChannels(unittest.TestCase):
+    """Tests for what each channel sends."""
+
+    def setUp(self):
+        self.server = PushStandIn().start()
+        self.addCleanup(self.server.stop)
+
+    def send(self, channel, status=LIVE):
+        deliveries = asyncio.run(notify_async(Alert(status), [channel]))
+        self.assertTrue(deliveries[0].ok, deliveries[0].error)
+        method, path, headers, body = self.server.received[0]
+        return path, headers, body
+
+    def test_webhook(self):
+        """Test that webhooks get the whole alert as JSON."""
+        _, headers, body = self.send(WebhookNotifier(self.server.url("/hook"), headers={"X-Secret": "s"}))
+        payload = json.loads(body)
+        self.assertEqual((payload["status"], payload["priority"]), (LIVE, HIGH))
+        self.assertEqual(headers["X-Secret"], "s")
+
+    def test_ntfy(self):
+        """Test ntfy's header-based message format."""
+        path, headers, body = self.send(NtfyNotifier(self.server.url("/wrb-alerts"), token="tk"))
+        self.assertEqual(path, "/wrb-alerts")
+        self.assertEqual((headers["Title"], headers["Priority"]), (check_wrb2526.ALERT_SUBJECT, "5"))
+        self.assertEqual(headers["Authorization"], "Bearer tk")
+        self.assertIn(LIVE, body.decode())
+
+    def test_gotify(self):
+        """Test Gotify's JSON message and doubled priority scale."""
+        path, headers, body = self.send(GotifyNotifier(self.server.url("/"), "app-token"), UNEXPECTED_STATUS)
+        self.assertEqual(path, "/message")
+        self.assertEqual(headers["X-Gotify-Key"], "app-token")
+        self.assertEqual(json.loads(body)["priority"], 2 * DEFAULT)
+
+    def test_chat_styles(self):
+        """Test that Slack and Discord get their own field, markup and mention."""
+        _, _, body = self.send(ChatNotifier(self.server.url("/slack"), "slack"))
+        self.assertTrue(json.loads(body)["text"].startswith("<!here> *Warwick"))
+        self.server.received.clear()
+        _, _, body = self.send(ChatNotifier(self.server.url("/discord"), "discord"), UNEXPECTED_STATUS)
+        self.assertTrue(json.loads(body)["content"].startswith("**Warwick"))
+
+    def test_parse_channels(self):
+        """Test building channels from WRB_NOTIFY."""
+        channels = parse_channels("ntfy:https://ntfy.sh/t, discord:https://d/x ,email", timeout=3)
+        self.assertEqual([c.name for c in channels], ["ntfy", "discord", "email"])
+        self.assertEqual(channels[0].url, "https://ntfy.sh/t")
+        self.assertTrue(all(c.timeout == 3 for c in channels))
+        with self.assertRaises(ValueError):
+            parse_channels("pager:123")
+
+
+@unittest.skipIf(httpx is None, "httpx not installed")
+class TestFanOut(unittest.TestCase):
+    """Tests for concurrent delivery."""
+
+    def setUp(self):
+        self.server = PushStandIn().start()
+        self.addCleanup(self.server.stop)
+
+    def test_latency_is_fastest_not_sum(self):
+        """Test that channels run at once, so slow ones don't delay the rest."""
+        for path, delay in (("/a", 0.3), ("/b", 0.3), ("/c", 0.3), ("/fast", 0.0)):
+            self.server.delays[path] = delay
+        channels = [WebhookNotifier(self.server.url(p)) for p in ("/a", "/b", "/c", "/fast")]
+        started = time.perf_counter()
+        deliveries = asyncio.run(notify_async(Alert(LIVE), channels))
+        elapsed = time.perf_counter() - started
+        self.assertTrue(all(d.ok for d in deliveries))
+        self.assertLess(elapsed, 0.6)       # Serial would be 0.9s
+        self.assertLess(deliveries[3].elapsed, 0.2)
+
+    def test_per_channel_timeout_and_errors(self):
+        """Test that a hung or failing channel is reported without holding up the others."""
+        self.server.delays["/hung"] = 2.0
+        self.server.statuses["/broken"] = 500
+        channels = [WebhookNotifier(self.server.url("/hung"), timeout=0.2),
+                    WebhookNotifier(self.server.url("/broken")),
+                    WebhookNotifier(self.server.url("/ok"))]
+        started = time.perf_counter()
+        hung, broken, ok = asyncio.run(notify_async(Alert(LIVE), channels))
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertIn("timed out", hung.error)
+        self.assertIn("500", broken.error)
+        self.assertTrue(ok.ok)
+
+    def test_email_alongside_push(self):
+        """Test that email runs in a thread next to the HTTP channels."""
+        with SMTPSink() as sink, patch.multiple(check_wrb2526, SMTP_SERVER=sink.host, SMTP_PORT=sink.port,
+                                                SMTP_USE_SSL=False), patch('builtins.print'):
+            email, push = asyncio.run(notify_async(Alert(LIVE), [EmailNotifier(), NtfyNotifier(self.server.url("/t"))]))
+        self.assertTrue(email.ok and push.ok)
+        self.assertEqual(sink.messages[0]["Subject"], check_wrb2526.ALERT_SUBJECT)
+
+    def test_shared_client(self):
+        """Test that a caller's client is used for every channel and left open."""
+        async def run():
+            async with httpx.AsyncClient() as client:
+                dispatcher = Dispatcher([WebhookNotifier(self.server.url(p)) for p in ("/a", "/b")], client)
+                await dispatcher.notify(Alert(LIVE))
+                await dispatcher.close()
+                self.assertFalse(client.is_closed)
+        asyncio.run(run())
+        self.assertEqual(len(self.server.received), 2)
+
+
+@unittest.skipIf(httpx is None, "httpx not installed")
+class TestCheckPageNotify(unittest.TestCase):
+    """Tests for check_page() alerting through WRB_NOTIFY channels."""
+
+    def test_go_live_fans_out(self):
+        """Test that a go-live alert reaches every configured channel."""
+        with PushStandIn() as push, WRBStandIn(live=True) as site, \
+             patch.multiple(check_wrb2526, URL=site.url,
+                            NOTIFY_CHANNELS=f"ntfy:{push.url('/t')},webhook:{push.url('/h')}"), \
+             patch('check_wrb2526.send_email') as mock_send_email, patch('builtins.print'):
+            check_wrb2526.check_page()
+        self.assertEqual(sorted(path for _, path, _, _ in push.received), ["/h", "/t"])
+        mock_send_email.assert_not_called()
+
+    def test_all_channels_failing_raises(self):
+        """Test that an alert no channel delivered is an error, like a failed send_email()."""
+        with PushStandIn() as push, patch('builtins.print'):
+            push.statuses["/t"] = 503
+            with self.assertRaises(NotificationError):
+                notify_channels(LIVE, f"ntfy:{push.url('/t')}")
+
+    def test_notify_inside_event_loop(self):
+        """Test that async callers await the channels, and the sync form refuses to nest event loops."""
+        async def run():
+            with patch.object(check_wrb2526, "NOTIFY_CHANNELS", f"ntfy:{push.url('/t')}"):
+                await check_wrb2526.notify_async(LIVE)
+            with self.assertRaises(RuntimeError):
+                notify_channels(LIVE, f"ntfy:{push.url('/t')}")
+            await notify_channels_async(LIVE, f"webhook:{push.url('/h')}")
+
+        with PushStandIn() as push, patch('builtins.print'):
+            asyncio.run(run())
+        self.assertEqual([path for _, path, _, _ in push.received], ["/t", "/h"])
+
+    def test_email_channel_coalesced(self):
+        """Test that the email channel goes through the Coalescer when a window is set."""
+        with patch.multiple(check_wrb2526, COALESCE_WINDOW=60), patch('coalesce.get_coalescer') as coalescer, \
+             patch('check_wrb2526.send_email') as mock_send_email, patch('builtins.print'):
+            delivery, = asyncio.run(notify_async(Alert(LIVE), [EmailNotifier()]))
+        self.assertTrue(delivery.ok)
+        coalescer.return_value.send.assert_called_once()
+        self.assertEqual(coalescer.return_value.send.call_args[0], (LIVE,))
+        mock_send_email.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
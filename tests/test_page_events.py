@@ -0,0 +1,109 @@
+import unittest
+from unittest.mock import patch, Mock
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_wrb2526
+from check_wrb2526 import (classify, classify_html, URL, UNAVAILABLE, LIVE_LOGIN,
+                           LIVE_FORM, WRONG_YEAR, UNKNOWN)
+from page_events import PageMarkers, scan_html, scan_response
+from tests.scenarios import TEST_SCENARIOS
+
+EXPECTED_STATES = {
+    "unavailable": UNAVAILABLE,
+    "login_redirect": LIVE_LOGIN,
+    "return_url": LIVE_LOGIN,
+    "booking_form_wrb": LIVE_FORM,
+    "booking_form_preferred": LIVE_FORM,
+    "wrb_2425": WRONG_YEAR,
+    "unknown_change": UNKNOWN,
+}
+
+# A maintenance page that mentions next year's system in a table cell
+MAINTENANCE_WITH_YEAR = """
+<html>
+<head><title>Scientia Web Room Booking</title></head>
+<body>
+    <div class="Banner"><span class="BannerTitle">Scheduled Maintenance</span></div>
+    <table><tr><td>Web Room Booking System 2025/26</td><td>Opens soon</td></tr></table>
+</body>
+</html>
+"""
+
+
+def streamed(html, chunk=64):
+    """Build a mock streamed response."""
+    data = html.encode()
+    r = Mock()
+    r.encoding = "utf-8"
+    r.url = URL
+    r.iter_content.return_value = (data[i:i + chunk] for i in range(0, len(data), chunk))
+    return r
+
+
+class TestPageMarkers(unittest.TestCase):
+    """Tests for the incremental page marker parser."""
+
+    def test_regions_extracted(self):
+        """Test that title, banner, headings and form are picked out."""
+        markers = scan_html(TEST_SCENARIOS["booking_form_preferred"]["content"])
+        self.assertEqual(markers.title, "Room Booking")
+        self.assertEqual(markers.headings, ["Room Booking System"])
+        self.assertIn("Preferred Start Time:", markers.form_text)
+        self.assertEqual(markers.fields, ["start_time"])
+
+    def test_byte_at_a_time(self):
+        """Test that markers survive being split at every byte."""
+        markers = PageMarkers()
+        for byte in TEST_SCENARIOS["unavailable"]["content"].encode():
+            markers.feed_bytes(bytes([byte]))
+        self.assertEqual(markers.banner, "Application Unavailable")
+
+    def test_stops_after_unavailable_banner(self):
+        """Test that parsing stops once the unavailable banner has closed."""
+        page = TEST_SCENARIOS["unavailable"]["content"].replace(
+            "</body>", "<p>" + "padding " * 20000 + "</p></body>")
+        r = streamed(page)
+        markers = scan_response(r)
+        self.assertTrue(markers.done)
+        self.assertLess(markers.bytes_read, 2048)
+        r.close.assert_called_once()
+
+    def test_script_text_ignored(self):
+        """Test that strings inside scripts don't count as form text."""
+        markers = scan_html("<form><script>var s = 'Preferred Start';</script></form>")
+        self.assertNotIn("Preferred Start", markers.form_text)
+
+
+class TestEventClassification(unittest.TestCase):
+    """Tests for event-mode classification."""
+
+    def test_scenarios_match(self):
+        """Test that every scenario page classifies as expected."""
+        for name, scenario in TEST_SCENARIOS.items():
+            with self.subTest(name):
+                self.assertEqual(classify_html(scenario["content"], scenario["url"]), EXPECTED_STATES[name])
+
+    def test_year_in_stray_cell_not_a_go_live(self):
+        """Test that a year mentioned outside the title/banner/headings isn't the form."""
+        self.assertEqual(classify(MAINTENANCE_WITH_YEAR, URL), LIVE_FORM)     # Substring misfire
+        self.assertEqual(classify_html(MAINTENANCE_WITH_YEAR, URL), UNKNOWN)
+
+    @patch('check_wrb2526.requests.get')
+    @patch('check_wrb2526.send_email')
+    def test_check_page_events_mode(self, mock_send_email, mock_get):
+        """Test that check_page streams the page in events mode."""
+        mock_get.return_value = streamed(TEST_SCENARIOS["unavailable"]["content"])
+        with patch.object(check_wrb2526, "PARSE_MODE", "events"):
+            with patch('builtins.print') as mock_print:
+                check_wrb2526.check_page()
+        mock_get.assert_called_once_with(URL, allow_redirects=True, stream=True)
+        mock_print.assert_called_once_with("Still unavailable.")
+        mock_send_email.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
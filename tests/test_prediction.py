@@ -0,0 +1,181 @@
+import unittest
+from unittest.mock import patch
+import json
+import os
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import PollHistory
+from prediction import (ReleaseForecast, PollScheduler, BASELINE_INTERVAL, parse_event, load_events,
+                        events_from_history, change_signals)
+import requests
+
+import monitor
+from check_wrb2526 import CheckResult
+from state_machine import StateMachine
+
+URL = "https://abs.warwick.ac.uk/WRB2526/"
+PAST_EVENTS = [parse_event("2024-07-15T09:30:00"), parse_event("2025-07-21T10:00:00")]
+NOW = parse_event("2026-06-20T00:00:00")
+
+
+class TestReleaseForecast(unittest.TestCase):
+    """Tests for the release-time distribution."""
+
+    def setUp(self):
+        self.forecast = ReleaseForecast.build(PAST_EVENTS, now=NOW)
+
+    def test_mass_concentrated_near_past_releases(self):
+        """Test that most of the probability lands in mid-to-late July."""
+        july = self.forecast.mass(parse_event("2026-07-05"), parse_event("2026-08-05"))
+        self.assertGreater(july, 0.8)
+        self.assertAlmostEqual(sum(self.forecast.probs), 1.0)
+
+    def test_office_hours_favoured(self):
+        """Test that the morning is more likely than the middle of the night."""
+        morning = self.forecast.density(parse_event("2026-07-18T09:45:00"))
+        night = self.forecast.density(parse_event("2026-07-18T03:00:00"))
+        self.assertGreater(morning, 10 * night)
+
+    def test_no_events_is_uniform(self):
+        """Test that without history the forecast is flat."""
+        forecast = ReleaseForecast.build([], now=NOW)
+        self.assertAlmostEqual(min(forecast.probs), max(forecast.probs))
+
+    def test_change_signal_adds_near_term_mass(self):
+        """Test that a recent page change pulls probability into the next few hours."""
+        soon = (NOW, NOW + 6 * 3600)
+        signalled = ReleaseForecast.build(PAST_EVENTS, signals=[NOW], now=NOW)
+        self.assertGreater(signalled.mass(*soon), 10 * self.forecast.mass(*soon))
+
+    def test_quantiles_ordered(self):
+        """Test that quantiles increase and bracket the most likely time."""
+        q05, q50, q95 = (self.forecast.quantile(q) for q in (0.05, 0.5, 0.95))
+        self.assertLess(q05, q50)
+        self.assertLess(q50, q95)
+        self.assertLess(q05, self.forecast.most_likely())
+        self.assertLess(self.forecast.most_likely(), q95)
+
+    def test_load_events(self):
+        """Test importing go-live events from JSON."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "events.json")
+            with open(path, "w") as f:
+                json.dump([{"system": "WRB2425", "live": "2024-07-15T09:30:00"}, "2025-07-21T10:00:00"], f)
+            self.assertEqual(load_events(path), PAST_EVENTS)
+
+
+class TestPollScheduler(unittest.TestCase):
+    """Tests for the forecast-driven poll schedule."""
+
+    def setUp(self):
+        self.forecast = ReleaseForecast.build(PAST_EVENTS, now=NOW)
+
+    def test_same_latency_fewer_requests(self):
+        """Test that the schedule matches */5 polling's latency with far fewer polls."""
+        scheduler = PollScheduler(self.forecast)
+        uniform_polls = (self.forecast.end - self.forecast.start) / BASELINE_INTERVAL
+        self.assertAlmostEqual(scheduler.expected_latency(), BASELINE_INTERVAL / 2, places=3)
+        self.assertLess(len(scheduler), uniform_polls / 2)
+
+    def test_uniform_forecast_gives_uniform_polling(self):
+        """Test that with nothing to go on the schedule is the baseline."""
+        scheduler = PollScheduler(ReleaseForecast.build([], now=NOW))
+        gaps = {round(b - a, 6) for a, b in zip(scheduler.schedule, scheduler.schedule[1:])}
+        self.assertEqual(gaps, {BASELINE_INTERVAL})
+
+    def test_budget(self):
+        """Test that a request budget is met and the intervals are clamped."""
+        scheduler = PollScheduler(self.forecast, budget=8000, min_interval=60, max_interval=1800)
+        self.assertAlmostEqual(len(scheduler), 8000, delta=40)
+        self.assertGreaterEqual(min(scheduler.intervals), 60)
+        self.assertLessEqual(max(scheduler.intervals), 1800)
+
+    def test_next_poll(self):
+        """Test looking up the next poll and falling back past the horizon."""
+        scheduler = PollScheduler(self.forecast)
+        t = scheduler.schedule[10]
+        self.assertEqual(scheduler.next_poll(t - 1), t)
+        self.assertEqual(scheduler.next_poll(scheduler.forecast.end + 5), scheduler.forecast.end + 5 + 3600)
+
+
+class TestHistorySignals(unittest.TestCase):
+    """Tests for learning from the poll history."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.history = PollHistory(os.path.join(tmp.name, "h.sqlite3"))
+        self.addCleanup(self.history.close)
+
+    def test_events_and_signals(self):
+        """Test that go-lives and unavailable-page changes are read back."""
+        for i, (state, digest) in enumerate([("UNAVAILABLE", "a"), ("UNAVAILABLE", "a"),
+                                             ("UNAVAILABLE", "b"), ("LIVE_LOGIN", "c")]):
+            self.history.record(URL, state, content_hash=digest, ts=1000 + i)
+        self.history.flush()
+        self.assertEqual(events_from_history(self.history), [1003])
+        self.assertEqual(change_signals(self.history, URL, since=0), [1002])
+
+
+class TestMonitor(unittest.TestCase):
+    """Tests for the scheduled monitor loop."""
+
+    def test_polls_until_live(self):
+        """Test that the monitor sleeps between scheduled polls and stops on go-live."""
+        clock = [NOW]
+        states = iter(["UNAVAILABLE"] * 4 + ["LIVE_LOGIN"])
+        polled_at = []
+
+        def check():
+            polled_at.append(clock[0])
+            return CheckResult(next(states))
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with patch('builtins.print'):
+            result = monitor.run(check=check, clock=lambda: clock[0], sleep=sleep)
+
+        self.assertEqual(result.state, "LIVE_LOGIN")
+        self.assertEqual(len(polled_at), 5)
+        self.assertEqual(polled_at, sorted(set(polled_at)))
+
+    def run_states(self, states, machine=None):
+        clock = [NOW]
+        polls = iter(states)
+
+        def check():
+            state = next(polls)
+            if state is None:
+                raise requests.ConnectionError("refused")
+            if machine is not None:
+                machine.observe(URL, state)
+            return CheckResult(state)
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with patch('builtins.print'), patch('check_wrb2526.notify'):
+            return monitor.run(check=check, clock=lambda: clock[0], sleep=sleep, machine=machine,
+                               max_polls=len(states))
+
+    def test_fetch_errors_do_not_stop_monitor(self):
+        """Test that a failed fetch is an ERROR poll, not a crash or an exit."""
+        result = self.run_states(["UNAVAILABLE", None, "UNAVAILABLE", "LIVE_FORM"])
+        self.assertEqual(result.state, "LIVE_FORM")
+
+    def test_exit_follows_stable_state(self):
+        """Test that with a state machine, unconfirmed noise doesn't end the monitor but a go-live does."""
+        machine = StateMachine()
+        result = self.run_states(["UNAVAILABLE", "ERROR", "UNKNOWN", "UNAVAILABLE", "LIVE_LOGIN", "UNAVAILABLE"],
+                                 machine)
+        self.assertEqual(result.state, "LIVE_LOGIN")
+        self.assertIsNone(self.run_states(["UNAVAILABLE", "UNKNOWN", "ERROR", "ERROR"], StateMachine()))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
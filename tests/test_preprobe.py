@@ -0,0 +1,138 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+import check_wrb2526
+from check_wrb2526 import LIVE_LOGIN, STATUS_MESSAGES, UNAVAILABLE, UNEXPECTED_STATUS, UNKNOWN
+from preprobe import PreProbe, fingerprint
+from tests.stand_ins import UNAVAILABLE_PAGE, WRBStandIn
+
+
+class PreProbeTestCase(unittest.TestCase):
+    """check_page() against a stand-in WRB server, with a pre-probe on a test clock."""
+
+    def setUp(self):
+        self.site = WRBStandIn().start()
+        self.addCleanup(self.site.stop)
+        self.now = 1000.0
+        settings = patch.multiple(check_wrb2526, URL=self.site.url, PRE_PROBE="head", _pre_probe=None)
+        settings.start()
+        self.addCleanup(settings.stop)
+        notify = patch('check_wrb2526.notify')
+        self.notify = notify.start()
+        self.addCleanup(notify.stop)
+        quiet = patch('builtins.print')
+        quiet.start()
+        self.addCleanup(quiet.stop)
+
+    def use(self, **options):
+        check_wrb2526._pre_probe = PreProbe(clock=lambda: self.now, **options)
+        return check_wrb2526._pre_probe
+
+    def counts(self):
+        return self.site.count("HEAD", "/WRB2526/"), self.site.count("GET", "/WRB2526/")
+
+
+class TestSkipping(PreProbeTestCase):
+    """Tests for skipping the full GET while the headers are unchanged."""
+
+    def test_stable_page_fetched_once(self):
+        """Test that an unchanged unavailable page costs one GET, then HEADs only."""
+        probe = self.use()
+        results = [check_wrb2526.check_page() for _ in range(5)]
+        self.assertEqual(self.counts(), (5, 1))
+        self.assertEqual({r.state for r in results}, {UNAVAILABLE})
+        self.assertIn("probe", results[-1].timings)
+        self.assertEqual((probe.skipped, probe.hit_rate), (4, 0.8))
+        self.notify.assert_not_called()
+
+    def test_skipped_polls_observed(self):
+        """Test that observers still get a sample when the GET is skipped, marked as probed."""
+        self.use()
+        observed = []
+        with patch.object(check_wrb2526, "OBSERVERS", [lambda *args: observed.append(args)]):
+            for _ in range(3):
+                check_wrb2526.check_page()
+        self.assertEqual([(target, state, probed) for target, _, state, _, probed in observed],
+                         [(self.site.url, UNAVAILABLE, False)] + [(self.site.url, UNAVAILABLE, True)] * 2)
+        self.assertEqual([r.request.method for _, r, *_ in observed], ["GET", "HEAD", "HEAD"])
+
+    def test_go_live_seen_at_once(self):
+        """Test that the redirect to login changes the fingerprint, so the next check is a full one."""
+        self.use()
+        for _ in range(3):
+            check_wrb2526.check_page()
+        self.site.live = True
+        self.assertEqual(check_wrb2526.check_page().state, LIVE_LOGIN)
+        self.notify.assert_called_once_with(STATUS_MESSAGES[LIVE_LOGIN])
+
+    def test_fingerprint_survives_restart(self):
+        """Test that with a probe file, the next cron run can skip its first GET."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "probe.json")
+            self.use(path=path)
+            check_wrb2526.check_page()
+            self.use(path=path)
+            check_wrb2526.check_page()
+            self.assertEqual(self.counts(), (2, 1))
+            self.assertEqual(PreProbe("range", path).fingerprint, None)     # Other mode: start afresh
+
+    def test_fingerprint_ignores_range_length(self):
+        """Test that a 206 is fingerprinted by the full size from Content-Range, not the range's."""
+        def partial(length, total):
+            response = requests.Response()
+            response.status_code, response.url = 206, "https://abs.warwick.ac.uk/WRB2526/"
+            response.headers.update({"Content-Length": str(length), "Content-Range": f"bytes 0-{length - 1}/{total}"})
+            return response
+        self.assertEqual(fingerprint(partial(1024, 5120)), fingerprint(partial(512, 5120)))
+        self.assertNotEqual(fingerprint(partial(1024, 5120)), fingerprint(partial(1024, 5121)))
+
+
+class TestSelfDisabling(PreProbeTestCase):
+    """Tests for the probe switching itself off when it can't be trusted or doesn't pay."""
+
+    def test_unstable_headers_turn_probe_off(self):
+        """Test that a page whose length changes every time disables the probe, until the retry time."""
+        probe = self.use(window=4)
+        for i in range(4):
+            self.site.serve("/WRB2526/", UNAVAILABLE_PAGE + " " * i)
+            check_wrb2526.check_page()
+        self.assertFalse(probe.enabled)
+        self.assertIn("0%", probe.disabled_reason)
+        check_wrb2526.check_page()
+        self.assertEqual(self.counts(), (4, 5))
+        self.now += probe.retry_after
+        check_wrb2526.check_page()
+        self.assertTrue(probe.enabled)
+        self.assertEqual(self.counts(), (5, 6))
+
+    def test_changed_page_behind_same_headers(self):
+        """Test that a periodic full check catches a change the headers hid, and turns the probe off."""
+        probe = self.use(verify_every=2)
+        check_wrb2526.check_page()
+        check_wrb2526.check_page()      # Skipped
+        changed = "<html><body>Scheduled maintenance</body></html>"
+        self.site.serve("/WRB2526/", changed.ljust(len(UNAVAILABLE_PAGE)))
+        self.assertEqual(check_wrb2526.check_page().state, UNKNOWN)
+        self.notify.assert_called_once_with(UNEXPECTED_STATUS)
+        self.assertFalse(probe.enabled)
+        self.assertEqual(self.counts(), (3, 2))
+
+    def test_probe_failure_falls_back(self):
+        """Test that a failed probe just means a full check."""
+        self.use()
+        check_wrb2526.check_page()
+        with patch('preprobe.requests.head', side_effect=requests.ConnectionError("reset")):
+            self.assertEqual(check_wrb2526.check_page().state, UNAVAILABLE)
+        self.assertEqual(self.counts(), (1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,159 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_wrb2526
+from check_wrb2526 import STATUS_MESSAGES, LIVE_LOGIN, UNEXPECTED_STATUS, send_email
+from notifiers import HIGH, DEFAULT, LOW
+from ratelimit import DAY, RateLimited, RateLimiter
+from tests.stand_ins import Clock, SinkTestCase
+
+ACCOUNT = "bot@example.com"
+
+
+class LimiterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "limits.sqlite3")
+        self.clock = Clock()
+        self.limiter = self.open()
+
+    def open(self, **options):
+        options = {"daily_limit": 10, "account_rate": (4, 60.0), "recipient_rate": (3, 60.0), "reserve": 0.5,
+                   **options}
+        limiter = RateLimiter(self.path, clock=self.clock, **options)
+        self.addCleanup(limiter.close)
+        return limiter
+
+
+class TestTokenBuckets(LimiterTestCase):
+    """Tests for the per-account and per-recipient buckets."""
+
+    def test_recipient_bucket(self):
+        """Test that a recipient's burst runs out, then refills over its period."""
+        allowed = [self.limiter.acquire(ACCOUNT, "a@example.com", HIGH).allowed for _ in range(4)]
+        self.assertEqual(allowed, [True, True, True, False])
+        self.clock.now += 20        # One token back
+        self.assertTrue(self.limiter.acquire(ACCOUNT, "a@example.com", HIGH))
+
+    def test_account_bucket_spans_recipients(self):
+        """Test that the account's bucket is shared by all its recipients."""
+        for n in range(4):
+            self.assertTrue(self.limiter.acquire(ACCOUNT, f"r{n}@example.com", HIGH))
+        decision = self.limiter.acquire(ACCOUNT, "r9@example.com", HIGH)
+        self.assertFalse(decision)
+        self.assertIn("account:", decision.reason)
+        self.assertAlmostEqual(decision.retry_after, 15.0)
+        self.assertTrue(self.limiter.acquire("other@example.com", "r9@example.com", HIGH))
+
+    def test_refused_send_spends_nothing(self):
+        """Test that a refusal leaves every bucket as it was."""
+        for n in range(3):
+            self.limiter.acquire(ACCOUNT, "a@example.com", HIGH)
+        self.assertFalse(self.limiter.acquire(ACCOUNT, "a@example.com, b@example.com", HIGH))
+        self.assertTrue(self.limiter.acquire(ACCOUNT, "b@example.com", HIGH))
+
+
+class TestQuota(LimiterTestCase):
+    """Tests for the rolling daily quota and its persistence."""
+
+    def test_daily_quota_rolls(self):
+        """Test that the quota counts the last 24 hours and frees up as sends age out."""
+        for n in range(10):
+            self.assertTrue(self.limiter.acquire(ACCOUNT, f"r{n}@example.com", HIGH))
+            self.clock.now += 60
+        decision = self.limiter.acquire(ACCOUNT, "late@example.com", HIGH)
+        self.assertIn("daily quota", decision.reason)
+        self.assertAlmostEqual(decision.retry_after, DAY - 600)
+        self.clock.now += decision.retry_after + 1
+        self.assertTrue(self.limiter.acquire(ACCOUNT, "late@example.com", HIGH))
+
+    def test_persisted_across_processes(self):
+        """Test that a fresh limiter on the same file carries on where the last one stopped."""
+        for _ in range(3):
+            self.limiter.acquire(ACCOUNT, "a@example.com", HIGH)
+        self.limiter.close()
+        reopened = self.open()
+        self.assertFalse(reopened.acquire(ACCOUNT, "a@example.com", HIGH))
+        self.assertEqual(reopened.usage(ACCOUNT), {"sent": 3, "refused": 1, "remaining": 7})
+
+    def test_prune(self):
+        """Test that sends older than a day can be dropped."""
+        self.limiter.acquire(ACCOUNT, "a@example.com", HIGH)
+        self.clock.now += DAY + 1
+        self.limiter.prune()
+        self.assertEqual(self.limiter.db.execute("SELECT count(*) FROM sends").fetchone()[0], 0)
+
+
+class TestPriority(LimiterTestCase):
+    """Tests for keeping a reserve for urgent alerts."""
+
+    def test_reserve_kept_for_urgent(self):
+        """Test that low-priority sends stop at the reserve while go-live alerts carry on."""
+        statuses = [self.limiter.acquire(ACCOUNT, f"r{n}@example.com", DEFAULT).allowed for n in range(3)]
+        self.assertEqual(statuses, [True, True, False])      # 2 of 4 account tokens are held back
+        self.assertTrue(self.limiter.acquire(ACCOUNT, "r0@example.com", HIGH))
+        self.assertTrue(self.limiter.acquire(ACCOUNT, "r1@example.com", HIGH))
+
+    def test_daily_reserve(self):
+        """Test that the last share of the daily quota is left for urgent alerts."""
+        limiter = self.open(account_rate=(100, 1.0), recipient_rate=(100, 1.0))
+        sent = sum(limiter.acquire(ACCOUNT, f"r{n}@example.com", LOW).allowed for n in range(10))
+        self.assertEqual(sent, 5)
+        self.assertEqual(sum(limiter.acquire(ACCOUNT, "x@example.com", HIGH).allowed for _ in range(10)), 5)
+
+    def test_take(self):
+        """Test that take() drops low-priority sends and waits briefly, then raises, for urgent ones."""
+        for _ in range(3):
+            self.limiter.acquire(ACCOUNT, "a@example.com", HIGH)
+        with patch('builtins.print'):
+            self.assertFalse(self.limiter.take(ACCOUNT, "a@example.com", DEFAULT))
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            self.clock.now += seconds
+
+        self.assertTrue(self.limiter.take(ACCOUNT, "a@example.com", HIGH, wait=30, sleep=sleep))
+        self.assertEqual(waits, [20.0])
+        with self.assertRaises(RateLimited):
+            self.limiter.take(ACCOUNT, "a@example.com", HIGH, wait=5, sleep=sleep)
+
+
+class TestSendEmailLimited(SinkTestCase):
+    """Tests for send_email() going through the rate limits."""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.limiter = RateLimiter(os.path.join(tmp.name, "limits.sqlite3"), recipient_rate=(2, 3600.0),
+                                   reserve=0.5)
+        self.addCleanup(self.limiter.close)
+        limits = patch.multiple(check_wrb2526, RATE_LIMIT_DB=self.limiter.path, _rate_limiter=self.limiter,
+                                RATE_LIMIT_WAIT=0)
+        limits.start()
+        self.addCleanup(limits.stop)
+
+    def test_flapping_page_leaves_room_for_go_live(self):
+        """Test that UNEXPECTED CHANGE alerts are held back once the quota is tight, but go-live isn't."""
+        for _ in range(3):
+            send_email(UNEXPECTED_STATUS)
+        self.assertEqual(len(self.sink.messages), 1)
+        send_email(STATUS_MESSAGES[LIVE_LOGIN])
+        self.assertEqual(len(self.sink.messages), 2)
+        self.assertIn("(status: Redirected to login", self.sink.messages[1].get_content())
+        with self.assertRaises(RateLimited):
+            send_email(STATUS_MESSAGES[LIVE_LOGIN])
+        self.assertEqual(len(self.sink.messages), 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
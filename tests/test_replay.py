@@ -0,0 +1,104 @@
+import unittest
+from unittest.mock import patch
+import json
+import os
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import replay
+from check_wrb2526 import URL, UNAVAILABLE, LIVE_LOGIN, LIVE_FORM, UNKNOWN
+from tests.scenarios import TEST_SCENARIOS
+
+LOGIN_URL = "https://abs.warwick.ac.uk/Login.aspx?ReturnUrl=%2fWRB2526%2f"
+# The new system named outside any heading: substring rules call it live, event rules don't
+TABLE_ONLY = "<html><body><table><tr><td>Web Room Booking System 2025/26</td></tr></table></body></html>"
+
+
+def har(*entries):
+    return {"log": {"version": "1.2", "entries": [
+        {"request": {"method": "GET", "url": url},
+         "response": {"status": status, "redirectURL": "",
+                      "content": {"mimeType": mime, "text": text}}}
+        for url, status, mime, text in entries]}}
+
+
+class TestReplay(unittest.TestCase):
+    """Tests for offline replay of archived responses."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+        self.write("snapshots/0001.html", TEST_SCENARIOS["unavailable"]["content"])
+        self.write("snapshots/0002.html", TABLE_ONLY)
+        self.write("snapshots/notes.txt", "not an archive")
+        self.write("dump.jsonl", "\n".join(json.dumps({"url": s["url"], "status": 200, "text": s["content"]})
+                                           for s in (TEST_SCENARIOS["unavailable"],
+                                                     TEST_SCENARIOS["booking_form_preferred"])))
+        self.write("session.har", json.dumps(har(
+            (URL, 302, "text/html", ""),
+            (LOGIN_URL, 200, "text/html; charset=utf-8", "<html><body><form></form></body></html>"),
+            ("https://abs.warwick.ac.uk/style.css", 200, "text/css", "body {}"),
+        )))
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+
+    def states(self, rows):
+        return {os.path.relpath(record_id, self.dir): state for record_id, state, _reason, _hash in rows}
+
+    def test_loaders(self):
+        """Test that every archive format is read and non-pages are skipped."""
+        self.assertEqual(self.states(replay.replay([self.dir], workers=1)), {
+            "dump.jsonl#0": UNAVAILABLE,
+            "dump.jsonl#1": LIVE_FORM,
+            "session.har#1": LIVE_LOGIN,
+            os.path.join("snapshots", "0001.html"): UNAVAILABLE,
+            os.path.join("snapshots", "0002.html"): LIVE_FORM,
+        })
+
+    def test_process_pool_matches_serial(self):
+        """Test that the pool gives the same rows, in order, as a serial run."""
+        self.assertEqual(replay.replay([self.dir], workers=2, chunk_size=2), replay.replay([self.dir], workers=1))
+
+    def test_one_file_split_across_workers(self):
+        """Test that a single large archive is classified in chunks on the pool, in order."""
+        pages = [TEST_SCENARIOS[name] for name in ("unavailable", "booking_form_preferred")] * 10
+        self.write("season/all.jsonl", "\n".join(json.dumps({"url": s["url"], "status": 200, "text": s["content"]})
+                                                for s in pages))
+        season = os.path.join(self.dir, "season")
+        with patch('replay.ProcessPoolExecutor', wraps=replay.ProcessPoolExecutor) as pool:
+            rows = replay.replay([season], workers=2, chunk_size=3)
+        pool.assert_called_once()
+        self.assertEqual(rows, replay.replay([season], workers=1))
+        self.assertEqual([state for _, state, _, _ in rows], [UNAVAILABLE, LIVE_FORM] * 10)
+
+    def test_baseline_diff(self):
+        """Test that a rule change shows up as a diff against the baseline."""
+        baseline_path = os.path.join(self.dir, "baseline.json")
+        replay.save_baseline(baseline_path, replay.replay([self.dir], workers=1, parse_mode="substring"))
+        rows = replay.replay([self.dir], workers=2, parse_mode="events")
+        changed = replay.compare(rows, replay.load_baseline(baseline_path))
+        self.assertEqual([(os.path.relpath(c[0], self.dir), c[1], c[2]) for c in changed],
+                         [(os.path.join("snapshots", "0002.html"), LIVE_FORM, UNKNOWN)])
+
+    def test_cli_exit_status(self):
+        """Test that the CLI fails when classifications changed."""
+        baseline_path = os.path.join(self.dir, "baseline.json")
+        with patch('builtins.print'):
+            self.assertEqual(replay.main([self.dir, "--workers", "1", "--mode", "substring",
+                                          "--save-baseline", baseline_path]), 0)
+            self.assertEqual(replay.main([self.dir, "--workers", "1", "--mode", "substring",
+                                          "--baseline", baseline_path]), 0)
+            self.assertEqual(replay.main([self.dir, "--workers", "1", "--mode", "events",
+                                          "--baseline", baseline_path]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import threading
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from session_pool import SessionPool, parse_accounts
+from tests.stand_ins import WRBStandIn
+
+USERS = {"officer": "secret", "treasurer": "hunter2"}
+
+
+class TestSessionPool(unittest.TestCase):
+    """Tests for the authenticated session pool against the local stand-in."""
+
+    def setUp(self):
+        self.wrb = WRBStandIn(live=True, users=USERS).start()
+        self.addCleanup(self.wrb.stop)
+        self.login_url = f"{self.wrb.origin}/Login.aspx?ReturnUrl=/WRB2526/"
+
+    def pool(self, accounts=None, **kwargs):
+        pool = SessionPool(accounts or list(USERS.items()), login_url=self.login_url,
+                           touch_url=self.wrb.url, **kwargs)
+        self.addCleanup(pool.stop)
+        return pool
+
+    def test_parse_accounts(self):
+        """Test parsing WRB_ACCOUNTS."""
+        self.assertEqual(parse_accounts("a:1, b:p:w,bad"), [("a", "1"), ("b", "p:w")])
+        self.assertEqual(parse_accounts(None), [])
+
+    def test_start_logs_everyone_in(self):
+        """Test that every account is logged in up front."""
+        pool = self.pool().start()
+        health = pool.health()
+        self.assertEqual(health["healthy"], 2)
+        self.assertEqual(health["logins"], 2)
+
+    def test_acquire_hands_out_logged_in_sessions(self):
+        """Test that borrowed sessions reach the booking form without logging in."""
+        pool = self.pool().start()
+        with patch("session_pool.login") as mock_login:
+            with pool.acquire() as session:
+                r = session.get(self.wrb.url)
+            mock_login.assert_not_called()
+        self.assertIn("Preferred Start", r.text)
+
+    def test_concurrent_workers_get_distinct_sessions(self):
+        """Test that concurrent workers never share a session."""
+        pool = self.pool().start()
+        held = []
+        barrier = threading.Barrier(2)
+
+        def worker():
+            with pool.acquire(timeout=2) as session:
+                held.append(session)
+                barrier.wait()
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNot(held[0], held[1])
+
+    def test_acquire_waits_for_a_free_session(self):
+        """Test that a third worker waits, then times out, when all are busy."""
+        pool = self.pool([("officer", "secret")]).start()
+        with pool.acquire():
+            with self.assertRaises(TimeoutError):
+                with pool.acquire(timeout=0.05):
+                    pass
+        self.assertGreaterEqual(pool.health()["waits"], 1)
+
+    def test_failed_login_reported(self):
+        """Test that bad credentials show up in health and nothing is handed out."""
+        pool = self.pool([("officer", "wrong")]).start()
+        self.assertEqual(pool.health()["healthy"], 0)
+        self.assertEqual(pool.health()["failures"], {"officer": 1})
+        with self.assertRaises(RuntimeError):
+            with pool.acquire():
+                pass
+
+    def test_background_refresh_before_expiry(self):
+        """Test that sessions are logged in again before the server expires them."""
+        self.wrb.session_ttl = 0.2
+        pool = self.pool(ttl=0.2, refresh_ahead=0.25).start(interval=0.02)
+        time.sleep(0.3)
+        with pool.acquire() as session:
+            r = session.get(self.wrb.url)
+        self.assertIn("Preferred Start", r.text)
+        self.assertGreater(pool.health()["logins"], 2)
+
+    def test_touch_relogs_expired_session(self):
+        """Test that a keep-alive touch that lands on the login page triggers a login."""
+        pool = self.pool([("officer", "secret")], keepalive_interval=0).start(interval=60)
+        self.wrb.sessions.clear()       # Server forgets every session
+        pool.maintain()
+        self.assertEqual(pool.health()["logins"], 2)
+        with pool.acquire() as session:
+            self.assertIn("Preferred Start", session.get(self.wrb.url).text)
+
+    def test_renew_borrowed_session(self):
+        """Test that a session held past its TTL, which maintenance skips, is renewed by its holder."""
+        self.wrb.session_ttl = 0.2
+        pool = self.pool([("officer", "secret")], ttl=0.2, refresh_ahead=0.25).start(interval=0.02)
+        with pool.acquire() as session:
+            time.sleep(0.3)
+            self.assertNotIn("Preferred Start", session.get(self.wrb.url).text)
+            self.assertTrue(pool.renew(session))
+            self.assertIn("Preferred Start", session.get(self.wrb.url).text)
+            self.assertTrue(pool.renew(session))        # Fresh again: no second login
+        self.assertEqual(pool.health()["logins"], 2)
+        with self.assertRaises(ValueError):
+            pool.renew(requests.Session())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,111 @@
+import unittest
+import os
+import random
+import sys
+import tempfile
+import time
+from unittest.mock import patch, Mock
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_wrb2526
+from prediction import ReleaseForecast, PollScheduler, parse_event
+from simulator import (Simulator, LatencyModel, fixed_schedule, forecast_sampler, project_events,
+                       MAX_LATENCY)
+
+NOW = parse_event("2026-06-20T00:00:00")
+PAST_EVENTS = [parse_event("2024-07-15T09:30:00"), parse_event("2025-07-21T10:00:00")]
+
+
+class TestSimulator(unittest.TestCase):
+    """Tests for the polling strategy simulator."""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(1)
+        cls.forecast = ReleaseForecast.build(PAST_EVENTS, now=NOW)
+        cls.go_lives = [forecast_sampler(cls.forecast, rng)() for _ in range(300)]
+        cls.rng_state = rng.getstate()
+
+    def setUp(self):
+        self.rng = random.Random()
+        self.rng.setstate(self.rng_state)
+
+    def test_fixed_interval_bounds(self):
+        """Test that detection never takes longer than the interval plus latency."""
+        simulator = Simulator(LatencyModel(median=0.5, sigma=0.5, rng=self.rng))
+        schedule = fixed_schedule(self.forecast.start, self.forecast.end, 300)
+        result, = simulator.run({"cron": schedule}, self.go_lives)
+        self.assertEqual(result.misses, 0)
+        self.assertLessEqual(result.worst_latency, 300 + MAX_LATENCY)
+        self.assertAlmostEqual(result.mean_latency, 150, delta=30)
+
+    def test_requests_counted_up_to_detection(self):
+        """Test that skipped polls are counted exactly as if they had been sent."""
+        simulator = Simulator(LatencyModel(samples=[2.0]))
+        schedule = fixed_schedule(0, 1000, 10)
+        result, = simulator.run({"cron": schedule}, [95.0])
+        # Polls at 0..90 see the old page; the one sent at 90 arrives at 92, so 100 is first
+        self.assertEqual(list(result.requests), [11])
+        self.assertEqual(list(result.latencies), [7.0])
+        self.assertEqual(simulator.site.requests, 4)
+
+    def test_forecast_schedule_needs_fewer_requests(self):
+        """Test that forecast polling matches */5 on average with fewer requests."""
+        simulator = Simulator(LatencyModel(rng=self.rng))
+        strategies = {"cron": fixed_schedule(self.forecast.start, self.forecast.end, 300),
+                      "forecast": PollScheduler(self.forecast).schedule}
+        cron, forecast = simulator.run(strategies, self.go_lives)
+        self.assertLess(forecast.mean_requests, cron.mean_requests / 2)
+        self.assertLess(forecast.mean_latency, cron.mean_latency * 1.5)
+
+    def test_missed_after_schedule(self):
+        """Test that go-lives after the last poll are reported as misses."""
+        result, = Simulator().run({"short": fixed_schedule(0, 100, 10)}, [500.0])
+        self.assertEqual(result.misses, 1)
+        self.assertEqual(result.seasons, 1)
+
+    def test_no_side_effects(self):
+        """Test that a run sends nothing, writes no state and probes nothing, whatever is configured."""
+        schedule = fixed_schedule(self.forecast.start, self.forecast.end, 300)
+        observed = []
+        history, probe = Mock(), Mock()     # Opened by polls before the run
+        with tempfile.TemporaryDirectory() as tmp:
+            state_file = os.path.join(tmp, "states.json")
+            with patch.multiple(check_wrb2526, STATE_FILE=state_file, NOTIFY_CHANNELS="webhook:http://127.0.0.1:9/x",
+                                PRE_PROBE="head", OBSERVERS=[lambda *args: observed.append(args)],
+                                _history=history, _pre_probe=probe), \
+                 patch('check_wrb2526.requests.head') as head:
+                result, = Simulator(LatencyModel(rng=self.rng)).run({"cron": schedule}, self.go_lives[:5])
+            self.assertFalse(os.path.exists(state_file))
+        self.assertEqual(result.misses, 0)
+        self.assertEqual(observed, [])
+        head.assert_not_called()
+        self.assertEqual((history.mock_calls, probe.mock_calls), ([], []))
+
+    def test_recorded_latencies_clamped(self):
+        """Test that recorded responses slower than the timeout count as the timeout, as drawn ones do."""
+        model = LatencyModel(samples=[0.5, 600.0], rng=self.rng)
+        self.assertEqual(sorted({model.sample() for _ in range(50)}), [0.5, MAX_LATENCY])
+        # A go-live just after a poll whose recorded latency would otherwise outrun the next poll
+        result, = Simulator(model).run({"cron": fixed_schedule(0, 1000, 60)}, [500.0])
+        self.assertLessEqual(result.worst_latency, 60 + MAX_LATENCY)
+
+    def test_project_events(self):
+        """Test that past go-lives land on the same date in this season."""
+        projected = project_events(PAST_EVENTS, NOW)
+        self.assertEqual(projected[1], parse_event("2026-07-21T10:00:00"))
+
+    def test_throughput(self):
+        """Test that thousands of seasons can be simulated quickly."""
+        simulator = Simulator(LatencyModel(rng=self.rng))
+        schedule = fixed_schedule(self.forecast.start, self.forecast.end, 60)
+        go_lives = self.go_lives * 10
+        started = time.perf_counter()
+        simulator.run({"cron": schedule}, go_lives)
+        self.assertLess(time.perf_counter() - started, 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
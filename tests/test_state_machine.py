@@ -0,0 +1,169 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+import check_wrb2526
+import state_machine
+from check_wrb2526 import (CheckResult, ERROR, LIVE_FORM, LIVE_LOGIN, STATUS_MESSAGES, UNAVAILABLE,
+                           UNEXPECTED_STATUS, UNKNOWN, WRONG_YEAR)
+from state_machine import StateMachine, parse_hysteresis, state_of
+from tests.stand_ins import WRBStandIn
+
+TARGET = check_wrb2526.URL
+
+
+class MachineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "states.json")
+        notify = patch('check_wrb2526.notify')
+        self.notify = notify.start()
+        self.addCleanup(notify.stop)
+        quiet = patch('builtins.print')
+        quiet.start()
+        self.addCleanup(quiet.stop)
+        self.machine = StateMachine(self.path)
+
+    def feed(self, *states, machine=None):
+        machine = machine or self.machine
+        return [machine.observe(TARGET, state) for state in states]
+
+
+class TestHysteresis(MachineTestCase):
+    """Tests for moving between stable states."""
+
+    def test_clean_go_live_alerts_on_first_poll(self):
+        """Test that an unambiguous transition takes effect at once and alerts once."""
+        transitions = self.feed(UNAVAILABLE, LIVE_LOGIN, LIVE_LOGIN, LIVE_LOGIN)
+        self.assertEqual([t and (t.old, t.new) for t in transitions], [None, (UNAVAILABLE, LIVE_LOGIN), None, None])
+        self.notify.assert_called_once_with(STATUS_MESSAGES[LIVE_LOGIN])
+
+    def test_flapping_page_stays_quiet(self):
+        """Test that flipping between unavailable and an error page never alerts."""
+        self.feed(*[UNAVAILABLE, UNKNOWN, UNAVAILABLE, ERROR, ERROR, UNAVAILABLE] * 5)
+        self.notify.assert_not_called()
+        self.assertEqual(self.machine.get(TARGET), UNAVAILABLE)
+
+    def test_noisy_state_confirmed(self):
+        """Test that a page that stays unrecognised alerts once, after its confirmation polls."""
+        transitions = self.feed(UNKNOWN, UNKNOWN, UNKNOWN)
+        self.assertEqual([t is not None for t in transitions], [False, True, False])
+        self.notify.assert_called_once_with(UNEXPECTED_STATUS)
+
+    def test_errors_never_email(self):
+        """Test that an outage is reported but not emailed, and recovery is silent too."""
+        transitions = self.feed(ERROR, ERROR, ERROR, UNAVAILABLE)
+        self.assertEqual((transitions[2].new, transitions[3].new), (ERROR, UNAVAILABLE))
+        self.notify.assert_not_called()
+
+    def test_live_to_live_not_realerted(self):
+        """Test that the login redirect giving way to the form isn't a second go-live alert."""
+        self.feed(LIVE_LOGIN, LIVE_FORM)
+        self.notify.assert_called_once_with(STATUS_MESSAGES[LIVE_LOGIN])
+        self.assertEqual(self.machine.get(TARGET), LIVE_FORM)
+
+    def test_configured_hysteresis(self):
+        """Test WRB_HYSTERESIS overrides, and that a live state can be made to need confirming."""
+        hysteresis = parse_hysteresis("LIVE_LOGIN=2, ERROR=1")
+        self.assertEqual((hysteresis[ERROR], hysteresis[WRONG_YEAR]), (1, 2))
+        machine = StateMachine(hysteresis=hysteresis)
+        self.feed(LIVE_LOGIN, UNAVAILABLE, LIVE_LOGIN, machine=machine)
+        self.notify.assert_not_called()
+        with self.assertRaises(ValueError):
+            parse_hysteresis("DOWN=3")
+
+
+class TestPersistenceAndActions(MachineTestCase):
+    """Tests for state surviving restarts and transition-specific actions."""
+
+    def test_state_survives_restart(self):
+        """Test that cron runs, each a new process, share the stable state and pending counts."""
+        self.feed(LIVE_LOGIN)
+        self.feed(LIVE_LOGIN, machine=StateMachine(self.path))
+        self.feed(UNKNOWN, machine=StateMachine(self.path))
+        self.feed(UNKNOWN, machine=StateMachine(self.path))
+        self.assertEqual(self.notify.call_count, 2)
+        self.assertEqual(StateMachine(self.path).get(TARGET), UNKNOWN)
+
+    def test_failed_alert_retried(self):
+        """Test that a transition whose alert failed is retried next poll, then not repeated."""
+        self.notify.side_effect = [OSError("SMTP down"), None]
+        with self.assertRaises(OSError):
+            self.feed(LIVE_FORM)
+        self.assertEqual(StateMachine(self.path).get(TARGET), UNAVAILABLE)
+        self.feed(LIVE_FORM, LIVE_FORM)
+        self.assertEqual(self.notify.call_count, 2)
+        self.assertEqual(self.machine.get(TARGET), LIVE_FORM)
+
+    def test_custom_actions(self):
+        """Test that actions match on either end of the transition, with tuples and wildcards."""
+        seen = []
+        machine = StateMachine(actions=[
+            (UNAVAILABLE, "*", lambda t: seen.append(("left unavailable", t.new))),
+            ((LIVE_LOGIN, LIVE_FORM), UNAVAILABLE, lambda t: seen.append(("closed again", t.old))),
+        ])
+        self.feed(LIVE_FORM, UNAVAILABLE, machine=machine)
+        self.assertEqual(seen, [("left unavailable", LIVE_FORM), ("closed again", LIVE_FORM)])
+
+    def test_state_of(self):
+        """Test that fetch failures and unplaced 5xx pages count as ERROR."""
+        self.assertEqual(state_of(CheckResult(ERROR, error="ConnectionError")), ERROR)
+        self.assertEqual(state_of(CheckResult(UNKNOWN, status_code=503)), ERROR)
+        self.assertEqual(state_of(CheckResult(UNAVAILABLE, status_code=503)), UNAVAILABLE)
+        self.assertEqual(state_of(CheckResult(UNKNOWN, status_code=200)), UNKNOWN)
+
+
+class TestCheckPageStateful(MachineTestCase):
+    """Tests for check_page() with WRB_STATE_FILE set."""
+
+    def setUp(self):
+        super().setUp()
+        self.site = WRBStandIn().start()
+        self.addCleanup(self.site.stop)
+        settings = patch.multiple(check_wrb2526, URL=self.site.url, STATE_FILE=self.path)
+        settings.start()
+        self.addCleanup(settings.stop)
+        machine = patch.object(state_machine, "_machine", StateMachine(self.path))
+        machine.start()
+        self.addCleanup(machine.stop)
+
+    def test_flapping_site_alerts_once_on_go_live(self):
+        """Test a site that errors intermittently, then goes live."""
+        for status in (200, 500, 200, 502, 200):
+            self.site.pages.clear()
+            if status >= 500:
+                self.site.serve("/WRB2526/", "<html><body>Server Error</body></html>", status=status)
+            check_wrb2526.check_page()
+        self.notify.assert_not_called()
+        self.site.pages.clear()
+        self.site.live = True
+        self.assertEqual(check_wrb2526.check_page().state, LIVE_LOGIN)
+        check_wrb2526.check_page()
+        self.notify.assert_called_once_with(STATUS_MESSAGES[LIVE_LOGIN])
+
+    def test_fetch_failure_is_error_state(self):
+        """Test that a failed fetch is recorded as ERROR instead of raising."""
+        with patch('check_wrb2526.fetch', side_effect=requests.ConnectionError("refused")):
+            result = check_wrb2526.check_page()
+        self.assertEqual((result.state, result.error), (ERROR, "ConnectionError: refused"))
+        self.assertEqual(state_machine._machine.targets[self.site.url].candidate, ERROR)
+
+    def test_stateless_default_still_raises(self):
+        """Test that without a state file, fetch errors propagate as before."""
+        with patch.object(check_wrb2526, "STATE_FILE", None), \
+             patch('check_wrb2526.fetch', side_effect=requests.ConnectionError("refused")), \
+             self.assertRaises(requests.ConnectionError):
+            check_wrb2526.check_page()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
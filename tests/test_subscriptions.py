@@ -0,0 +1,233 @@
+import unittest
+from unittest.mock import Mock, patch
+import asyncio
+import os
+import threading
+import sys
+import tempfile
+from datetime import date
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+import check_wrb2526
+from notifiers import NotificationError
+from state_machine import StateMachine
+from subscriptions import CANCELLATION, Fanout, Registry, SubscribedMonitor, deliver
+from targets import APPEARED, CHANGED, LIVE, SiteProfile
+from tests.stand_ins import PushStandIn, WRBStandIn
+from watchlist import Watch, Watchlist
+
+URL = "https://abs.warwick.ac.uk/WRB2526/"
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "subscriptions.sqlite3")
+        self.registry = Registry(self.path)
+        self.addCleanup(self.registry.close)
+        quiet = patch('builtins.print')
+        quiet.start()
+        self.addCleanup(quiet.stop)
+
+
+class TestRegistry(RegistryTestCase):
+    """Tests for storing and resolving subscriptions."""
+
+    def test_resolves_exact_site_and_wildcard(self):
+        """Test that an event reaches URL, site-name and wildcard subscribers, and no one else."""
+        self.registry.subscribe("chess", URL, LIVE, "chess@example.com")
+        self.registry.subscribe("drama", "warwick", "*", "drama@example.com")
+        self.registry.subscribe("admin", "*", CHANGED, "ntfy:https://ntfy.sh/wrb-admin")
+        self.registry.subscribe("chess", "https://other.example.ac.uk/WRB2526/", LIVE, "chess-other@example.com")
+        self.assertEqual(self.registry.recipients(LIVE, URL, "warwick"), ["chess@example.com", "drama@example.com"])
+        self.assertEqual(self.registry.recipients(CHANGED, URL, "warwick"),
+                         ["drama@example.com", "ntfy:https://ntfy.sh/wrb-admin"])
+        self.assertEqual(self.registry.recipients(APPEARED, "https://x/WRB2627/", "x"), [])
+
+    def test_recipient_shared_by_tenants_alerted_once(self):
+        """Test that one address in two tenants is one recipient, and subscribing twice is one row."""
+        self.registry.subscribe("chess", URL, LIVE, "shared@example.com")
+        self.registry.subscribe("drama", URL, "*", "shared@example.com")
+        self.registry.subscribe("drama", URL, "*", "shared@example.com")
+        self.assertEqual(len(self.registry), 2)
+        self.assertEqual(self.registry.recipients(LIVE, URL), ["shared@example.com"])
+
+    def test_row_added_by_another_process_meanwhile(self):
+        """Test that subscribing to a row another process added after the last refresh returns that row."""
+        with Registry(self.path) as other:
+            added = other.subscribe("chess", URL, LIVE, "chess@example.com")
+        with patch.object(self.registry, "refresh"):       # The index hasn't seen it yet
+            subscription = self.registry.subscribe("chess", URL, LIVE, "chess@example.com")
+        self.assertEqual(subscription.id, added.id)
+        self.assertEqual(len(self.registry), 1)
+
+    def test_changes_from_another_process(self):
+        """Test that subscriptions persist, and another connection's changes are picked up on refresh."""
+        self.registry.subscribe("chess", URL, LIVE, "chess@example.com")
+        with Registry(self.path) as other:
+            self.assertEqual(other.recipients(LIVE, URL), ["chess@example.com"])
+            other.subscribe("drama", URL, LIVE, "drama@example.com")
+        self.assertFalse(self.registry.watched("warwick"))
+        self.assertTrue(self.registry.refresh())
+        self.assertFalse(self.registry.refresh())
+        self.assertEqual(self.registry.recipients(LIVE, URL), ["chess@example.com", "drama@example.com"])
+
+    def test_unsubscribe_and_remove_tenant(self):
+        """Test removing one subscription, then a whole tenant."""
+        self.registry.subscribe("chess", URL, LIVE, "a@example.com")
+        self.registry.subscribe("chess", URL, CHANGED, "a@example.com")
+        self.registry.subscribe("chess", "OC0.01", CANCELLATION, "b@example.com")
+        self.registry.subscribe("drama", "OC0.02", CANCELLATION, "c@example.com")
+        self.assertEqual(self.registry.rooms(), ["OC0.01", "OC0.02"])
+        self.assertEqual(self.registry.unsubscribe("chess", event=CHANGED), 1)
+        self.assertEqual(self.registry.recipients(CHANGED, URL), [])
+        self.assertEqual(self.registry.remove_tenant("chess"), 2)
+        self.assertEqual((self.registry.tenants(), self.registry.rooms()), (["drama"], ["OC0.02"]))
+        with self.assertRaises(ValueError):
+            self.registry.subscribe("drama", URL, "opened", "c@example.com")
+
+
+class TestFanout(RegistryTestCase):
+    """Tests for sending one event to every subscriber."""
+
+    def test_deliver_routes_by_recipient(self):
+        """Test that addresses go by email, to that address, and anything else is a notification channel."""
+        with patch('check_wrb2526.send_email') as send_email, \
+             patch('notifiers.notify_channels_async') as notify_channels:
+            for recipient in ("chess@example.com", "email:drama@example.com", "ntfy:https://ntfy.sh/wrb"):
+                asyncio.run(deliver(recipient, "Booking form detected", "Subject", "Body"))
+        self.assertEqual([c.kwargs["to"] for c in send_email.call_args_list], ["chess@example.com", "drama@example.com"])
+        notify_channels.assert_called_once_with("Booking form detected", "ntfy:https://ntfy.sh/wrb",
+                                                subject="Subject", body="Body")
+
+    def test_failed_recipient_does_not_stop_the_rest(self):
+        """Test that one bad recipient is skipped, and only a total failure raises."""
+        for recipient in ("a@example.com", "b@example.com", "c@example.com"):
+            self.registry.subscribe("chess", URL, LIVE, recipient)
+        sent = []
+
+        def send(recipient, *args, **kwargs):
+            if recipient == "b@example.com":
+                raise OSError("mailbox full")
+            sent.append(recipient)
+        self.assertEqual(asyncio.run(Fanout(self.registry, send).send(LIVE, (URL,), "live", "s", "b")), 2)
+        self.assertEqual(sent, ["a@example.com", "c@example.com"])
+        with self.assertRaises(NotificationError):
+            asyncio.run(Fanout(self.registry, lambda *a, **k: 1 / 0).send(LIVE, (URL,), "live", "s", "b"))
+        self.assertEqual(asyncio.run(Fanout(self.registry, send).send(LIVE, ("https://x/",), "live", "s", "b")), 0)
+
+    def test_cancellations_routed_by_room(self):
+        """Test that a freed slot alerts only that room's subscribers."""
+        self.registry.subscribe("chess", "OC0.01", CANCELLATION, "chess@example.com")
+        self.registry.subscribe("drama", "OC0.02", CANCELLATION, "drama@example.com")
+        watchlist = Watchlist([Watch("OC0.01", "Mon", "09:00", "10:00", 1),
+                               Watch("OC0.02", "Mon", "09:00", "10:00", 1)])
+        booked, free = [0b11111] + [0] * 6, [0] * 7
+        sent = []
+        fanout = Fanout(self.registry, lambda recipient, status, *a, **k: sent.append((recipient, status)))
+        freed = asyncio.run(fanout.cancellations(watchlist, [("OC0.01", 1, booked, free), ("OC0.02", 1, free, free)]))
+        self.assertEqual(len(freed), 1)
+        self.assertEqual(sent, [("chess@example.com", "Slot free: OC0.01 Mon 09:00-10:00 (term 1, week 1)")])
+
+
+@unittest.skipIf(httpx is None, "httpx not installed")
+class TestSubscribedMonitor(RegistryTestCase):
+    """Tests for polling once per target on behalf of every tenant."""
+
+    def setUp(self):
+        super().setUp()
+        self.sites = [WRBStandIn().start(), WRBStandIn().start()]
+        for site in self.sites:
+            self.addCleanup(site.stop)
+            site.serve("/WRB2627/", "Not Found", status=404)
+        self.profiles = {name: SiteProfile(name, site.origin, title=name.title())
+                         for name, site in zip(("alpha", "beta"), self.sites)}
+        send_email = patch('check_wrb2526.send_email')
+        self.send_email = send_email.start()
+        self.addCleanup(send_email.stop)
+
+    def monitor(self):
+        return SubscribedMonitor(self.registry, self.profiles, StateMachine(), today=lambda: date(2025, 7, 1))
+
+    def test_shared_target_fetched_once(self):
+        """Test that three tenants watching one site cost one fetch a round, and other sites none."""
+        url = self.sites[0].url
+        for tenant in ("chess", "drama", "debate"):
+            self.registry.subscribe(tenant, url, LIVE, f"{tenant}@example.com")
+        monitor = self.monitor()
+        self.assertEqual(list(monitor.targets), [url])
+        monitor.poll()
+        self.sites[0].live = True
+        monitor.poll()
+        self.assertEqual(self.sites[0].count("GET", "/WRB2526/"), 2)
+        self.assertEqual(self.sites[1].count("GET", "/WRB2526/"), 0)
+        self.assertEqual(sorted(c.kwargs["to"] for c in self.send_email.call_args_list),
+                         ["chess@example.com", "debate@example.com", "drama@example.com"])
+        self.assertEqual(self.send_email.call_args.kwargs["subject"], "Alpha WRB 2025/26 is LIVE!")
+
+    def test_round_alerts_room_cancellations(self):
+        """Test that each round watches the subscribed rooms and sends freed slots to their subscribers."""
+        self.registry.subscribe("chess", "OC0.01", CANCELLATION, "chess@example.com")
+        watchlist = Watchlist([Watch("OC0.01", "Mon", "09:00", "10:00", 1)])
+        threads = []
+
+        def run_due():
+            threads.append(threading.current_thread())
+            return [("OC0.01", 1, [0b11111] + [0] * 6, [0] * 7)]
+        sync = Mock(watched={"OC0.02"})
+        sync.run_due.side_effect = run_due
+        monitor = SubscribedMonitor(self.registry, self.profiles, StateMachine(), sync=sync, watchlist=watchlist,
+                                    today=lambda: date(2025, 7, 1))
+        monitor.poll()
+        sync.watch.assert_called_once_with("OC0.01")
+        sync.unwatch.assert_called_once_with("OC0.02")
+        self.assertIsNot(threads[0], threading.main_thread())       # Timetable fetches stay off the event loop
+        self.send_email.assert_called_once()
+        self.assertEqual(self.send_email.call_args.kwargs["to"], "chess@example.com")
+
+    def test_channel_subscribers_alerted(self):
+        """Test that push subscribers are sent to from inside the monitor's event loop."""
+        url = self.sites[0].url
+        with PushStandIn() as push, patch('builtins.print'):
+            self.registry.subscribe("drama", url, LIVE, f"ntfy:{push.url('/drama')}")
+            self.registry.subscribe("chess", url, LIVE, f"webhook:{push.url('/chess')}")
+            monitor = self.monitor()
+            self.sites[0].live = True
+            monitor.run(rounds=1, interval=0)
+        self.assertEqual(sorted(path for _, path, _, _ in push.received), ["/chess", "/drama"])
+
+    def test_new_subscriber_picked_up_between_rounds(self):
+        """Test that a tenant added from another process is polled for from the next round."""
+        monitor = self.monitor()
+        self.assertEqual(monitor.poll(), [])
+        with Registry(self.path) as other:
+            other.subscribe("drama", "beta", LIVE, "drama@example.com")
+        self.sites[1].live = True
+        outcomes = monitor.poll()
+        self.assertEqual({target.url for target, _, _ in outcomes},        # Site name: next year's URL too
+                         {self.sites[1].url, self.sites[1].origin + "/WRB2627/"})
+        self.send_email.assert_called_once()
+        self.assertEqual(self.send_email.call_args.kwargs["to"], "drama@example.com")
+
+
+class TestSendEmailRecipient(unittest.TestCase):
+    """Tests for send_email() to a recipient other than TO_EMAIL."""
+
+    def test_to_overrides_setting(self):
+        with patch('check_wrb2526.smtp_connect') as connect, patch('builtins.print'):
+            check_wrb2526.send_email("Booking form detected", to="drama@example.com")
+        msg = connect.return_value.__enter__.return_value.send_message.call_args.args[0]
+        self.assertEqual(msg["To"], "drama@example.com")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
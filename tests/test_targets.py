@@ -0,0 +1,170 @@
+import unittest
+from unittest.mock import patch
+import json
+import os
+import sys
+import tempfile
+from datetime import date
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+import check_wrb2526
+from check_wrb2526 import (RULES, UNAVAILABLE, LIVE_FORM, LIVE_LOGIN, WRONG_YEAR, ERROR, RuleSet, explain,
+                           explain_markers)
+from page_events import scan_html
+from state_machine import StateMachine
+from targets import PROFILES, SiteProfile, TargetMonitor, discover, load_profiles
+from tests.stand_ins import PushStandIn, WRBStandIn
+
+FORM_2627 = "<html><body><h1>Web Room Booking System 2026/27</h1><form>Preferred Start</form></body></html>"
+FORM_2526 = "<html><body><h1>Web Room Booking System 2025/26</h1><form>Preferred Start</form></body></html>"
+
+
+class TestDiscovery(unittest.TestCase):
+    """Tests for deriving targets and rules from the date."""
+
+    def test_june_rollover(self):
+        """Test that the watched year moves on in June, with next year's URL probed speculatively."""
+        before = discover(PROFILES, date(2026, 5, 31))
+        after = discover(PROFILES, date(2026, 6, 1))
+        self.assertEqual([(t.url, t.speculative) for t in before],
+                         [("https://abs.warwick.ac.uk/WRB2526/", False), ("https://abs.warwick.ac.uk/WRB2627/", True)])
+        self.assertEqual([t.url for t in after], ["https://abs.warwick.ac.uk/WRB2627/",
+                                                  "https://abs.warwick.ac.uk/WRB2728/"])
+        self.assertEqual((after[0].rules.label, after[0].rules.previous), ("2026/27", "2025/26"))
+        self.assertEqual(after[0].title, "Warwick WRB 2026/27")
+
+    def test_century_wrap(self):
+        """Test two-digit years across a century boundary."""
+        self.assertEqual(discover(PROFILES, date(2099, 9, 1))[0].url, "https://abs.warwick.ac.uk/WRB9900/")
+        self.assertEqual(RuleSet(2099).label, "2099/00")
+
+    def test_rules_follow_the_year(self):
+        """Test that next year's rules treat this year's page as the wrong year, in both parse modes."""
+        rules = RuleSet(2026)
+        for page, expected in ((FORM_2627, LIVE_FORM), (FORM_2526, WRONG_YEAR)):
+            with self.subTest(page=page):
+                self.assertEqual(explain(page, "https://x/WRB2627/", rules)[0], expected)
+                self.assertEqual(explain_markers(scan_html(page), "https://x/WRB2627/", rules)[0], expected)
+        self.assertEqual(explain(FORM_2526, "https://x/WRB2526/")[0], LIVE_FORM)     # RULES is still 2025/26
+        self.assertEqual(RULES.label, "2025/26")
+
+    def test_site_profiles(self):
+        """Test a site with its own path layout and banner text, loaded from JSON."""
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump([{"name": "example", "title": "Example", "base_url": "https://rooms.example.ac.uk",
+                        "path": "booking/{year}/", "unavailable": "Service Unavailable",
+                        "login_markers": ["signin"]}], f)
+        self.addCleanup(os.unlink, f.name)
+        site = load_profiles(f.name)["example"]
+        target = discover({"example": site}, date(2025, 9, 1))[0]
+        self.assertEqual(target.url, "https://rooms.example.ac.uk/booking/2025/")
+        self.assertEqual(explain("<p>Service Unavailable</p>", target.url, target.rules)[0], UNAVAILABLE)
+        self.assertEqual(explain("", "https://rooms.example.ac.uk/signin?next=/", target.rules)[0], LIVE_LOGIN)
+
+
+@unittest.skipIf(httpx is None, "httpx not installed")
+class TestTargetMonitor(unittest.TestCase):
+    """Tests for polling several sites from one process."""
+
+    def setUp(self):
+        self.sites = [WRBStandIn().start(), WRBStandIn().start()]
+        for site in self.sites:
+            self.addCleanup(site.stop)
+            site.serve("/WRB2627/", "Not Found", status=404)
+        profiles = {name: SiteProfile(name, site.origin, title=name.title())
+                    for name, site in zip(("alpha", "beta"), self.sites)}
+        self.today = date(2025, 7, 1)
+        self.monitor = TargetMonitor(profiles, StateMachine(), speculative_every=5, today=lambda: self.today)
+        notify = patch('check_wrb2526.notify_async')
+        self.notify = notify.start()
+        self.addCleanup(notify.stop)
+        quiet = patch('builtins.print')
+        quiet.start()
+        self.addCleanup(quiet.stop)
+
+    def test_speculative_probes_are_rare(self):
+        """Test that this year's URLs are polled every round and next year's only every Nth."""
+        for _ in range(6):
+            self.monitor.poll()
+        for site in self.sites:
+            self.assertEqual((site.count("GET", "/WRB2526/"), site.count("GET", "/WRB2627/")), (6, 2))
+        self.notify.assert_not_called()
+
+    def test_each_site_alerts_once(self):
+        """Test that a site going live alerts once, naming the site and year."""
+        self.monitor.poll()
+        self.sites[1].live = True
+        for _ in range(3):
+            self.monitor.poll()
+        self.notify.assert_called_once()
+        self.assertEqual(self.notify.call_args.kwargs["subject"], "Beta WRB 2025/26 is LIVE!")
+        self.assertIn(self.sites[1].origin + "/WRB2526/", self.notify.call_args.kwargs["body"])
+
+    def test_next_year_appearing(self):
+        """Test that next year's system turning up alerts once and is then polled every round."""
+        self.monitor.poll()
+        self.sites[0].pages.clear()      # /WRB2627/ now serves the unavailable page
+        for _ in range(5):
+            self.monitor.poll()
+        self.notify.assert_called_once()
+        self.assertEqual(self.notify.call_args.kwargs["subject"], "Alpha WRB 2026/27 has appeared")
+        before = self.sites[0].count("GET", "/WRB2627/")
+        self.monitor.poll()
+        self.assertEqual(self.sites[0].count("GET", "/WRB2627/"), before + 1)
+        self.assertEqual(self.monitor.machine.get(self.sites[1].origin + "/WRB2627/"), ERROR)
+
+    def test_rollover_without_restart(self):
+        """Test that the monitor moves on to next year's URLs when the date passes the rollover."""
+        self.monitor.poll()
+        self.today = date(2026, 6, 1)
+        for site in self.sites:
+            site.serve("/WRB2728/", "Not Found", status=404)
+        self.sites[0].serve("/WRB2627/", FORM_2627)
+        outcomes = self.monitor.poll()      # Newly discovered speculative targets get a first probe at once
+        self.assertEqual({t.url.rsplit("/", 2)[1] for t, _, _ in outcomes}, {"WRB2627", "WRB2728"})
+        self.notify.assert_called_once()
+        self.assertEqual(self.notify.call_args.kwargs["subject"], "Alpha WRB 2026/27 is LIVE!")
+
+    def test_run_shares_one_client(self):
+        """Test that run() opens one HTTP client for all its rounds, and doesn't wait after the last."""
+        waits = []
+
+        async def sleep(seconds):
+            waits.append(seconds)
+        with patch('async_check.httpx.AsyncClient', wraps=httpx.AsyncClient) as client:
+            self.monitor.run(rounds=3, interval=0, sleep=sleep)
+        self.assertEqual(client.call_count, 1)
+        self.assertEqual((self.monitor.rounds, len(waits)), (3, 2))
+        for site in self.sites:
+            self.assertEqual(site.count("GET", "/WRB2526/"), 3)
+
+
+@unittest.skipIf(httpx is None, "httpx not installed")
+class TestTargetMonitorAlerts(unittest.TestCase):
+    """Tests for run() sending its alerts from inside the event loop."""
+
+    def test_go_live_pushed_from_run(self):
+        """Test that a go-live found by run() reaches a push channel, and email goes out too."""
+        with WRBStandIn(live=True) as site, PushStandIn() as push, \
+             patch.multiple(check_wrb2526, NOTIFY_CHANNELS=f"ntfy:{push.url('/t')},email"), \
+             patch('check_wrb2526.send_email') as mock_send_email, patch('builtins.print'):
+            site.serve("/WRB2627/", "Not Found", status=404)
+            monitor = TargetMonitor({"alpha": SiteProfile("alpha", site.origin, title="Alpha")}, StateMachine(),
+                                    today=lambda: date(2025, 7, 1))
+            monitor.run(rounds=1, interval=0)
+        (_, path, _, body), = push.received
+        self.assertEqual(path, "/t")
+        self.assertIn(site.url.encode(), body)
+        mock_send_email.assert_called_once()
+        self.assertEqual(monitor.machine.get(site.url), LIVE_LOGIN)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,224 @@
+import unittest
+from unittest.mock import Mock
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import Future
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timetable import parse_timetable, parse_packed, unpack_week, slot_mask, free_slots, DAY_MASK
+from timetable_sync import TimetableSync
+
+
+def grid(rows):
+    """Build a timetable page from {day: [(colspan, text), ...]}."""
+    body = "<tr><th></th><th colspan='28'>08:00 - 22:00</th></tr>"
+    for day, cells in rows.items():
+        body += f"<tr><td>{day}</td>"
+        body += "".join(f"<td colspan='{span}'>{text}</td>" for span, text in cells)
+        body += "</tr>"
+    return f"<html><body><table>{body}</table></body></html>"
+
+
+def response(status, text="", headers=None):
+    """Build a mock requests response."""
+    r = Mock()
+    r.status_code = status
+    r.text = text
+    r.content = text.encode()
+    r.encoding = "utf-8"
+    r.headers = headers or {}
+    return r
+
+
+class TestTimetableParser(unittest.TestCase):
+    """Tests for parsing the room timetable grid."""
+
+    def test_parse_bookings(self):
+        """Test that booked cells set the bits they span."""
+        week = parse_timetable(grid({
+            "Monday": [(2, ""), (4, "CS118 Lecture"), (22, "")],
+            "Wednesday": [(28, "Closed")],
+        }))
+        self.assertEqual(week[0], slot_mask("09:00", "11:00"))
+        self.assertEqual(week[1], 0)
+        self.assertEqual(week[2], DAY_MASK)
+
+    def test_free_slots(self):
+        """Test that free slots are the complement of bookings."""
+        week = parse_timetable(grid({"Tue": [(2, "Society"), (26, "")]}))
+        free = free_slots(week)
+        self.assertEqual(free[1], DAY_MASK & ~slot_mask("08:00", "09:00"))
+        self.assertEqual(free[0], DAY_MASK)
+
+    def test_header_rows_ignored(self):
+        """Test that non-day rows do not mark anything booked."""
+        week = parse_timetable(grid({}))
+        self.assertEqual(list(week), [0] * 7)
+
+    def test_packed_round_trip(self):
+        """Test that packed results are compact and unpack to the same week."""
+        page = grid({"Fri": [(6, "Booked"), (22, "")]})
+        packed = parse_packed(page.encode())
+        self.assertEqual(len(packed), 56)
+        self.assertEqual(unpack_week(packed), parse_timetable(page))
+
+
+class TestTimetableSync(unittest.TestCase):
+    """Tests for the incremental timetable sync."""
+
+    def setUp(self):
+        self.session = Mock()
+        self.page = grid({"Mon": [(4, "Booked"), (24, "")]})
+
+    def test_first_sync_parses_every_week(self):
+        """Test that the first pass fetches and parses every room-week."""
+        self.session.get.return_value = response(200, self.page, {"ETag": '"v1"'})
+        sync = TimetableSync(["OC0.01", "OC1.05"], [1, 2], session=self.session)
+
+        changes = sync.run_due(now=0)
+
+        self.assertEqual(len(changes), 4)
+        self.assertEqual(sync.stats["parsed"], 4)
+        self.assertIsNone(changes[0][2])
+
+    def test_not_modified_sends_validators(self):
+        """Test that later refreshes are conditional and 304s skip parsing."""
+        self.session.get.return_value = response(200, self.page, {"ETag": '"v1"'})
+        sync = TimetableSync(["OC0.01"], [1], session=self.session, interval=60)
+        sync.run_due(now=0)
+
+        self.session.get.return_value = response(304)
+        self.assertEqual(sync.run_due(now=60), [])
+
+        headers = self.session.get.call_args[1]["headers"]
+        self.assertEqual(headers["If-None-Match"], '"v1"')
+        self.assertEqual(sync.stats["not_modified"], 1)
+        self.assertEqual(sync.stats["parsed"], 1)
+
+    def test_same_body_not_reparsed(self):
+        """Test that a 200 with an unchanged body is not parsed again."""
+        self.session.get.return_value = response(200, self.page)
+        sync = TimetableSync(["OC0.01"], [1], session=self.session, interval=60)
+        sync.run_due(now=0)
+        sync.run_due(now=60)
+
+        self.assertEqual(sync.stats["unchanged"], 1)
+        self.assertEqual(sync.stats["parsed"], 1)
+
+    def test_rotated_validators_kept(self):
+        """Test that new validators on an unchanged page are sent next time."""
+        self.session.get.return_value = response(200, self.page, {"ETag": '"v1"'})
+        sync = TimetableSync(["OC0.01"], [1], session=self.session, interval=60)
+        sync.run_due(now=0)
+        self.session.get.return_value = response(200, self.page, {"ETag": '"v2"'})
+        sync.run_due(now=60)
+        sync.run_due(now=120)
+
+        self.assertEqual(self.session.get.call_args[1]["headers"]["If-None-Match"], '"v2"')
+        self.assertEqual(sync.stats["parsed"], 1)
+
+    def test_changed_week_reported(self):
+        """Test that a changed page yields the old and new bookings."""
+        self.session.get.return_value = response(200, self.page)
+        sync = TimetableSync(["OC0.01"], [1], session=self.session, interval=60)
+        sync.run_due(now=0)
+
+        self.session.get.return_value = response(200, grid({"Mon": [(28, "")]}))
+        (room, week, old, new), = sync.run_due(now=60)
+
+        self.assertEqual((room, week), ("OC0.01", 1))
+        self.assertEqual(old[0], slot_mask("08:00", "10:00"))
+        self.assertEqual(new[0], 0)
+
+    def test_watched_rooms_refreshed_more_often(self):
+        """Test that watched rooms come round before the rest of campus."""
+        self.session.get.return_value = response(304)
+        sync = TimetableSync(["A", "B"], [1], session=self.session,
+                             watched=["A"], watched_interval=60, interval=3600)
+        sync.run_due(now=0)
+        self.session.get.reset_mock()
+
+        sync.run_due(now=600)
+
+        self.assertEqual(self.session.get.call_count, 1)
+        self.assertIn("room=A", self.session.get.call_args[0][0])
+        self.assertEqual(sync.next_due(), 660)
+
+    def test_watch_pulls_room_forward(self):
+        """Test that watching a room schedules it immediately."""
+        self.session.get.return_value = response(304)
+        sync = TimetableSync(["A"], [1], session=self.session, interval=3600)
+        sync.run_due(now=0)
+        sync.watch("A", now=10)
+        self.assertEqual(sync.next_due(), 10)
+
+    def test_state_round_trip(self):
+        """Test that validators and hashes survive a restart."""
+        self.session.get.return_value = response(200, self.page, {"ETag": '"v1"'})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sync.json")
+            TimetableSync(["OC0.01"], [1], session=self.session, state_file=path).run_due(now=0)
+
+            restored = TimetableSync(["OC0.01"], [1], session=self.session, state_file=path)
+            self.assertEqual(restored.run_due(now=0), [])
+            self.assertEqual(restored.stats["unchanged"], 1)
+
+
+class TestPipelinedSync(unittest.TestCase):
+    """Tests for fetching on threads and parsing on a process pool."""
+
+    def setUp(self):
+        self.rooms = [f"R{i}" for i in range(12)]
+        self.session = Mock()
+        self.session.get.side_effect = lambda url, **kwargs: response(
+            200, grid({"Thu": [(int(url.split("room=R")[1].split("&")[0]) + 1, "Booked"), (1, "")]}))
+
+    def test_matches_inline_parsing(self):
+        """Test that the process pool yields exactly what inline parsing does."""
+        inline = TimetableSync(self.rooms, [1, 2], session=self.session).run_due(now=0)
+
+        sync = TimetableSync(self.rooms, [1, 2], session=self.session, workers=2, queue_size=2)
+        self.addCleanup(sync.close)
+        pipelined = sync.run_due(now=0)
+
+        self.assertEqual(sorted((r, w, list(new)) for r, w, _, new in pipelined),
+                         sorted((r, w, list(new)) for r, w, _, new in inline))
+        self.assertEqual(sync.stats["parsed"], 24)
+
+    def test_unchanged_pages_skip_the_pool(self):
+        """Test that only changed pages are sent to the parser processes."""
+        sync = TimetableSync(self.rooms, [1], session=self.session, workers=2, interval=60)
+        self.addCleanup(sync.close)
+        sync.run_due(now=0)
+        self.assertEqual(sync.run_due(now=60), [])
+        self.assertEqual(sync.stats["unchanged"], 12)
+        self.assertEqual(sync.stats["parsed"], 12)
+
+    def test_downloads_bounded_by_queue(self):
+        """Test that while the parser side is stalled, only ``queue_size`` more pages are downloaded."""
+        session = self.session
+        fetched_while_stalled = []
+
+        class StalledPool:
+            def submit(self, fn, *args):
+                if not fetched_while_stalled:
+                    time.sleep(0.2)
+                    fetched_while_stalled.append(session.get.call_count)
+                future = Future()
+                future.set_result(fn(*args))
+                return future
+
+        sync = TimetableSync(self.rooms, [1], session=session, workers=2, queue_size=2)
+        sync._pool = StalledPool()
+        changes = sync.run_due(now=0)
+
+        self.assertEqual(len(changes), 12)
+        self.assertEqual(fetched_while_stalled, [3])       # The page being parsed, and two more
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
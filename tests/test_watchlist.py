@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import patch, Mock
+import json
+import os
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timetable import empty_week, slot_mask
+from watchlist import Watch, Watchlist, load_watchlist
+
+WED = 2
+
+
+def week_with(day, start, end):
+    """Return a week with one booking."""
+    week = empty_week()
+    week[day] = slot_mask(start, end)
+    return week
+
+
+class TestWatchlist(unittest.TestCase):
+    """Tests for cancellation watchlists."""
+
+    def setUp(self):
+        self.watch = Watch("OC0.01", "Wed", "18:00", "20:00", 1)
+        self.watchlist = Watchlist([self.watch])
+
+    def test_cancellation_fires(self):
+        """Test that a watched range turning free raises an alert."""
+        old = week_with(WED, "18:00", "20:00")
+        freed = self.watchlist.evaluate([("OC0.01", 3, old, empty_week())])
+        self.assertEqual(freed, [(self.watch, 3)])
+
+    def test_rooms_and_weeks_to_sync(self):
+        """Test that the rooms and weeks a TimetableSync needs come from the watches."""
+        self.watchlist.add(Watch("OC1.05", "Mon", "09:00", "10:00", 2))
+        self.assertEqual(self.watchlist.rooms(), ["OC0.01", "OC1.05"])
+        self.assertEqual(self.watchlist.weeks(), list(range(1, 11)) + list(range(15, 25)))
+
+    def test_partial_cancellation_does_not_fire(self):
+        """Test that the whole range must be free."""
+        old = week_with(WED, "18:00", "20:00")
+        new = week_with(WED, "19:00", "20:00")
+        self.assertEqual(self.watchlist.evaluate([("OC0.01", 3, old, new)]), [])
+
+    def test_other_term_ignored(self):
+        """Test that weeks outside the watched term are ignored."""
+        old = week_with(WED, "18:00", "20:00")
+        self.assertEqual(self.watchlist.evaluate([("OC0.01", 16, old, empty_week())]), [])
+
+    def test_first_sight_does_not_fire(self):
+        """Test that the first sync of a week is only a baseline."""
+        self.assertEqual(self.watchlist.evaluate([("OC0.01", 3, None, empty_week())]), [])
+
+    def test_unchanged_days_skip_index(self):
+        """Test that only changed weekday words are looked up."""
+        old = week_with(0, "09:00", "10:00")
+        with patch.object(self.watchlist, "_index", Mock(wraps=self.watchlist._index)) as index:
+            self.watchlist.evaluate([("OC0.01", 3, old, empty_week())])
+            index.get.assert_called_once_with(("OC0.01", 0), ())
+
+    def test_process_sends_email(self):
+        """Test that freed slots go out through send_email."""
+        old = week_with(WED, "18:00", "20:00")
+        with patch("check_wrb2526.send_email") as mock_send_email:
+            self.watchlist.process([("OC0.01", 3, old, empty_week())])
+        mock_send_email.assert_called_once()
+        self.assertIn("OC0.01 Wed 18:00-20:00", mock_send_email.call_args[0][0])
+
+    def test_load_watchlist(self):
+        """Test loading watches from JSON."""
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump([{"room": "OC0.01", "day": "Wednesday", "start": "18:00", "end": "20:00", "term": 2}], f)
+        try:
+            watchlist = load_watchlist(f.name)
+        finally:
+            os.unlink(f.name)
+        self.assertEqual(watchlist.size, 1)
+        old = week_with(WED, "18:00", "19:00")
+        self.assertEqual(len(watchlist.evaluate([("OC0.01", 15, old, empty_week())])), 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -10,7 +10,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from unittest.mock import patch, Mock
 from check_wrb2526 import check_page, URL
-from test_scenarios import TEST_SCENARIOS
+from tests.scenarios import TEST_SCENARIOS
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -0,0 +1,126 @@
+"""
+Room timetable parsing for the Warwick Web Room Booking System.
+
+The WRB room view renders one week as a grid: one table row per weekday, the
+first cell holding the day label and each further cell spanning ``colspan``
+half-hour slots from 08:00. A cell with any text in it is a booking; an empty
+cell is free time.
+
+A parsed week is stored as one 64-bit word per weekday (``array('Q')``), with
+bit ``i`` set when slot ``i`` of that day is booked. Words are compact to keep
+and cheap to diff.
+"""
+
+from array import array
+from html.parser import HTMLParser
+
+DAY_START = 8 * 60      # Minutes after midnight of the first slot (08:00)
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 28      # 08:00 - 22:00
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+
+# Warwick teaching weeks for each term
+TERMS = {
+    1: range(1, 11),
+    2: range(15, 25),
+    3: range(30, 40),
+}
+
+
+def empty_week() -> array:
+    """Return a week with nothing booked."""
+    return array("Q", bytes(8 * len(DAYS)))
+
+
+def slot_index(hhmm: str) -> int:
+    """Convert an 'HH:MM' time to a slot index within the day."""
+    hours, minutes = hhmm.split(":")
+    return (int(hours) * 60 + int(minutes) - DAY_START) // SLOT_MINUTES
+
+
+def slot_mask(start: str, end: str) -> int:
+    """Return the bit mask covering the slots in [start, end)."""
+    first = max(slot_index(start), 0)
+    last = min(slot_index(end), SLOTS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def free_slots(booked: array) -> array:
+    """Invert a week of booked words into a week of free words."""
+    return array("Q", (~word & DAY_MASK for word in booked))
+
+
+class _GridParser(HTMLParser):
+    """Collect booked slot bits from the timetable grid."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.week = empty_week()
+        self._day = None        # Weekday index of the current row
+        self._slot = 0          # Next free slot position in the current row
+        self._cell = None       # [first slot, span, booked, label] of open cell
+        self._first_cell = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._day = None
+            self._slot = 0
+            self._first_cell = True
+        elif tag in ("td", "th"):
+            span = 1
+            for name, value in attrs:
+                if name == "colspan" and value and value.isdigit():
+                    span = int(value)
+            self._cell = [self._slot, span, False, ""]
+
+    def handle_data(self, data):
+        if self._cell is None:
+            return
+        if self._first_cell:
+            self._cell[3] += data
+        elif data.strip():
+            self._cell[2] = True
+
+    def handle_endtag(self, tag):
+        if tag not in ("td", "th") or self._cell is None:
+            return
+        first, span, booked, label = self._cell
+        self._cell = None
+        if self._first_cell:
+            # The first cell labels the row; rows that aren't days are skipped
+            self._first_cell = False
+            label = label.strip()[:3].title()
+            self._day = DAYS.index(label) if label in DAYS else None
+            return
+        if self._day is not None and booked and first < SLOTS_PER_DAY:
+            bits = ((1 << span) - 1) << first
+            self.week[self._day] |= bits & DAY_MASK
+        self._slot = first + span
+
+
+def parse_timetable(html: str) -> array:
+    """Parse a room timetable page into a week of booked-slot words."""
+    parser = _GridParser()
+    parser.feed(html)
+    parser.close()
+    return parser.week
+
+
+def parse_packed(body: bytes, encoding: str = "utf-8") -> bytes:
+    """
+    Parse a raw timetable page into packed words.
+
+    This is the process-pool entry point: bytes in, 56 bytes out, so almost
+    nothing has to be pickled between processes.
+    """
+    return parse_timetable(body.decode(encoding, errors="replace")).tobytes()
+
+
+def unpack_week(packed: bytes) -> array:
+    """Turn the output of parse_packed() back into a week of words."""
+    week = array("Q")
+    week.frombytes(packed)
+    return week
@@ -0,0 +1,326 @@
+"""
+Incremental delta sync of WRB room timetables.
+
+Every (room, week) page keeps its HTTP validators (ETag / Last-Modified) and a
+content hash. Refreshes send conditional requests, so an unchanged page costs a
+304 with no body, and a 200 whose body hashes the same as last time is not
+re-parsed. Refreshes are driven by a priority queue keyed on the next due time:
+watched rooms come round every few minutes, the rest of campus much less often.
+
+With ``workers`` set, a full-campus pass is pipelined: pages are fetched on a
+thread pool and parsed on a process pool, so parse time scales with cores and
+never stalls the caller's loop. Parsed weeks cross the process boundary as
+56 packed bytes.
+"""
+
+import heapq
+import json
+import os
+import queue
+import threading
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import requests
+
+from check_wrb2526 import content_hash
+from timetable import parse_packed, unpack_week
+
+TIMETABLE_URL = "https://abs.warwick.ac.uk/WRB2526/RoomTimetable.aspx?room={room}&week={week}"
+WATCHED_INTERVAL = 120      # Seconds between refreshes of a watched room
+DEFAULT_INTERVAL = 3600     # Seconds between refreshes of every other room
+REQUEST_TIMEOUT = 30
+FETCHERS = 8                # Concurrent fetches when pipelining
+QUEUE_SIZE = 64             # Pages allowed to be downloading or waiting for a parser
+
+
+class WeekEntry:
+    """Sync state for one room's timetable in one week."""
+
+    __slots__ = ("etag", "last_modified", "hash", "booked", "checked_at")
+
+    def __init__(self, etag=None, last_modified=None, hash=None, booked=None, checked_at=0.0):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.hash = hash
+        self.booked = booked
+        self.checked_at = checked_at
+
+
+class TimetableSync:
+    """Keep room timetables fresh with as few requests as possible."""
+
+    def __init__(self, rooms, weeks, url_template=TIMETABLE_URL, session=None,
+                 watched=(), watched_interval=WATCHED_INTERVAL,
+                 interval=DEFAULT_INTERVAL, state_file=None, workers=0,
+                 fetchers=FETCHERS, queue_size=QUEUE_SIZE):
+        self.url_template = url_template
+        self.session = session or requests.Session()
+        self.watched = set(watched)
+        self.watched_interval = watched_interval
+        self.interval = interval
+        self.state_file = state_file
+        self.workers = workers
+        self.fetchers = fetchers
+        self.queue_size = queue_size
+        self.entries = {}
+        self.stats = {"requests": 0, "not_modified": 0, "unchanged": 0, "parsed": 0, "errors": 0}
+        self._queue = []
+        self._due = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._pool = None
+
+        if state_file and os.path.exists(state_file):
+            self.load(state_file)
+        for room in rooms:
+            for week in weeks:
+                self.entries.setdefault((room, week), WeekEntry())
+                self._schedule((room, week), 0.0)
+
+    def _schedule(self, key, due):
+        """Queue a refresh of one (room, week) at the given time."""
+        self._due[key] = due
+        self._seq += 1
+        heapq.heappush(self._queue, (due, self._seq, key))
+
+    def interval_for(self, room) -> float:
+        """Return how often a room should be refreshed."""
+        return self.watched_interval if room in self.watched else self.interval
+
+    def watch(self, room, now=None):
+        """Start refreshing a room at the watched rate, beginning now."""
+        self.watched.add(room)
+        now = time.time() if now is None else now
+        for key in self.entries:
+            if key[0] == room and self._due.get(key, now) > now:
+                self._schedule(key, now)
+
+    def unwatch(self, room):
+        """Drop a room back to the default refresh rate."""
+        self.watched.discard(room)
+
+    def next_due(self):
+        """Return the time of the next scheduled refresh, or None."""
+        while self._queue:
+            due, _, key = self._queue[0]
+            if self._due.get(key) == due:
+                return due
+            heapq.heappop(self._queue)
+        return None
+
+    def _take_due(self, now, limit):
+        """Pop every (room, week) that is due and reschedule it."""
+        keys = []
+        while self._queue and (limit is None or len(keys) < limit):
+            due, _, key = self._queue[0]
+            if self._due.get(key) != due:
+                heapq.heappop(self._queue)      # Superseded by a reschedule
+                continue
+            if due > now:
+                break
+            heapq.heappop(self._queue)
+            self._schedule(key, now + self.interval_for(key[0]))
+            keys.append(key)
+        return keys
+
+    def run_due(self, now=None, limit=None) -> list:
+        """
+        Refresh every (room, week) that is due.
+
+        Returns a list of ``(room, week, old, new)`` for weeks whose parsed
+        bookings changed; ``old`` is None the first time a week is seen.
+        """
+        now = time.time() if now is None else now
+        keys = self._take_due(now, limit)
+        if self.workers:
+            changes = self._run_pipelined(keys, now)
+        else:
+            changes = [change for change in (self.refresh(*key, now=now) for key in keys) if change]
+        if self.state_file:
+            self.save(self.state_file)
+        return changes
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _fetch(self, key, entry):
+        """Make a conditional request for one (room, week) page."""
+        room, week = key
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        url = self.url_template.format(room=requests.utils.quote(str(room)), week=week)
+        self._count("requests")
+        return self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+    def _download(self, key, now=None):
+        """
+        Fetch one (room, week) and return the work left for the parser.
+
+        Returns None when there is nothing to parse (304, same hash or an
+        error), otherwise ``(key, hash, body, encoding, etag, last_modified)``.
+        """
+        entry = self.entries.setdefault(key, WeekEntry())
+        try:
+            r = self._fetch(key, entry)
+        except requests.RequestException as e:
+            print(f"⚠️  Timetable fetch failed for {key[0]} week {key[1]}: {e}")
+            self._count("errors")
+            return None
+        entry.checked_at = time.time() if now is None else now
+
+        if r.status_code == 304:
+            self._count("not_modified")
+            return None
+        if r.status_code != 200:
+            self._count("errors")
+            return None
+
+        body = r.content
+        body_hash = content_hash(body)
+        if body_hash == entry.hash:
+            self._count("unchanged")
+            # Same page under new validators: keep them, or the server can never answer 304 again
+            entry.etag = r.headers.get("ETag") or entry.etag
+            entry.last_modified = r.headers.get("Last-Modified") or entry.last_modified
+            return None
+        return (key, body_hash, body, r.encoding or "utf-8",
+                r.headers.get("ETag"), r.headers.get("Last-Modified"))
+
+    def refresh(self, room, week, now=None):
+        """Refresh a single (room, week); return a change tuple or None."""
+        work = self._download((room, week), now)
+        if work is None:
+            return None
+        key, body_hash, body, encoding, etag, last_modified = work
+        return self._apply(key, body_hash, unpack_week(parse_packed(body, encoding)), etag, last_modified)
+
+    def _run_pipelined(self, keys, now):
+        """
+        Fetch on a thread pool and parse on a process pool, joined by a bounded queue.
+
+        A download is only started once one of ``queue_size`` slots is free,
+        and its slot is given back when the parser side takes the page (or the
+        download turns out to need no parsing). So at most ``queue_size`` pages
+        are downloading or waiting to be parsed, and ``2 * workers`` are being
+        parsed, however many rooms and weeks there are.
+        """
+        pages = queue.Queue(maxsize=self.queue_size)
+        slots = threading.BoundedSemaphore(self.queue_size)
+        done = object()
+
+        def fetch(key):
+            try:
+                work = self._download(key, now)
+            except BaseException:
+                slots.release()
+                raise
+            if work is None:
+                slots.release()     # Nothing to parse
+            else:
+                pages.put(work)
+
+        def fetch_all():
+            try:
+                with ThreadPoolExecutor(max_workers=self.fetchers) as fetchers:
+                    futures = []
+                    for key in keys:
+                        slots.acquire()
+                        futures.append(fetchers.submit(fetch, key))
+                for future in futures:
+                    future.result()
+            finally:
+                pages.put(done)
+
+        feeder = threading.Thread(target=fetch_all, name="timetable-fetch", daemon=True)
+        feeder.start()
+
+        pool = self._parser_pool()
+        changes = []
+        in_flight = {}
+
+        def collect(futures):
+            for future in futures:
+                key, body_hash, etag, last_modified = in_flight.pop(future)
+                try:
+                    booked = unpack_week(future.result())
+                except Exception as e:
+                    print(f"⚠️  Timetable parse failed for {key[0]} week {key[1]}: {e}")
+                    self._count("errors")
+                    continue
+                change = self._apply(key, body_hash, booked, etag, last_modified)
+                if change:
+                    changes.append(change)
+
+        while True:
+            work = pages.get()
+            if work is done:
+                break
+            slots.release()
+            key, body_hash, body, encoding, etag, last_modified = work
+            in_flight[pool.submit(parse_packed, body, encoding)] = (key, body_hash, etag, last_modified)
+            if len(in_flight) >= 2 * self.workers:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+        collect(list(in_flight))
+        feeder.join()
+        return changes
+
+    def _parser_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close(self):
+        """Shut down the parser processes."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _apply(self, key, body_hash, booked, etag=None, last_modified=None):
+        """Store a freshly parsed week; return a change tuple if bookings moved."""
+        entry = self.entries[key]
+        self._count("parsed")
+        old = entry.booked
+        entry.hash = body_hash
+        entry.booked = booked
+        entry.etag = etag or entry.etag
+        entry.last_modified = last_modified or entry.last_modified
+        if old == booked:
+            return None
+        return (key[0], key[1], old, booked)
+
+    def save(self, path):
+        """Persist validators, hashes and parsed weeks to a JSON file."""
+        data = {}
+        for (room, week), entry in self.entries.items():
+            if entry.hash is None:
+                continue
+            data[f"{room}|{week}"] = {
+                "etag": entry.etag,
+                "last_modified": entry.last_modified,
+                "hash": entry.hash,
+                "booked": list(entry.booked),
+            }
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """Restore state written by save()."""
+        with open(path) as f:
+            data = json.load(f)
+        for name, item in data.items():
+            room, week = name.rsplit("|", 1)
+            self.entries[(room, int(week))] = WeekEntry(
+                etag=item["etag"],
+                last_modified=item["last_modified"],
+                hash=item["hash"],
+                booked=array("Q", item["booked"]),
+            )
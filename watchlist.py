@@ -0,0 +1,106 @@
+"""
+Cancellation watchlists for room timetables.
+
+A watch names a room, a weekday, a time range and a term. After each timetable
+sync the changed weeks are diffed word by word: only weekdays whose booked word
+actually changed are looked at, and only the watches indexed on that
+(room, weekday) are tested. A watch fires when its whole range goes from
+(partly) booked to free.
+"""
+
+import json
+from collections import defaultdict
+
+from timetable import DAYS, TERMS, slot_mask
+
+
+class Watch:
+    """A room, weekday and time range to watch for cancellations."""
+
+    __slots__ = ("room", "day", "start", "end", "term", "mask", "weeks")
+
+    def __init__(self, room, day, start, end, term):
+        self.room = room
+        self.day = DAYS.index(day[:3].title()) if isinstance(day, str) else day
+        self.start = start
+        self.end = end
+        self.term = term
+        self.mask = slot_mask(start, end)
+        self.weeks = TERMS[term]
+
+    def describe(self, week) -> str:
+        """Return a one-line description of this watch in a given week."""
+        return f"{self.room} {DAYS[self.day]} {self.start}-{self.end} (term {self.term}, week {week})"
+
+    def message(self, week) -> tuple:
+        """Return the ``(status, subject, body)`` of the alert for this watch freeing up in a given week."""
+        slot = self.describe(week)
+        return (f"Slot free: {slot}", f"WRB slot free: {self.room} {DAYS[self.day]} {self.start}",
+                f"A watched slot has just become free after a cancellation:\n\n{slot}")
+
+
+class Watchlist:
+    """Watches indexed by (room, weekday) for cheap evaluation."""
+
+    def __init__(self, watches=()):
+        self._index = defaultdict(list)
+        self.size = 0
+        for watch in watches:
+            self.add(watch)
+
+    def add(self, watch):
+        """Add a watch to the index."""
+        self._index[(watch.room, watch.day)].append(watch)
+        self.size += 1
+
+    def rooms(self) -> list:
+        """Every room with a watch, for ``TimetableSync``."""
+        return sorted({room for room, _ in self._index})
+
+    def weeks(self) -> list:
+        """Every week any watch covers, for ``TimetableSync``."""
+        return sorted({week for watches in self._index.values() for watch in watches for week in watch.weeks})
+
+    def evaluate(self, changes) -> list:
+        """
+        Diff successive timetables and return ``(watch, week)`` for every
+        watched range that has just become free.
+
+        ``changes`` is the list returned by ``TimetableSync.run_due()``.
+        """
+        freed = []
+        for room, week, old, new in changes:
+            if old is None:
+                continue        # First sight of this week, nothing to diff against
+            for day, (before, after) in enumerate(zip(old, new)):
+                if before == after:
+                    continue
+                for watch in self._index.get((room, day), ()):
+                    if week not in watch.weeks:
+                        continue
+                    if before & watch.mask and not after & watch.mask:
+                        freed.append((watch, week))
+        return freed
+
+    def process(self, changes, send=None) -> list:
+        """Evaluate changes and send one alert per freed watch."""
+        if send is None:
+            from check_wrb2526 import send_email as send
+        freed = self.evaluate(changes)
+        for watch, week in freed:
+            status, subject, body = watch.message(week)
+            send(status, subject=subject, body=body)
+        return freed
+
+
+def load_watchlist(path) -> Watchlist:
+    """
+    Load watches from a JSON file of the form
+    ``[{"room": "OC0.01", "day": "Wed", "start": "18:00", "end": "20:00", "term": 1}]``.
+    """
+    with open(path) as f:
+        items = json.load(f)
+    return Watchlist(
+        Watch(item["room"], item["day"], item["start"], item["end"], int(item["term"]))
+        for item in items
+    )